@@ -0,0 +1,2 @@
+# Превышение query_budget вьюхи роняет тест (posts.testing)
+pytest_plugins = ['posts.testing']
@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from .models import Group, Post, Comment, Follow
+from .models import (Group, GroupStats, Post, Comment, Follow, ImageBlob,
+                     UserStats)
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -27,6 +28,22 @@ class FollowAdmin(admin.ModelAdmin):
     search_fields = ("user",)
 
 
+class UserStatsAdmin(admin.ModelAdmin):
+    list_display = (
+        "user", "posts_count", "followers_count", "following_count")
+    search_fields = ("user__username",)
+
+
+class GroupStatsAdmin(admin.ModelAdmin):
+    list_display = ("group", "posts_count", "authors_count", "last_post")
+    search_fields = ("group__title",)
+
+
+class ImageBlobAdmin(admin.ModelAdmin):
+    list_display = ("name", "refcount", "updated")
+    search_fields = ("name",)
+
+
 admin.site.register(Post, PostAdmin)
 
 admin.site.register(Group, GroupAdmin)
@@ -34,3 +51,9 @@ admin.site.register(Group, GroupAdmin)
 admin.site.register(Comment, CommentAdmin)
 
 admin.site.register(Follow, FollowAdmin)
+
+admin.site.register(UserStats, UserStatsAdmin)
+
+admin.site.register(GroupStats, GroupStatsAdmin)
+
+admin.site.register(ImageBlob, ImageBlobAdmin)
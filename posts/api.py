@@ -0,0 +1,77 @@
+"""
+API только для чтения: ленты и пост в JSON. Ответы снабжаются ETag
+и Last-Modified по версиям областей кэша фрагментов, поэтому повторный
+опрос без изменений получает 304 без запроса ленты и сериализации.
+"""
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_GET
+
+from . import thumbnails
+from .conditional import feed_conditional, response_version
+from .fragment_cache import feed_scopes, post_scopes
+from .models import Group, Post, User
+from .paginator import paginate
+from .querywatch import query_budget
+from .serializers import comment_data, page_data, post_data
+from .timeline import TimelinePaginator
+from .views import comments_page
+
+
+def _feed_response(request, page):
+    thumbnails.prefetch(page.object_list)
+    return JsonResponse(page_data(page, post_data))
+
+
+@query_budget(3)
+@require_GET
+@feed_conditional('index')
+def index(request):
+    response_version(request, *feed_scopes('index'))
+    return _feed_response(request, paginate(request, Post.objects.for_feed()))
+
+
+@query_budget(4)
+@require_GET
+@feed_conditional('group')
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    response_version(request, *feed_scopes('group', obj_id=group.pk))
+    return _feed_response(request, paginate(request, group.posts.for_feed()))
+
+
+@query_budget(4)
+@require_GET
+@feed_conditional('profile')
+def profile(request, username):
+    author = get_object_or_404(User, username=username)
+    response_version(request, *feed_scopes('profile', obj_id=author.pk))
+    return _feed_response(
+        request, paginate(request, author.posts.for_feed()))
+
+
+@query_budget(5)
+@require_GET
+@feed_conditional('follow')
+def follow_index(request):
+    if not request.user.is_authenticated:
+        return JsonResponse(
+            {'detail': 'Требуется авторизация'}, status=401)
+    response_version(request, *feed_scopes('follow', user=request.user))
+    page = paginate(request, request.user, paginator_class=TimelinePaginator)
+    page.object_list = [entry.post for entry in page.object_list]
+    return _feed_response(request, page)
+
+
+@query_budget(4)
+@require_GET
+@feed_conditional('post')
+def post_view(request, post_id):
+    post = get_object_or_404(Post.objects.for_feed(), id=post_id)
+    response_version(request, *post_scopes(post.pk, post.author_id))
+    thumbnails.prefetch([post])
+    comments = comments_page(request, post)
+    data = post_data(post)
+    data['comments'] = [comment_data(comment) for comment in comments]
+    data['comments_next'] = comments.next_cursor
+    return JsonResponse(data)
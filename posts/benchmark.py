@@ -0,0 +1,412 @@
+"""
+Нагрузочные замеры страниц приложения posts: задержка (p50/p95/p99),
+число запросов к базе и размер ответа по каждому адресу, а также
+хранилище результатов для сравнения прогонов между коммитами.
+"""
+import json
+import os
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from yatube.db.base import BACKUP_ATTEMPTS, DEFAULTS, backup, configure
+
+from .instrumentation import percentile
+from .models import Comment, Follow, Group, Post, User
+from .seed import USERNAME
+
+# Все адреса замеряются запросом GET: формы поста только отображаются.
+# Комментарий отправляется формой со страницы поста и своей страницы
+# не имеет
+URL_NAMES = (
+    'index', 'group_posts', 'follow_index', 'search', 'profile', 'post',
+    'post_comments', 'post_new', 'post_edit', 'profile_follow',
+    'profile_unfollow',
+)
+# Адреса, которые меняют граф подписок: каждый их запрос выполняется
+# в транзакции и откатывается, иначе прогон отписывал бы пользователя
+# от автора и следующие прогоны мерили бы другие ленты
+MUTATING_URLS = ('profile_follow', 'profile_unfollow')
+SEARCH_QUERY = 'красивый город'
+QUERY_NAMES = (
+    'follow_feed_join', 'followers_count', 'following_count', 'is_following',
+)
+# Настройки SQLite для замера конкурентной нагрузки: стандартные
+# (журнал отката, BEGIN DEFERRED) и бэкенда yatube.db
+SQLITE_PROFILES = ('default', 'tuned')
+
+
+def _sample_objects():
+    """
+    Пользователь для авторизованных страниц — подписчик с самой
+    длинной лентой, а также его пост, группа и популярный автор.
+    """
+    follow = Follow.objects.filter(
+        user__username__startswith=USERNAME.format('')
+    ).order_by('-user__stats__following_count').first()
+    if follow is None:
+        return None
+    user = follow.user
+    post = (Post.objects.filter(author=user).first()
+            or Post.objects.first())
+    return {
+        'user': user,
+        'post': post,
+        'group': Group.objects.order_by('pk').first(),
+        'author': User.objects.exclude(pk=user.pk).order_by(
+            '-stats__followers_count').first(),
+    }
+
+
+def build_urls(names=URL_NAMES):
+    """
+    Пары (имя, путь) для замера на засеянных данных и пользователь,
+    от имени которого открываются страницы.
+    """
+    objects = _sample_objects()
+    if objects is None:
+        return None, []
+    user, post = objects['user'], objects['post']
+    post_kwargs = {'username': post.author.username, 'post_id': post.pk}
+    kwargs = {
+        'group_posts': {'slug': objects['group'].slug},
+        'profile': {'username': objects['author'].username},
+        'post': post_kwargs,
+        'post_comments': post_kwargs,
+        'post_edit': post_kwargs,
+        'profile_follow': {'username': objects['author'].username},
+        'profile_unfollow': {'username': objects['author'].username},
+    }
+    urls = []
+    for name in names:
+        path = reverse(name, kwargs=kwargs.get(name))
+        if name == 'search':
+            path += '?' + urllib.parse.urlencode({'q': SEARCH_QUERY})
+        urls.append((name, path))
+    return user, urls
+
+
+def _summary(name, path, timings, queries, sizes, status):
+    timings = [seconds * 1000 for seconds in timings]
+    return {
+        'name': name,
+        'path': path,
+        'status': status,
+        'requests': len(timings),
+        'p50': percentile(timings, 50),
+        'p95': percentile(timings, 95),
+        'p99': percentile(timings, 99),
+        'mean': sum(timings) / len(timings),
+        'queries': max(queries) if queries else None,
+        'bytes': max(sizes) if sizes else None,
+    }
+
+
+@contextmanager
+def _rolled_back(enabled):
+    """Откатывает записи блока, если enabled."""
+    if not enabled:
+        yield
+        return
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def run_client(urls, user=None, iterations=50, warmup=5):
+    """
+    Замер через тестовый клиент Django в текущем процессе: кроме
+    задержки считаются запросы к базе. Первые warmup запросов
+    прогревают кэш и не учитываются.
+    """
+    client = Client()
+    if user is not None:
+        client.force_login(user)
+    results = []
+    for name, path in urls:
+        rollback = name in MUTATING_URLS
+        for _ in range(warmup):
+            with _rolled_back(rollback):
+                client.get(path)
+        timings, queries, sizes = [], [], []
+        for _ in range(iterations):
+            with _rolled_back(rollback), \
+                    CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = client.get(path)
+                timings.append(time.perf_counter() - started)
+            queries.append(len(captured))
+            sizes.append(len(response.content))
+        results.append(_summary(
+            name, path, timings, queries, sizes, response.status_code))
+    return results
+
+
+def run_http(base_url, urls, iterations=50, warmup=5):
+    """
+    Замер запущенного WSGI-сервера по HTTP. Запросы к базе снаружи
+    не видны, поэтому queries не заполняется; страницы открываются
+    анонимно.
+    """
+    results = []
+    for name, path in urls:
+        url = base_url.rstrip('/') + path
+        timings, sizes = [], []
+        for number in range(warmup + iterations):
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(url) as response:
+                    body, status = response.read(), response.status
+            except urllib.error.HTTPError as error:
+                body, status = error.read(), error.code
+            if number >= warmup:
+                timings.append(time.perf_counter() - started)
+                sizes.append(len(body))
+        results.append(_summary(name, path, timings, [], sizes, status))
+    return results
+
+
+def _queries(objects):
+    user, author = objects['user'], objects['author']
+    return {
+        # Лента подписок прямым соединением с подписками, без FeedEntry
+        'follow_feed_join': lambda: list(Post.objects.filter(
+            author__following__user=user
+        ).for_feed()[:settings.PAR_PAGE]),
+        'followers_count': lambda: Follow.objects.filter(
+            author=author).count(),
+        'following_count': lambda: Follow.objects.filter(
+            user=user).count(),
+        'is_following': lambda: Follow.objects.filter(
+            user=user, author=author).exists(),
+    }
+
+
+def run_queries(names=QUERY_NAMES, iterations=50, warmup=5):
+    """
+    Замер отдельных запросов к графу подписок на засеянных данных:
+    подписчик с самой длинной лентой и самый популярный автор.
+    """
+    objects = _sample_objects()
+    if objects is None:
+        return []
+    queries = _queries(objects)
+    results = []
+    for name in names:
+        query = queries[name]
+        for _ in range(warmup):
+            query()
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            query()
+            timings.append(time.perf_counter() - started)
+        results.append(_summary(name, '', timings, [1], [], None))
+    return results
+
+
+def _open(path, profile):
+    db = sqlite3.connect(path, timeout=DEFAULTS['BUSY_TIMEOUT'],
+                         isolation_level=None, check_same_thread=False)
+    if profile == 'tuned':
+        configure(db, DEFAULTS['MMAP_SIZE'], DEFAULTS['CACHE_SIZE'])
+    return db
+
+
+def _workload():
+    """
+    Запросы замера: первая страница общей ленты для читателей
+    и добавление комментария со счётчиком поста для писателей.
+    """
+    sql, params = Post.objects.for_feed()[
+        :settings.PAR_PAGE].query.sql_with_params()
+    read = (sql.replace('%s', '?'), params)
+    write = (
+        f'INSERT INTO {Comment._meta.db_table} '
+        '(post_id, author_id, text, created) VALUES (?, ?, ?, ?)',
+        f'UPDATE {Post._meta.db_table} '
+        'SET comment_count = comment_count + 1 WHERE id = ?',
+    )
+    return read, write
+
+
+def _reader(db, query, deadline, timings, errors):
+    sql, params = query
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            db.execute(sql, params).fetchall()
+        except sqlite3.OperationalError:
+            errors.append(1)
+            continue
+        timings.append(time.perf_counter() - started)
+
+
+def _writer(db, statements, begin, ids, deadline, timings, errors):
+    insert, update = statements
+    post_ids, user_ids = ids
+    number = 0
+    while time.perf_counter() < deadline:
+        number += 1
+        post_id = post_ids[number % len(post_ids)]
+        started = time.perf_counter()
+        try:
+            db.execute(begin)
+            # Время в формате, в котором его хранит Django при USE_TZ
+            created = datetime.now(timezone.utc).replace(tzinfo=None)
+            db.execute(insert, (post_id, user_ids[number % len(user_ids)],
+                                'Замер', created.isoformat(' ')))
+            db.execute(update, (post_id,))
+            db.execute('COMMIT')
+        except sqlite3.OperationalError:
+            if db.in_transaction:
+                db.execute('ROLLBACK')
+            errors.append(1)
+            continue
+        timings.append(time.perf_counter() - started)
+
+
+def _run_profile(path, profile, readers, writers, duration, workload, ids):
+    setup = _open(path, profile)
+    if profile == 'default':
+        setup.execute('PRAGMA journal_mode=DELETE')
+    begin = 'BEGIN IMMEDIATE' if profile == 'tuned' else 'BEGIN'
+    deadline = time.perf_counter() + duration
+    timings = {'read': [], 'write': []}
+    errors = {'read': [], 'write': []}
+    dbs = [_open(path, profile) for _ in range(readers + writers)]
+    threads = [threading.Thread(target=_reader, args=(
+        db, workload[0], deadline, timings['read'], errors['read']))
+        for db in dbs[:readers]]
+    threads += [threading.Thread(target=_writer, args=(
+        db, workload[1], begin, ids, deadline, timings['write'],
+        errors['write'])) for db in dbs[readers:]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for db in dbs + [setup]:
+        db.close()
+    rows = []
+    for kind in ('read', 'write'):
+        row = _summary(f'{kind}:{profile}', '', timings[kind] or [0], [], [],
+                       None)
+        row.update(requests=len(timings[kind]), errors=len(errors[kind]),
+                   throughput=len(timings[kind]) / duration)
+        rows.append(row)
+    return rows
+
+
+def _copy_database(path, attempts=BACKUP_ATTEMPTS):
+    """Копия текущей базы в файл path."""
+    backup(connection, path, attempts)
+
+
+def run_concurrency(readers=4, writers=1, duration=5.0,
+                    profiles=SQLITE_PROFILES):
+    """
+    Замер конкурентного чтения и записи на копии базы: readers потоков
+    читают ленту, writers потоков добавляют комментарии. Каждый
+    профиль настроек SQLite получает свою копию и duration секунд.
+    """
+    post_ids = list(Post.objects.values_list('pk', flat=True)[:1000])
+    user_ids = list(User.objects.values_list('pk', flat=True)[:1000])
+    if not post_ids:
+        return []
+    workload = _workload()
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for profile in profiles:
+            path = os.path.join(directory, f'{profile}.sqlite3')
+            _copy_database(path)
+            results += _run_profile(path, profile, readers, writers,
+                                    duration, workload, (post_ids, user_ids))
+    return results
+
+
+def git_revision():
+    """Короткий хеш текущего коммита или None вне репозитория."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, capture_output=True, check=True,
+            text=True,
+        ).stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class ResultsStore:
+    """
+    Прогоны в файле JSON Lines: одна строка — один прогон с ревизией,
+    временем, меткой и результатами по адресам.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or settings.BENCHMARK_RESULTS
+
+    def save(self, results, label='', revision=None):
+        run = {
+            'id': self._next_id(),
+            'revision': revision or git_revision(),
+            'created': datetime.now(timezone.utc).isoformat(),
+            'label': label,
+            'results': results,
+        }
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as results_file:
+            results_file.write(json.dumps(run, ensure_ascii=False) + '\n')
+        return run
+
+    def runs(self):
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, encoding='utf-8') as results_file:
+            return [json.loads(line) for line in results_file if line.strip()]
+
+    def _next_id(self):
+        runs = self.runs()
+        return runs[-1]['id'] + 1 if runs else 1
+
+    def get(self, ref):
+        """Последний прогон с таким номером или ревизией."""
+        for run in reversed(self.runs()):
+            if str(run['id']) == str(ref) or run['revision'] == ref:
+                return run
+        return None
+
+    def compare(self, base, head):
+        """
+        Строки сравнения двух прогонов по общим адресам: значения
+        метрик и относительное изменение в процентах.
+        """
+        base_results = {row['name']: row for row in base['results']}
+        rows = []
+        for row in head['results']:
+            old = base_results.get(row['name'])
+            if old is None:
+                continue
+            changes = {}
+            for metric in ('p50', 'p95', 'p99', 'queries', 'bytes'):
+                before, after = old[metric], row[metric]
+                change = None
+                if before and after is not None:
+                    change = (after - before) / before * 100
+                changes[metric] = (before, after, change)
+            rows.append((row['name'], changes))
+        return rows
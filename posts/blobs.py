@@ -0,0 +1,74 @@
+"""
+Сборка мусора в хранилище изображений постов: файлы, на которые
+не ссылается ни один пост, удаляются вместе с миниатюрами sorl.
+"""
+import posixpath
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from .models import ImageBlob, Post
+from .storage import post_image_storage
+
+# Имён в одном запросе IN: меньше предела переменных SQLite
+BATCH_SIZE = 500
+
+
+def _delete(name, storage):
+    """Удаляет файл и его миниатюры с записями sorl о них."""
+    default.kvstore.delete(ImageFile(name, storage))
+    storage.delete(name)
+
+
+def _walk(storage, directory):
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield posixpath.join(directory, name)
+    for child in directories:
+        yield from _walk(storage, posixpath.join(directory, child))
+
+
+def collect_garbage(grace=None, sweep=False, storage=None):
+    """
+    Удаляет файлы, на которые не ссылается ни один пост. Кандидаты —
+    записи ImageBlob без ссылок, не менявшиеся grace секунд: за это
+    время загруженный файл успевает попасть в сохранённый пост. Перед
+    удалением ссылки ещё раз проверяются по таблице постов.
+
+    sweep дополнительно обходит каталог posts/ и удаляет старые файлы
+    без записи и без ссылок — например, оставшиеся от откаченных
+    транзакций. Возвращает имена удалённых файлов.
+    """
+    storage = storage or post_image_storage
+    grace = settings.IMAGE_GC_GRACE if grace is None else grace
+    threshold = timezone.now() - timedelta(seconds=grace)
+    candidates = set(ImageBlob.objects.filter(
+        refcount__lte=0, updated__lt=threshold).values_list('name', flat=True))
+    if sweep and storage.exists('posts'):
+        known = set(ImageBlob.objects.values_list('name', flat=True))
+        candidates.update(
+            name for name in _walk(storage, 'posts')
+            if name not in known and not name.endswith('.part')
+            and storage.get_modified_time(name) < threshold)
+    referenced = set()
+    names = sorted(candidates)
+    for start in range(0, len(names), BATCH_SIZE):
+        referenced.update(Post.objects.filter(
+            image__in=names[start:start + BATCH_SIZE]
+        ).values_list('image', flat=True))
+    deleted = []
+    for name in sorted(candidates - referenced):
+        if storage.exists(name):
+            _delete(name, storage)
+        deleted.append(name)
+    for start in range(0, len(deleted), BATCH_SIZE):
+        ImageBlob.objects.filter(
+            name__in=deleted[start:start + BATCH_SIZE], refcount__lte=0
+        ).delete()
+    # Счётчик разошёлся с постами, например после update() в обход
+    # сигналов: пересчитываем его
+    ImageBlob.objects.recount(referenced)
+    return deleted
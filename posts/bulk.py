@@ -0,0 +1,256 @@
+"""
+Массовая выгрузка и загрузка данных потоком NDJSON или CSV: по одной
+записи на строку, первичные и внешние ключи сохраняются как есть.
+Выгрузка читает таблицу через iterator(chunk_size), загрузка копит
+пачку объектов и вставляет её одним запросом, как bulk_create, поэтому
+память не растёт с размером данных. Сигналы при массовой вставке
+не отправляются: счётчики, ленты и поисковый индекс загруженных строк
+пересчитываются один раз в конце.
+"""
+import csv
+import datetime
+import json
+
+from django.core.cache import cache
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+
+from . import search, timeline
+from .models import (Comment, Follow, Group, GroupStats, ImageBlob, Post,
+                     User, UserStats)
+
+FORMATS = ('ndjson', 'csv')
+# Виды данных в порядке загрузки: ссылки ведут только на предыдущие
+MODELS = {
+    'users': (User, (
+        'id', 'username', 'password', 'email', 'first_name', 'last_name',
+        'is_active', 'is_staff', 'is_superuser', 'date_joined',
+        'last_login')),
+    'groups': (Group, ('id', 'title', 'slug', 'description')),
+    'posts': (Post, (
+        'id', 'author_id', 'group_id', 'text', 'pub_date', 'image',
+        'image_hash', 'image_width', 'image_height')),
+    'comments': (Comment, ('id', 'post_id', 'author_id', 'text', 'created')),
+    'follows': (Follow, ('id', 'user_id', 'author_id')),
+}
+
+
+class _Encoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder округляет время до миллисекунд
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def export_rows(name, chunk_size=2000):
+    """Строки таблицы кортежами полей MODELS[name] в порядке ключа."""
+    model, fields = MODELS[name]
+    return model.objects.order_by('pk').values_list(*fields).iterator(
+        chunk_size=chunk_size)
+
+
+def write(name, stream, data_format='ndjson', chunk_size=2000):
+    """Выгружает таблицу в текстовый поток, возвращает число строк."""
+    fields = MODELS[name][1]
+    count = 0
+    if data_format == 'csv':
+        writer = csv.writer(stream)
+        writer.writerow(fields)
+        for row in export_rows(name, chunk_size):
+            writer.writerow(
+                '' if value is None else value for value in row)
+            count += 1
+        return count
+    encoder = _Encoder(ensure_ascii=False)
+    for row in export_rows(name, chunk_size):
+        stream.write(encoder.encode(dict(zip(fields, row))) + '\n')
+        count += 1
+    return count
+
+
+def read(name, stream, data_format='ndjson'):
+    """Записи потока словарями {поле: значение модели}."""
+    model, fields = MODELS[name]
+    model_fields = {field: model._meta.get_field(field) for field in fields}
+    if data_format == 'csv':
+        records = csv.DictReader(stream)
+    else:
+        records = (json.loads(line) for line in stream if line.strip())
+    for record in records:
+        values = {}
+        for field, value in record.items():
+            model_field = model_fields.get(field)
+            if model_field is None:
+                continue
+            # Пустая ячейка CSV — NULL там, где он допустим
+            if value == '' and model_field.null:
+                value = None
+            values[field] = model_field.to_python(value)
+        yield values
+
+
+def _insert(model, objects):
+    """
+    Вставка пачки как в bulk_create, но с сырыми значениями полей:
+    auto_now_add не подменяет даты из файла текущим временем.
+    """
+    fields = [field for field in model._meta.concrete_fields
+              if objects[0].pk is not None or not field.primary_key]
+    size = connection.ops.bulk_batch_size(fields, objects) or len(objects)
+    for start in range(0, len(objects), size):
+        model._base_manager._insert(
+            objects[start:start + size], fields=fields, raw=True,
+            using=connection.alias)
+
+
+class _Subquery(RawSQL):
+    # RawSQL берёт текст в скобки, и IN ((SELECT ...)) в SQLite читает
+    # только первую строку подзапроса; скобки добавит сам поиск __in
+    def as_sql(self, compiler, connection):
+        return self.sql, self.params
+
+
+class ImportScope:
+    """
+    id загруженных строк во временных таблицах, по одной на вид данных:
+    производные данные пересчитываются только для них. Строки без id
+    (ключи назначила база) не отследить — тогда scope.complete ложно
+    и пересчитывается всё.
+    """
+
+    def __init__(self):
+        self.kinds = set()
+        self.complete = True
+
+    def table(self, name):
+        return f'bulk_import_{name}'
+
+    def add(self, name, objects):
+        if objects[0].pk is None:
+            self.complete = False
+            return
+        with connection.cursor() as cursor:
+            if name not in self.kinds:
+                cursor.execute(
+                    f'CREATE TEMPORARY TABLE {self.table(name)} '
+                    '(id INTEGER PRIMARY KEY)')
+                self.kinds.add(name)
+            cursor.executemany(
+                f'INSERT INTO {self.table(name)} (id) VALUES (%s)',
+                [(obj.pk,) for obj in objects])
+
+    def ids(self, name, column='id', source=None):
+        """
+        SQL подзапрос: column строк таблицы вида source, загруженных
+        как name. Без source — сами id загруженных строк name.
+        """
+        if name not in self.kinds:
+            return None
+        if source is None:
+            return f'SELECT id FROM {self.table(name)}'
+        table = MODELS[source][0]._meta.db_table
+        return (f'SELECT {column} FROM {table} '
+                f'WHERE id IN (SELECT id FROM {self.table(name)})')
+
+    def union(self, *parts):
+        parts = [part for part in parts if part is not None]
+        return _Subquery(' UNION '.join(parts), ()) if parts else None
+
+    def drop(self):
+        with connection.cursor() as cursor:
+            for name in self.kinds:
+                cursor.execute(f'DROP TABLE {self.table(name)}')
+        self.kinds.clear()
+
+
+def load(name, stream, data_format='ndjson', batch_size=1000, scope=None):
+    """
+    Вставляет записи потока пачками по batch_size и отмечает их
+    в scope. Вызывается внутри транзакции; производные данные
+    пересчитывает rebuild_derived. Возвращает число вставленных строк.
+    """
+    model = MODELS[name][0]
+    count = 0
+    batch = []
+    for values in read(name, stream, data_format):
+        batch.append(model(**values))
+        if len(batch) >= batch_size:
+            count += _flush(name, model, batch, scope)
+            batch = []
+    if batch:
+        count += _flush(name, model, batch, scope)
+    # Явные ключи не двигают последовательности в PostgreSQL и Oracle
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [model]):
+            cursor.execute(sql)
+    return count
+
+
+def _flush(name, model, batch, scope):
+    _insert(model, batch)
+    if scope is not None:
+        scope.add(name, batch)
+    return len(batch)
+
+
+def rebuild_derived(batch_size=1000, scope=None):
+    """
+    Пересчитывает всё, что обычно поддерживают сигналы: счётчики,
+    статистику групп, ссылки на изображения, ленты подписок и поиск.
+    С scope пересчёт ограничен строками, которых касаются загруженные.
+    """
+    if scope is None or not scope.complete:
+        Post.objects.rebuild_comment_counts()
+        UserStats.objects.rebuild(batch_size=batch_size)
+        GroupStats.objects.rebuild()
+        ImageBlob.objects.rebuild()
+        timeline.rebuild()
+        if search.fts_available():
+            search.rebuild(batch_size=batch_size)
+        return
+    posts = scope.union(scope.ids('posts'))
+    commented = scope.union(
+        scope.ids('posts'), scope.ids('comments', 'post_id', 'comments'))
+    if commented is not None:
+        Post.objects.filter(pk__in=commented).rebuild_comment_counts()
+    users = scope.union(
+        scope.ids('users'), scope.ids('posts', 'author_id', 'posts'),
+        scope.ids('follows', 'user_id', 'follows'),
+        scope.ids('follows', 'author_id', 'follows'))
+    if users is not None:
+        UserStats.objects.rebuild(batch_size=batch_size, users=users)
+    groups = scope.union(
+        scope.ids('groups'), scope.ids('posts', 'group_id', 'posts'))
+    if groups is not None:
+        GroupStats.objects.rebuild(groups=groups)
+    if posts is not None:
+        ImageBlob.objects.rebuild(posts=posts)
+    if posts is not None or scope.ids('follows') is not None:
+        timeline.rebuild(follows=scope.ids('follows'),
+                         posts=scope.ids('posts'))
+    if posts is not None and search.fts_available():
+        search.rebuild(batch_size=batch_size, posts=posts)
+
+
+def import_data(sources, batch_size=1000):
+    """
+    Загружает потоки [(вид, поток, формат)] в порядке MODELS одной
+    транзакцией, пересчитывает производные данные загруженных строк
+    и сбрасывает кэш страниц и фрагментов. Возвращает {вид: число
+    строк}.
+    """
+    order = list(MODELS)
+    counts = {}
+    scope = ImportScope()
+    with transaction.atomic():
+        for name, stream, data_format in sorted(
+                sources, key=lambda source: order.index(source[0])):
+            counts[name] = counts.get(name, 0) + load(
+                name, stream, data_format, batch_size, scope)
+        rebuild_derived(batch_size, scope)
+        scope.drop()
+    cache.clear()
+    return counts
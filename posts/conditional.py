@@ -0,0 +1,137 @@
+"""
+Условные ответы для лент и постов. ETag и Last-Modified считаются
+по версиям областей кэша фрагментов, поэтому ответ 304 не требует
+запроса ленты, а заголовок Cache-Control разрешает браузерам и прокси
+хранить публичные ответы. Те же публичные ответы попадают в кэш
+страниц для анонимных читателей (page_cache).
+"""
+import hashlib
+from calendar import timegm
+from functools import wraps
+
+from django.conf import settings
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+from . import fragment_cache, page_cache, replica
+from .models import Group, Post, User
+
+CONDITIONAL_HEADERS = ('HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE')
+
+
+def response_version(request, *scopes):
+    """
+    Версия областей, от которых зависит ответ. Вьюха получает её до
+    чтения данных и отрисовки, так что валидаторы ответа никогда
+    не окажутся новее его содержимого.
+    """
+    request._feed_replica = replica.reading()
+    version = fragment_cache.get_version(
+        *scopes, replica_read=request._feed_replica)
+    request._feed_scopes = scopes
+    request._feed_validators = (
+        version, fragment_cache.last_modified(*scopes))
+    return version
+
+
+def _lookup_scopes(request, view, kwargs):
+    """Области по адресу запроса, пока вьюха ещё не вызывалась."""
+    if view in ('index', 'groups'):
+        return fragment_cache.feed_scopes(view)
+    if view == 'follow':
+        return fragment_cache.feed_scopes('follow', user=request.user)
+    if view == 'post':
+        author_id = Post.objects.filter(pk=kwargs['post_id']).values_list(
+            'author_id', flat=True).first()
+        if author_id is None:
+            return None
+        return fragment_cache.post_scopes(kwargs['post_id'], author_id)
+    if view == 'group':
+        rows = Group.objects.filter(slug=kwargs['slug'])
+    else:
+        rows = User.objects.filter(username=kwargs['username'])
+    obj_id = rows.values_list('pk', flat=True).first()
+    if obj_id is None:
+        return None
+    return fragment_cache.feed_scopes(view, obj_id=obj_id)
+
+
+def _validators(request, view, kwargs):
+    """Пара (ETag, время изменения) или None, если объекта нет."""
+    if not hasattr(request, '_feed_validators'):
+        scopes = _lookup_scopes(request, view, kwargs)
+        if scopes is None and replica.use_primary():
+            scopes = _lookup_scopes(request, view, kwargs)
+        if scopes is None:
+            return None
+        response_version(request, *scopes)
+    version, modified = request._feed_validators
+    # Версии разных пользователей могут совпасть, а ленты — нет
+    viewer = request.user.pk if view == 'follow' else ''
+    source = '|'.join(
+        [view, version, request.get_full_path(), str(viewer)])
+    etag = quote_etag(hashlib.md5(source.encode()).hexdigest())
+    return etag, timegm(modified.utctimetuple())
+
+
+def _validated(request, view, personal):
+    """Получает ли ответ валидаторы и публичное кэширование."""
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if view == 'follow':
+        return request.user.is_authenticated
+    return not (personal and request.user.is_authenticated)
+
+
+def _patch_cache_control(response, public, personal):
+    if public:
+        # Браузер каждый раз сверяет ETag, прокси может отдавать
+        # ответ сам в течение PUBLIC_CACHE_MAX_AGE секунд
+        patch_cache_control(response, public=True, max_age=0,
+                            s_maxage=settings.PUBLIC_CACHE_MAX_AGE)
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    if personal:
+        patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def feed_conditional(view, personal=False):
+    """
+    Декоратор вьюхи ленты view (index, group, profile, follow, post,
+    groups), которая вызывает response_version. Условный запрос сверяется
+    с версиями до вызова вьюхи, обычный получает ETag и Last-Modified.
+
+    personal — HTML-страница, которая у вошедшего пользователя своя
+    (меню, кнопки автора, форма комментария). Такие ответы
+    валидаторов не получают и помечаются как private.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            validated = _validated(request, view, personal)
+            public = validated and view != 'follow'
+            if validated and any(
+                    header in request.META for header in CONDITIONAL_HEADERS):
+                validators = _validators(request, view, kwargs)
+                if validators is not None:
+                    response = get_conditional_response(
+                        request, *validators)
+                    if response is not None:
+                        return _patch_cache_control(
+                            response, public, personal)
+            response = view_func(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            validators = validated and _validators(request, view, kwargs)
+            if validators:
+                response['ETag'] = validators[0]
+                response['Last-Modified'] = http_date(validators[1])
+            if validators and public:
+                page_cache.mark(response, request._feed_scopes,
+                                request._feed_validators[0], validators[1],
+                                request._feed_replica)
+            return _patch_cache_control(response, public, personal)
+        return wrapper
+    return decorator
@@ -1,5 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
+from . import images
 from .models import Post, Comment
 
 
@@ -16,6 +18,23 @@ class PostForm(forms.ModelForm):
             'group': ('Выберите группу из списка'),
         }
 
+    # Поля, которые форма меняет при сохранении, кроме полей формы
+    extra_fields = ('image_hash', 'image_width', 'image_height')
+
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        if isinstance(image, UploadedFile):
+            return images.process(image)
+        return image
+
+    def save(self, commit=True):
+        if 'image' in self.changed_data:
+            image = self.cleaned_data['image']
+            self.instance.image_hash = getattr(image, 'content_hash', '')
+            self.instance.image_width, self.instance.image_height = getattr(
+                image, 'image_size', (None, None))
+        return super().save(commit)
+
 
 class CommentForm(forms.ModelForm):
 
@@ -0,0 +1,122 @@
+import time
+from datetime import datetime, timezone
+
+from django.core.cache import cache
+
+from . import replica
+
+VERSION_KEY = 'fragment_version:{}'
+MODIFIED_KEY = 'fragment_modified:{}'
+
+
+def _initial_version():
+    # Версия после вытеснения ключа не должна совпасть со старой
+    return int(time.time() * 1000)
+
+
+def get_version(*scopes, replica_read=None):
+    """
+    Версия набора областей кэша одной строкой для ключа фрагмента.
+    При любом изменении области ключ меняется, и старые фрагменты
+    просто перестают читаться. Если запрос читает с реплики
+    (replica_read, по умолчанию — текущий запрос), в версию входит
+    поколение реплики.
+    """
+    keys = [VERSION_KEY.format(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _initial_version(), None)
+            versions[key] = cache.get(key)
+    version = '.'.join(str(versions[key]) for key in keys)
+    if replica_read is None:
+        replica_read = replica.reading()
+    if replica_read:
+        version += f'~{replica.generation()}'
+    return version
+
+
+def last_modified(*scopes):
+    """
+    Время последнего изменения набора областей для Last-Modified.
+    Если отметка вытеснена из кэша, изменением считается текущий момент.
+    """
+    keys = [MODIFIED_KEY.format(scope) for scope in scopes]
+    stamps = cache.get_many(keys)
+    for key in keys:
+        if key not in stamps:
+            cache.add(key, time.time(), None)
+            stamps[key] = cache.get(key, time.time())
+    return datetime.fromtimestamp(max(stamps.values()), timezone.utc)
+
+
+def bump(*scopes):
+    """Сбрасывает фрагменты, зависящие от перечисленных областей."""
+    for scope in scopes:
+        key = VERSION_KEY.format(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_version(), None)
+    now = time.time()
+    cache.set_many(
+        {MODIFIED_KEY.format(scope): now for scope in scopes}, None)
+
+
+def feed_scopes(view, user=None, obj_id=None):
+    """
+    Области, от которых зависит лента: index, group, profile, follow,
+    и каталог групп groups.
+    """
+    if view in ('index', 'groups'):
+        return [view]
+    if view == 'follow':
+        return ['index', f'follow:{user.pk}']
+    return [f'{view}:{obj_id}']
+
+
+def post_scopes(post_id, author_id):
+    """Области страницы поста: сам пост и карточка автора со счётчиками."""
+    return [f'post:{post_id}', f'profile:{author_id}']
+
+
+def feed_version(view, user=None, obj_id=None):
+    """Версия фрагмента ленты."""
+    return get_version(*feed_scopes(view, user, obj_id))
+
+
+def bump_post(post, old_group_id=None):
+    """Пост или его комментарии изменились."""
+    bump_posts([(post.pk, post.author_id, post.group_id)], old_group_id)
+
+
+def bump_posts(posts, old_group_id=None):
+    """
+    Сбрасывает области нескольких постов одним вызовом bump; posts —
+    кортежи (id поста, id автора, id группы).
+    """
+    scopes = {'index'}
+    group_ids = {old_group_id}
+    for post_id, author_id, group_id in posts:
+        scopes.update((f'profile:{author_id}', f'post:{post_id}'))
+        group_ids.add(group_id)
+    scopes.update(f'group:{group_id}' for group_id in group_ids
+                  if group_id is not None)
+    bump(*sorted(scopes))
+
+
+def bump_follow(follow):
+    """Подписка меняет ленту подписчика и счётчики в обоих профилях."""
+    bump(f'follow:{follow.user_id}', f'profile:{follow.user_id}',
+         f'profile:{follow.author_id}')
+
+
+def bump_group(group):
+    """
+    Название группы выводится в карточках постов, поэтому сбрасываются
+    и общая лента, и профили авторов группы.
+    """
+    authors = group.posts.order_by().values_list(
+        'author_id', flat=True).distinct()
+    bump('index', 'groups', f'group:{group.pk}',
+         *(f'profile:{author_id}' for author_id in authors))
@@ -0,0 +1,84 @@
+"""
+Обработка загруженных изображений постов: проверка размеров,
+уменьшение до POST_IMAGE_MAX_SIZE, перекодирование в POST_IMAGE_FORMAT
+без EXIF и хеш содержимого. Файлы читаются и пишутся частями, большие
+результаты держатся во временном файле на диске.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from PIL import Image, ImageOps
+
+EXTENSIONS = {'JPEG': '.jpg', 'WEBP': '.webp', 'PNG': '.png'}
+
+
+def content_hash(file):
+    """SHA-256 содержимого файла, прочитанного частями."""
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(File.DEFAULT_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def _open(upload):
+    """Открывает изображение и проверяет размеры до декодирования."""
+    upload.seek(0)
+    image = Image.open(upload)
+    width, height = image.size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Изображение слишком большое: %(width)s×%(height)s пикселей.',
+            code='image_too_large',
+            params={'width': width, 'height': height})
+    return image
+
+
+def _convert(image, image_format):
+    """Режим, который умеет сохранить формат: JPEG не хранит альфа-канал."""
+    if image_format != 'JPEG':
+        return image.convert('RGBA' if 'A' in image.getbands() or (
+            'transparency' in image.info) else 'RGB')
+    if image.mode in ('RGB', 'L'):
+        return image
+    image = image.convert('RGBA')
+    background = Image.new('RGB', image.size, 'white')
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def process(upload):
+    """
+    Возвращает File с перекодированным изображением и атрибутами
+    content_hash и image_size. Поворот из EXIF применяется к пикселям, сами
+    метаданные не сохраняются.
+    """
+    image = _open(upload)
+    max_size = settings.POST_IMAGE_MAX_SIZE
+    image_format = settings.POST_IMAGE_FORMAT
+    output = tempfile.SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    try:
+        # JPEG декодируется сразу в уменьшенном масштабе — быстрее
+        # и без полного растра камеры в памяти
+        image.draft('RGB', (max_size, max_size))
+        icc_profile = image.info.get('icc_profile')
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+        _convert(image, image_format).save(
+            output, image_format, quality=settings.POST_IMAGE_QUALITY,
+            optimize=True, progressive=True, icc_profile=icc_profile)
+    except (OSError, ValueError):
+        output.close()
+        raise ValidationError(
+            'Не удалось обработать изображение.', code='invalid_image')
+    stem = os.path.splitext(os.path.basename(upload.name))[0]
+    processed = File(output, name=stem + EXTENSIONS[image_format])
+    processed.content_hash = content_hash(output)
+    processed.image_size = image.size
+    return processed
@@ -0,0 +1,362 @@
+"""
+Замеры запросов: число запросов к базе и время в ней, время отрисовки
+шаблонов и работы с миниатюрами, попадания и промахи кэша. Каждый ответ
+может получать заголовок Server-Timing (REQUEST_METRICS_HEADER), а
+замеры копятся в скользящем окне по имени адреса. Процесс периодически
+сбрасывает сводку в файл в REQUEST_METRICS_DIR, команда request_metrics
+сводит свежие файлы всех процессов.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.cache.backends import locmem
+from django.db import connections
+from django.template.backends import django as django_backend
+from django.urls import Resolver404, resolve
+
+from yatube import cache as sqlite_cache
+
+# Поля замера в порядке хранения в окне; время — в секундах
+METRICS = ('total', 'db', 'queries', 'render', 'thumbnail', 'cache_hits',
+           'cache_misses')
+COUNTERS = ('queries', 'cache_hits', 'cache_misses')
+# Замеры фоновой генерации миниатюр, которые идут вне запросов
+BACKGROUND = '<background>'
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+_missing = object()
+
+
+def percentile(values, percent):
+    """Процентиль методом ближайшего ранга."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = math.ceil(percent / 100 * len(ordered))
+    return ordered[max(rank, 1) - 1]
+
+
+class RequestMetrics:
+    """Счётчики одного запроса."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.render = 0.0
+        self.thumbnail = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.render_depth = 0
+
+    def execute(self, execute, sql, params, many, context):
+        """Обёртка connection.execute_wrapper: время каждого запроса."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - started
+            self.queries += 1
+
+    def sample(self):
+        return {
+            'total': time.perf_counter() - self.started,
+            'db': self.db,
+            'queries': self.queries,
+            'render': self.render,
+            'thumbnail': self.thumbnail,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+        }
+
+    def server_timing(self, total):
+        """Значение заголовка Server-Timing, длительности в мс."""
+        return ', '.join([
+            f'db;dur={self.db * 1000:.1f};desc="{self.queries} queries"',
+            f'render;dur={self.render * 1000:.1f}',
+            f'thumbnail;dur={self.thumbnail * 1000:.1f}',
+            f'cache;desc="{self.cache_hits} hits {self.cache_misses} misses"',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+
+def current():
+    """Замеры текущего запроса или None вне запроса."""
+    return _current.get()
+
+
+def record_cache(hits, misses):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
+
+
+@contextmanager
+def timer(metric):
+    """
+    Добавляет время блока к полю metric замеров запроса. Вне запроса,
+    например в фоновом пуле миниатюр, время уходит в сводку BACKGROUND.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics = _current.get()
+        if metrics is not None:
+            setattr(metrics, metric, getattr(metrics, metric) + elapsed)
+        else:
+            aggregate.add(BACKGROUND, {'total': elapsed, metric: elapsed})
+
+
+class Aggregate:
+    """
+    Скользящее окно последних REQUEST_METRICS_WINDOW замеров по имени
+    адреса и общее число запросов с запуска процесса.
+    """
+
+    def __init__(self):
+        self._samples = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+        self.flushed = time.monotonic()
+
+    def add(self, name, sample):
+        row = tuple(sample.get(metric, 0) for metric in METRICS)
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(
+                    maxlen=settings.REQUEST_METRICS_WINDOW)
+            samples.append(row)
+            self._counts[name] = self._counts.get(name, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+
+    def snapshot(self):
+        """
+        Сводка {имя: {'requests', 'window', метрика: {'mean', 'p50',
+        'p95', 'max'}}}; время в миллисекундах.
+        """
+        with self._lock:
+            samples = {name: list(rows) for name, rows in
+                       self._samples.items()}
+            counts = dict(self._counts)
+        summary = {}
+        for name, rows in samples.items():
+            summary[name] = {'requests': counts[name], 'window': len(rows)}
+            for index, metric in enumerate(METRICS):
+                scale = 1 if metric in COUNTERS else 1000
+                values = [row[index] * scale for row in rows]
+                summary[name][metric] = {
+                    'mean': sum(values) / len(values),
+                    'p50': percentile(values, 50),
+                    'p95': percentile(values, 95),
+                    'max': max(values),
+                }
+        return summary
+
+    def flush(self, directory=None):
+        """Записывает сводку процесса в файл <pid>.json атомарно."""
+        directory = directory or settings.REQUEST_METRICS_DIR
+        self.flushed = time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{os.getpid()}.json')
+        with open(path + '.tmp', 'w', encoding='utf-8') as metrics_file:
+            json.dump({'pid': os.getpid(), 'updated': time.time(),
+                       'metrics': self.snapshot()}, metrics_file)
+        os.replace(path + '.tmp', path)
+
+
+aggregate = Aggregate()
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def load(directory=None):
+    """
+    Сводки процессов из REQUEST_METRICS_DIR. Сводки старше
+    REQUEST_METRICS_MAX_AGE секунд не учитываются, а их файлы, если
+    процесс уже завершился, удаляются.
+    """
+    directory = directory or settings.REQUEST_METRICS_DIR
+    if not os.path.isdir(directory):
+        return []
+    oldest = time.time() - settings.REQUEST_METRICS_MAX_AGE
+    snapshots = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.json'):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            with open(path, encoding='utf-8') as file:
+                snapshot = json.load(file)
+        except FileNotFoundError:
+            # Файл удалила параллельно запущенная команда
+            continue
+        if snapshot['updated'] >= oldest:
+            snapshots.append(snapshot)
+        elif not _alive(snapshot['pid']):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    return snapshots
+
+
+def merge(snapshots):
+    """
+    Общая сводка нескольких процессов: средние взвешиваются по размеру
+    окна, процентили и максимум берутся наибольшие — оценка сверху.
+    """
+    merged = {}
+    for snapshot in snapshots:
+        for name, row in snapshot['metrics'].items():
+            total = merged.setdefault(name, {'requests': 0, 'window': 0})
+            window = total['window'] + row['window']
+            for metric in METRICS:
+                old = total.get(metric)
+                new = row[metric]
+                if old is None:
+                    total[metric] = dict(new)
+                    continue
+                old['mean'] = (old['mean'] * total['window']
+                               + new['mean'] * row['window']) / window
+                for key in ('p50', 'p95', 'max'):
+                    old[key] = max(old[key], new[key])
+            total['requests'] += row['requests']
+            total['window'] = window
+    return merged
+
+
+def _url_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        # Ответ из кэша страниц отдан до разбора адреса
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return '<unresolved>'
+    return match.url_name or match.view_name
+
+
+class InstrumentationMiddleware:
+    """
+    Стоит первым в MIDDLEWARE, чтобы в замер попали все прослойки,
+    включая ответы из кэша страниц.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(metrics.execute))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        sample = metrics.sample()
+        if settings.REQUEST_METRICS_HEADER:
+            response['Server-Timing'] = metrics.server_timing(
+                sample['total'])
+        aggregate.add(_url_name(request), sample)
+        if (time.monotonic() - aggregate.flushed
+                >= settings.REQUEST_METRICS_FLUSH):
+            try:
+                aggregate.flush()
+            except OSError:
+                logger.exception('Не удалось сохранить замеры запросов')
+        return response
+
+
+class Template(django_backend.Template):
+    """Шаблон, время отрисовки которого попадает в замеры запроса."""
+
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(context, request)
+        # Вложенная отрисовка, например render_to_string в теге,
+        # уже учтена внешней
+        metrics.render_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.render_depth -= 1
+            if not metrics.render_depth:
+                metrics.render += time.perf_counter() - started
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """Стандартный движок шаблонов Django с замером отрисовки."""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except django_backend.TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
+
+
+class LocMemCache(locmem.LocMemCache):
+    """Кэш в памяти процесса со счётчиками попаданий и промахов."""
+
+    def get(self, key, default=None, version=None):
+        # get_many базового класса читает ключи через get
+        value = super().get(key, _missing, version)
+        if value is _missing:
+            record_cache(0, 1)
+            return default
+        record_cache(1, 0)
+        return value
+
+
+class SQLiteCache(sqlite_cache.SQLiteCache):
+    """Общий кэш в SQLite со счётчиками попаданий и промахов."""
+
+    def get_many(self, keys, version=None):
+        # get читает ключ через get_many
+        keys = list(keys)
+        found = super().get_many(keys, version)
+        record_cache(len(found), len(keys) - len(found))
+        return found
+
+
+@atexit.register
+def _flush_on_exit():
+    if aggregate.snapshot():
+        try:
+            aggregate.flush()
+        except OSError:
+            pass
@@ -0,0 +1,136 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import benchmark
+
+METRICS = ('p50', 'p95', 'p99', 'queries', 'bytes')
+
+
+class Command(BaseCommand):
+    help = ('Замеряет задержку, число запросов и размер страниц posts '
+            'на засеянных данных (см. seed_data) и сохраняет прогон')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'names', nargs='*', metavar='url_name',
+            help='Имена адресов из posts/urls.py или запросов (--queries); '
+                 'по умолчанию все')
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument(
+            '--base-url',
+            help='Замерять запущенный сервер по HTTP, а не тестовым '
+                 'клиентом в этом процессе')
+        parser.add_argument(
+            '--queries', action='store_true',
+            help='Замерять отдельные запросы к графу подписок')
+        parser.add_argument(
+            '--concurrency', action='store_true',
+            help='Замерить конкурентные чтение и запись на копиях базы '
+                 'со стандартными и настроенными параметрами SQLite')
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=1)
+        parser.add_argument(
+            '--duration', type=float, default=5.0,
+            help='Секунд на каждый профиль (--concurrency)')
+        parser.add_argument('--label', default='')
+        parser.add_argument(
+            '--no-save', action='store_true',
+            help='Не записывать прогон в хранилище результатов')
+        parser.add_argument(
+            '--compare', nargs='+', metavar='RUN',
+            help='Сравнить прогоны (номер или ревизия) вместо замера; '
+                 'с одним аргументом он сравнивается с последним')
+        parser.add_argument(
+            '--list', action='store_true', help='Показать прогоны')
+
+    def handle(self, *args, **options):
+        store = benchmark.ResultsStore()
+        if options['list']:
+            for run in store.runs():
+                self.stdout.write(
+                    f"{run['id']:>4} {run['revision'] or '-':<10} "
+                    f"{run['created'][:19]} {run['label']}")
+            return
+        if options['compare']:
+            return self.compare(store, *options['compare'][:2])
+        if options['concurrency']:
+            results = benchmark.run_concurrency(
+                options['readers'], options['writers'], options['duration'])
+            return self.finish(store, results, options)
+        if options['queries']:
+            results = benchmark.run_queries(
+                options['names'] or benchmark.QUERY_NAMES,
+                options['iterations'], options['warmup'])
+            return self.finish(store, results, options)
+        user, urls = benchmark.build_urls(
+            options['names'] or benchmark.URL_NAMES)
+        if not urls:
+            raise CommandError('Нет данных для замера: запустите seed_data')
+        if options['base_url']:
+            results = benchmark.run_http(
+                options['base_url'], urls, options['iterations'],
+                options['warmup'])
+        else:
+            results = benchmark.run_client(
+                urls, user, options['iterations'], options['warmup'])
+        self.finish(store, results, options)
+
+    def finish(self, store, results, options):
+        if not results:
+            raise CommandError('Нет данных для замера: запустите seed_data')
+        self.report(results)
+        if not options['no_save']:
+            run = store.save(results, label=options['label'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Прогон {run['id']} сохранён в {store.path}"))
+
+    def report(self, results):
+        if results and 'throughput' in results[0]:
+            return self.report_concurrency(results)
+        self.stdout.write(
+            f"{'url':<18}{'код':>5}{'p50 мс':>9}{'p95 мс':>9}"
+            f"{'p99 мс':>9}{'запросов':>10}{'байт':>9}")
+        for row in results:
+            status, queries, size = (
+                '-' if row[key] is None else row[key]
+                for key in ('status', 'queries', 'bytes'))
+            self.stdout.write(
+                f"{row['name']:<18}{status:>5}{row['p50']:>9.2f}"
+                f"{row['p95']:>9.2f}{row['p99']:>9.2f}{queries:>10}"
+                f"{size:>9}")
+
+    def report_concurrency(self, results):
+        self.stdout.write(
+            f"{'нагрузка':<18}{'оп/с':>9}{'p50 мс':>9}{'p95 мс':>9}"
+            f"{'p99 мс':>9}{'ошибок':>8}")
+        for row in results:
+            self.stdout.write(
+                f"{row['name']:<18}{row['throughput']:>9.1f}"
+                f"{row['p50']:>9.2f}{row['p95']:>9.2f}{row['p99']:>9.2f}"
+                f"{row['errors']:>8}")
+
+    def compare(self, store, base_ref, head_ref=None):
+        base = store.get(base_ref)
+        if head_ref is None:
+            head = next(iter(reversed(store.runs())), None)
+        else:
+            head = store.get(head_ref)
+        if base is None or head is None:
+            raise CommandError('Прогон не найден')
+        self.stdout.write(
+            f"Прогон {base['id']} ({base['revision']}) -> "
+            f"{head['id']} ({head['revision']})")
+        for name, changes in store.compare(base, head):
+            cells = []
+            for metric in METRICS:
+                before, after, change = changes[metric]
+                if before is None or after is None:
+                    continue
+                if isinstance(after, float):
+                    cell = f'{metric} {before:.2f}->{after:.2f}'
+                else:
+                    cell = f'{metric} {before}->{after}'
+                if change is not None:
+                    cell += f' ({change:+.0f}%)'
+                cells.append(cell)
+            self.stdout.write(f"{name:<18}" + '  '.join(cells))
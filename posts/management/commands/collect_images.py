@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from posts import blobs
+
+
+class Command(BaseCommand):
+    help = ('Удаляет изображения постов, на которые больше не ссылается '
+            'ни один пост, вместе с их миниатюрами')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=None,
+            help='Не трогать файлы, изменённые за последние N секунд')
+        parser.add_argument(
+            '--sweep', action='store_true',
+            help='Обойти каталог posts/ в поисках файлов без записей')
+
+    def handle(self, *args, **options):
+        deleted = blobs.collect_garbage(
+            grace=options['grace'], sweep=options['sweep'])
+        for name in deleted:
+            self.stdout.write(name)
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено файлов: {len(deleted)}'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = ('Возвращает раздачу постов в ленты авторам, у которых '
+            'стало мало подписчиков')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        demoted = timeline.demote_pending(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Авторов возвращено к раздаче: {demoted}'))
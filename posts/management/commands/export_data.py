@@ -0,0 +1,45 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import bulk
+
+
+class Command(BaseCommand):
+    help = ('Выгружает пользователей, группы, посты, комментарии '
+            'и подписки в NDJSON или CSV, по файлу <вид>.<формат>')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'kinds', nargs='*',
+            help='Что выгружать: {}; по умолчанию всё'.format(
+                ', '.join(bulk.MODELS)))
+        parser.add_argument(
+            '--format', choices=bulk.FORMATS, default='ndjson')
+        parser.add_argument(
+            '--output', default='.',
+            help='Каталог для файлов или - для вывода одного вида '
+                 'в stdout')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        kinds = options['kinds'] or list(bulk.MODELS)
+        unknown = set(kinds) - set(bulk.MODELS)
+        if unknown:
+            raise CommandError(
+                'Неизвестные виды данных: ' + ', '.join(sorted(unknown)))
+        data_format = options['format']
+        if options['output'] == '-':
+            if len(kinds) != 1:
+                raise CommandError('В stdout выгружается только один вид')
+            bulk.write(kinds[0], self.stdout, data_format,
+                       options['chunk_size'])
+            return
+        os.makedirs(options['output'], exist_ok=True)
+        for kind in kinds:
+            path = os.path.join(options['output'], f'{kind}.{data_format}')
+            with open(path, 'w', encoding='utf-8', newline='') as stream:
+                count = bulk.write(kind, stream, data_format,
+                                   options['chunk_size'])
+            self.stdout.write(f'{kind}: {count} → {path}')
+        self.stdout.write(self.style.SUCCESS('Выгрузка завершена'))
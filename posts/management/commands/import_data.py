@@ -0,0 +1,48 @@
+import os
+import sys
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import bulk
+
+
+class Command(BaseCommand):
+    help = ('Загружает файлы export_data одной транзакцией массовыми '
+            'вставками и пересчитывает счётчики, ленты и поиск')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='+',
+            help='Файлы <вид>.ndjson или <вид>.csv; - читает stdin')
+        parser.add_argument(
+            '--kind', choices=list(bulk.MODELS),
+            help='Вид данных, если его не видно по имени файла')
+        parser.add_argument('--format', choices=bulk.FORMATS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def source(self, path, options):
+        stem, extension = os.path.splitext(os.path.basename(path))
+        kind = options['kind'] or stem
+        data_format = options['format'] or extension.lstrip('.') or 'ndjson'
+        if kind not in bulk.MODELS:
+            raise CommandError(f'Неизвестный вид данных: {path}')
+        if data_format not in bulk.FORMATS:
+            raise CommandError(f'Неизвестный формат: {path}')
+        return kind, data_format
+
+    def handle(self, *args, **options):
+        with ExitStack() as stack:
+            sources = []
+            for path in options['paths']:
+                kind, data_format = self.source(path, options)
+                if path == '-':
+                    stream = sys.stdin
+                else:
+                    stream = stack.enter_context(
+                        open(path, encoding='utf-8', newline=''))
+                sources.append((kind, stream, data_format))
+            counts = bulk.import_data(sources, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            'Загружено: ' + ', '.join(
+                f'{kind} {count}' for kind, count in counts.items())))
@@ -0,0 +1,54 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+
+from posts import fragment_cache, images, thumbnails
+from posts.models import ImageBlob, Post
+
+
+def reprocess(post):
+    """
+    Перекодирует уже сохранённое изображение поста. Оригинал остаётся
+    в хранилище без ссылки от поста, его удалит сборщик мусора.
+    Возвращает False, если файл не удалось обработать.
+    """
+    original = post.image.name
+    try:
+        with post.image.open('rb') as source:
+            processed = images.process(source)
+    except (OSError, ValidationError):
+        return False
+    with processed:
+        post.image.save(processed.name, processed, save=False)
+    post.image_hash = processed.content_hash
+    post.image_width, post.image_height = processed.image_size
+    Post.objects.filter(pk=post.pk).update(
+        image=post.image.name, image_hash=post.image_hash,
+        image_width=post.image_width, image_height=post.image_height)
+    if post.image.name != original:
+        ImageBlob.objects.change(post.image.name, 1)
+        ImageBlob.objects.change(original, -1)
+    return True
+
+
+class Command(BaseCommand):
+    help = ('Уменьшает и перекодирует изображения постов, загруженные '
+            'до обработки при загрузке')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').exclude(image=None).filter(
+            image_hash='').only('pk', 'image', 'author_id', 'group_id')
+        processed = failed = 0
+        for post in posts.iterator(chunk_size=options['batch_size']):
+            if not reprocess(post):
+                failed += 1
+                self.stderr.write(f'Пост {post.pk}: не удалось обработать '
+                                  f'{post.image.name}')
+                continue
+            processed += 1
+            fragment_cache.bump_post(post)
+            thumbnails.prepare(post.image)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {processed}, с ошибками: {failed}'))
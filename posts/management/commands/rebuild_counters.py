@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.models import GroupStats, Post, UserStats
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики записей, подписок, комментариев '
+            'и статистику групп')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            posts = Post.objects.rebuild_comment_counts()
+            UserStats.objects.rebuild(batch_size=options['batch_size'])
+            GroupStats.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитаны счётчики: постов {posts}, '
+            f'пользователей {UserStats.objects.count()}, '
+            f'групп {GroupStats.objects.count()}'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Строит полнотекстовый индекс постов заново'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not search.fts_available():
+            raise CommandError('Индекс FTS5 не создан: нужна база SQLite')
+        with transaction.atomic():
+            search.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс построен'))
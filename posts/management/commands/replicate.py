@@ -0,0 +1,29 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import replica
+
+
+class Command(BaseCommand):
+    help = 'Копирует основную базу в файл реплики для чтения лент'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--every', type=float, default=None,
+            help='Повторять копирование каждые N секунд')
+
+    def handle(self, *args, **options):
+        if not replica.enabled():
+            raise CommandError(
+                'Реплика не настроена: задайте DB_REPLICA_NAME')
+        while True:
+            try:
+                replica.replicate()
+            except sqlite3.Error as error:
+                raise CommandError(error)
+            self.stdout.write(self.style.SUCCESS('Реплика обновлена'))
+            if not options['every']:
+                return
+            time.sleep(options['every'])
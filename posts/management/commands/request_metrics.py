@@ -0,0 +1,51 @@
+import json
+import os
+import shutil
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import instrumentation
+
+
+class Command(BaseCommand):
+    help = ('Сводка замеров запросов по адресам из всех процессов: '
+            'время, запросы к базе, отрисовка, миниатюры и кэш')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true',
+                            help='Вывести сводку в JSON')
+        parser.add_argument('--reset', action='store_true',
+                            help='Удалить сохранённые замеры')
+
+    def handle(self, *args, **options):
+        directory = settings.REQUEST_METRICS_DIR
+        if options['reset']:
+            if os.path.isdir(directory):
+                shutil.rmtree(directory)
+            self.stdout.write(self.style.SUCCESS('Замеры удалены'))
+            return
+        snapshots = instrumentation.load(directory)
+        merged = instrumentation.merge(snapshots)
+        if options['json']:
+            self.stdout.write(json.dumps(merged, ensure_ascii=False))
+            return
+        self.stdout.write(f'Процессов: {len(snapshots)}')
+        self.report(merged)
+
+    def report(self, merged):
+        self.stdout.write(
+            f"{'url':<20}{'всего':>8}{'p50 мс':>9}{'p95 мс':>9}"
+            f"{'база мс':>9}{'запросов':>10}{'шаблон мс':>11}"
+            f"{'миниатюры мс':>14}{'кэш +/-':>11}")
+        rows = sorted(merged.items(),
+                      key=lambda item: -item[1]['total']['p95'])
+        for name, row in rows:
+            cache = (f"{row['cache_hits']['mean']:.0f}/"
+                     f"{row['cache_misses']['mean']:.0f}")
+            self.stdout.write(
+                f"{name:<20}{row['requests']:>8}"
+                f"{row['total']['p50']:>9.2f}{row['total']['p95']:>9.2f}"
+                f"{row['db']['mean']:>9.2f}{row['queries']['max']:>10}"
+                f"{row['render']['mean']:>11.2f}"
+                f"{row['thumbnail']['mean']:>14.2f}{cache:>11}")
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from posts import seed
+
+
+class Command(BaseCommand):
+    help = 'Заполняет базу данными для нагрузочных замеров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--groups', type=int, default=10)
+        parser.add_argument('--posts', type=int, default=1000)
+        parser.add_argument('--comments', type=int, default=3000)
+        parser.add_argument(
+            '--follows', type=int, default=2000,
+            help='Сколько подписок попытаться создать; повторы '
+                 'отбрасываются, поэтому их будет меньше')
+        parser.add_argument(
+            '--exponent', type=float, default=1.2,
+            help='Показатель степенного распределения подписчиков')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        created = seed.seed(
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            comments=options['comments'],
+            follows=options['follows'],
+            exponent=options['exponent'],
+            random_seed=options['seed'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            'Создано: ' + ', '.join(
+                f'{name} {count}' for name, count in created.items())))
@@ -0,0 +1,38 @@
+from django.db import migrations, OperationalError
+
+from posts.stemmer import stems
+
+FTS_TABLE = 'posts_post_fts'
+
+
+def create_index(apps, schema_editor):
+    # Индекс FTS5 есть только в SQLite, иначе поиск работает без него
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Post = apps.get_model('posts', 'Post')
+    try:
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5('
+            "text, tokenize = 'unicode61 remove_diacritics 0')")
+    except OperationalError:
+        return
+    for post_id, text in Post.objects.values_list('pk', 'text').iterator():
+        schema_editor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)',
+            [post_id, ' '.join(stems(text))])
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_feed_entry'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
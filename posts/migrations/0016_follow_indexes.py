@@ -0,0 +1,52 @@
+# Generated by Django 2.2.6 on 2026-10-18 20:27
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+import django.db.models.deletion
+
+
+def remove_duplicates(apps, schema_editor):
+    """Оставляет по одной подписке на пару и поправляет счётчики."""
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats = apps.get_model('posts', 'UserStats')
+    duplicates = Follow.objects.values('user', 'author').order_by().annotate(
+        total=Count('pk'), keep=Min('pk')).filter(total__gt=1)
+    for pair in duplicates:
+        Follow.objects.filter(
+            user_id=pair['user'], author_id=pair['author']
+        ).exclude(pk=pair['keep']).delete()
+        extra = pair['total'] - 1
+        UserStats.objects.filter(user_id=pair['user']).update(
+            following_count=models.F('following_count') - extra)
+        UserStats.objects.filter(user_id=pair['author']).update(
+            followers_count=models.F('followers_count') - extra)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_post_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['author', 'user'], name='follow_author_idx'),
+        ),
+        migrations.AlterField(
+            model_name='follow',
+            name='author',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='following', to=settings.AUTH_USER_MODEL, verbose_name='Автор'),
+        ),
+        migrations.AlterField(
+            model_name='follow',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='follower', to=settings.AUTH_USER_MODEL, verbose_name='Подписчик'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 2.2.6 on 2026-10-18 20:46
+
+from django.db import migrations, models
+from django.db.models import Count
+import django.utils.timezone
+import posts.storage
+
+
+def count_references(apps, schema_editor):
+    """Записи ImageBlob для файлов, уже загруженных к постам."""
+    ImageBlob = apps.get_model('posts', 'ImageBlob')
+    Post = apps.get_model('posts', 'Post')
+    rows = Post.objects.exclude(image='').exclude(image=None).order_by(
+    ).values('image').annotate(total=Count('pk'))
+    ImageBlob.objects.bulk_create(
+        ImageBlob(name=row['image'], refcount=row['total'])
+        for row in rows.iterator())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_post_image_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='Файл')),
+                ('refcount', models.IntegerField(default=0, verbose_name='Ссылок')),
+                ('updated', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Изменён')),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=posts.storage.ContentAddressedStorage(), upload_to='posts/'),
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
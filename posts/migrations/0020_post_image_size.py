@@ -0,0 +1,39 @@
+# Generated by Django 2.2.6 on 2026-10-18 20:49
+
+from django.db import migrations, models
+from PIL import Image
+
+
+def read_sizes(apps, schema_editor):
+    """Размеры уже загруженных изображений: читается только заголовок."""
+    Post = apps.get_model('posts', 'Post')
+    posts = Post.objects.exclude(image='').exclude(image=None).only('image')
+    for post in posts.iterator():
+        try:
+            with post.image.open('rb') as image_file:
+                width, height = Image.open(image_file).size
+        except OSError:
+            continue
+        Post.objects.filter(pk=post.pk).update(
+            image_width=width, image_height=height)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_image_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Высота изображения'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Ширина изображения'),
+        ),
+        migrations.RunPython(read_sizes, migrations.RunPython.noop),
+    ]
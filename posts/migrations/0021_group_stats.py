@@ -0,0 +1,48 @@
+# Generated by Django 2.2.6 on 2026-10-18 20:57
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+import django.db.models.deletion
+
+
+def fill_group_stats(apps, schema_editor):
+    Group = apps.get_model('posts', 'Group')
+    GroupStats = apps.get_model('posts', 'GroupStats')
+    groups = Group.objects.order_by().annotate(
+        posts_total=Count('posts'),
+        authors_total=Count('posts__author', distinct=True),
+        last=Max('posts__pub_date'),
+    )
+    GroupStats.objects.bulk_create(
+        GroupStats(
+            group_id=group.pk,
+            posts_count=group.posts_total,
+            authors_count=group.authors_total,
+            last_post=group.last,
+        )
+        for group in groups.iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_post_image_size'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupStats',
+            fields=[
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='posts.Group', verbose_name='Группа')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Записей')),
+                ('authors_count', models.PositiveIntegerField(default=0, verbose_name='Авторов')),
+                ('last_post', models.DateTimeField(blank=True, null=True, verbose_name='Последняя запись')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='groupstats',
+            index=models.Index(fields=['-last_post'], name='group_activity_idx'),
+        ),
+        migrations.RunPython(fill_group_stats, migrations.RunPython.noop),
+    ]
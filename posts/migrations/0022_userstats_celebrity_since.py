@@ -0,0 +1,28 @@
+# Generated by Django 2.2.6 on 2026-10-18 21:54
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def mark_celebrities(apps, schema_editor):
+    UserStats = apps.get_model('posts', 'UserStats')
+    UserStats.objects.filter(
+        followers_count__gte=settings.FEED_FANOUT_LIMIT,
+    ).update(celebrity_since=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_group_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='celebrity_since',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Популярен с'),
+        ),
+        migrations.RunPython(mark_celebrities, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,24 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery, signals
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .storage import post_image_storage
 
 User = get_user_model()
 
 
+def count_subquery(model, field):
+    """Подзапрос с числом строк model, ссылающихся на внешнюю строку."""
+    rows = model.objects.filter(**{field: OuterRef('pk')}).order_by()
+    return Coalesce(Subquery(
+        rows.values(field).annotate(total=Count('pk')).values('total'),
+        output_field=models.IntegerField()
+    ), 0)
+
+
 class Group(models.Model):
     title = models.CharField(max_length=200,
                              help_text='Название группы',
@@ -18,21 +33,37 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+
+    def for_feed(self):
+        """
+        Посты вместе с автором и группой одним запросом —
+        всё, что нужно карточке поста.
+        """
+        return self.select_related('author', 'group')
+
+    def rebuild_comment_counts(self):
+        """Пересчитывает счётчики комментариев с нуля."""
+        return self.update(comment_count=count_subquery(Comment, 'post'))
+
+
 class Post(models.Model):
     text = models.TextField(
         help_text='Текст поста',
         verbose_name='Текст'
     )
+    # Отдельные индексы по дате и внешним ключам не нужны: их заменяют
+    # составные индексы лент в Meta.indexes
     pub_date = models.DateTimeField(
         'date published',
-        auto_now_add=True,
-        db_index=True
+        auto_now_add=True
     )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='posts',
-        verbose_name='Автор'
+        verbose_name='Автор',
+        db_index=False
     )
     group = models.ForeignKey(
         Group,
@@ -41,12 +72,46 @@ class Post(models.Model):
         null=True,
         related_name='posts',
         help_text='Группа',
-        verbose_name='Группа'
+        verbose_name='Группа',
+        db_index=False
+    )
+    image = models.ImageField(
+        upload_to='posts/',
+        storage=post_image_storage,
+        blank=True,
+        null=True
+    )
+    image_hash = models.CharField(
+        'SHA-256 изображения',
+        max_length=64,
+        blank=True,
+        editable=False
+    )
+    # Размеры сохранённого изображения: страница резервирует место
+    # под картинку до её загрузки
+    image_width = models.PositiveIntegerField(
+        'Ширина изображения', null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField(
+        'Высота изображения', null=True, blank=True, editable=False)
+    comment_count = models.PositiveIntegerField(
+        'Комментариев',
+        default=0,
+        editable=False
     )
-    image = models.ImageField(upload_to='posts/', blank=True, null=True)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
+        # Ленты упорядочены по (pub_date, id), как курсор пагинатора,
+        # и читаются диапазоном индекса без сортировки
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'], name='post_feed_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_feed_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_feed_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -56,7 +121,8 @@ class Comment(models.Model):
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
-        related_name='comments'
+        related_name='comments',
+        db_index=False
     )
     author = models.ForeignKey(
         User,
@@ -72,21 +138,369 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(fields=['post', '-created', '-id'],
+                         name='comment_post_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
 
+class FollowQuerySet(models.QuerySet):
+
+    def follow(self, user, author):
+        """
+        Подписывает пользователя на автора. Повторная или параллельная
+        подписка упирается в уникальность пары и ничего не меняет.
+        Возвращает True, если подписка создана.
+        """
+        try:
+            with transaction.atomic(using=self.db):
+                self.create(user=user, author=author)
+        except IntegrityError:
+            return False
+        return True
+
+    def unfollow(self, user, author):
+        """
+        Отписывает пользователя от автора. Сигнал удаления отправляется,
+        только если строку удалил именно этот вызов, поэтому параллельные
+        отписки не уменьшают счётчики дважды. Возвращает True,
+        если подписка удалена.
+        """
+        follow = self.filter(user=user, author=author).first()
+        if follow is None:
+            return False
+        with transaction.atomic(using=self.db):
+            # Удаление без сборщика Django, чтобы узнать число строк
+            deleted = self.filter(pk=follow.pk)._raw_delete(self.db)
+            if deleted:
+                signals.post_delete.send(
+                    sender=self.model, instance=follow, using=self.db)
+        return bool(deleted)
+
+
 class Follow(models.Model):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='follower',
-        verbose_name='Подписчик'
+        verbose_name='Подписчик',
+        # Запросы по подписчику обслуживает уникальный индекс пары
+        db_index=False
     )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='following',
+        verbose_name='Автор',
+        db_index=False
+    )
+
+    objects = FollowQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'], name='unique_follow'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'], name='follow_author_idx'),
+        ]
+
+
+class UserStatsQuerySet(models.QuerySet):
+
+    def change(self, user_id, **deltas):
+        """
+        Атомарно сдвигает счётчики пользователя на заданные величины.
+        Строка создаётся только при увеличении счётчиков, чтобы
+        каскадное удаление пользователя не воссоздавало её. Уменьшение
+        не опускает разошедшийся счётчик ниже нуля: поле беззнаковое.
+        """
+        changes = {
+            field: Greatest(F(field) + delta, 0) if delta < 0
+            else F(field) + delta
+            for field, delta in deltas.items()
+        }
+        if self.filter(user_id=user_id).update(**changes):
+            return
+        if min(deltas.values()) > 0:
+            _, created = self.get_or_create(user_id=user_id, defaults=deltas)
+            if not created:
+                self.filter(user_id=user_id).update(**changes)
+
+    def rebuild(self, batch_size=1000, users=None):
+        """
+        Пересчитывает счётчики с нуля: всех пользователей или только
+        users — подзапроса или списка id. Отметка популярности
+        сохраняется (снимает её timeline.demote_pending) и ставится
+        авторам, набравшим FEED_FANOUT_LIMIT подписчиков.
+        """
+        users_rows = User.objects.order_by()
+        stats = self.all()
+        if users is not None:
+            stats = self.filter(user_id__in=users)
+            users_rows = users_rows.filter(pk__in=users)
+        celebrities = dict(stats.filter(
+            celebrity_since__isnull=False
+        ).values_list('user_id', 'celebrity_since'))
+        stats.delete()
+        now = timezone.now()
+        users = users_rows.annotate(
+            posts_total=count_subquery(Post, 'author'),
+            followers_total=count_subquery(Follow, 'author'),
+            following_total=count_subquery(Follow, 'user'),
+        ).values_list(
+            'pk', 'posts_total', 'followers_total', 'following_total')
+        batch = []
+        for user_id, posts, followers, following in users.iterator(
+                chunk_size=batch_size):
+            since = celebrities.get(user_id)
+            if since is None and followers >= settings.FEED_FANOUT_LIMIT:
+                since = now
+            batch.append(self.model(
+                user_id=user_id,
+                posts_count=posts,
+                followers_count=followers,
+                following_count=following,
+                celebrity_since=since,
+            ))
+            if len(batch) >= batch_size:
+                self.bulk_create(batch)
+                batch = []
+        self.bulk_create(batch)
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField('Записей', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+    # С этого момента посты автора не раздаются в ленты, а подмешиваются
+    # при чтении (posts/timeline.py); None — автор не популярный
+    celebrity_since = models.DateTimeField(
+        'Популярен с', null=True, blank=True)
+
+    objects = UserStatsQuerySet.as_manager()
+
+    @classmethod
+    def for_user(cls, user):
+        """Счётчики пользователя; у новых пользователей строки ещё нет."""
+        try:
+            return user.stats
+        except cls.DoesNotExist:
+            return cls(user=user)
+
+    def __str__(self):
+        return str(self.user)
+
+
+class GroupStatsQuerySet(models.QuerySet):
+
+    def _last_post(self, group_id):
+        # Дата последнего поста — один шаг по индексу ленты группы
+        return Subquery(Post.objects.filter(group_id=group_id).order_by(
+            '-pub_date').values('pub_date')[:1])
+
+    def _other_posts(self, group_id, post):
+        return Post.objects.filter(
+            group_id=group_id, author_id=post.author_id).exclude(
+            pk=post.pk).exists()
+
+    def add_post(self, group_id, post):
+        """Пост появился в группе: создан или перенесён из другой."""
+        authors = 0 if self._other_posts(group_id, post) else 1
+        updated = self.filter(group_id=group_id).update(
+            posts_count=F('posts_count') + 1,
+            authors_count=F('authors_count') + authors,
+            last_post=self._last_post(group_id))
+        if not updated:
+            self.refresh(group_id)
+
+    def remove_post(self, group_id, post):
+        """Пост ушёл из группы: удалён или перенесён в другую."""
+        changes = {'posts_count': F('posts_count') - 1,
+                   'last_post': self._last_post(group_id)}
+        if not self._other_posts(group_id, post):
+            # Последний пост автора в группе. При удалении набора постов
+            # сигналы приходят, когда удалены уже все, поэтому авторы
+            # пересчитываются, а не уменьшаются на единицу
+            rows = Post.objects.filter(group_id=group_id).order_by()
+            changes['authors_count'] = Coalesce(Subquery(
+                rows.values('group_id').annotate(
+                    total=Count('author_id', distinct=True)
+                ).values('total'),
+                output_field=models.IntegerField()), 0)
+        self.filter(group_id=group_id).update(**changes)
+
+    def refresh(self, group_id):
+        """Пересчитывает строку одной группы с нуля."""
+        posts = Post.objects.filter(group_id=group_id).order_by()
+        totals = posts.aggregate(
+            posts=Count('pk'), authors=Count('author', distinct=True),
+            last=Max('pub_date'))
+        self.update_or_create(group_id=group_id, defaults={
+            'posts_count': totals['posts'],
+            'authors_count': totals['authors'],
+            'last_post': totals['last'],
+        })
+
+    def rebuild(self, groups=None):
+        """
+        Пересчитывает статистику с нуля: всех групп или только groups —
+        подзапроса или списка id.
+        """
+        rows = Group.objects.order_by()
+        if groups is None:
+            self.all().delete()
+        else:
+            self.filter(group_id__in=groups).delete()
+            rows = rows.filter(pk__in=groups)
+        groups = rows.annotate(
+            posts_total=Count('posts'),
+            authors_total=Count('posts__author', distinct=True),
+            last=Max('posts__pub_date'),
+        ).values_list('pk', 'posts_total', 'authors_total', 'last')
+        self.bulk_create(
+            self.model(group_id=group_id, posts_count=posts,
+                       authors_count=authors, last_post=last)
+            for group_id, posts, authors, last in groups)
+
+
+class GroupStats(models.Model):
+    """
+    Материализованная статистика группы для каталога групп: строки
+    обновляются вместе с постами, и каталог не агрегирует Post.
+    """
+    group = models.OneToOneField(
+        Group,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Группа'
+    )
+    posts_count = models.PositiveIntegerField('Записей', default=0)
+    authors_count = models.PositiveIntegerField('Авторов', default=0)
+    last_post = models.DateTimeField('Последняя запись', null=True,
+                                     blank=True)
+
+    objects = GroupStatsQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-last_post'], name='group_activity_idx'),
+        ]
+
+    def __str__(self):
+        return str(self.group)
+
+
+class FeedEntry(models.Model):
+    """
+    Запись материализованной ленты подписок: пост автора,
+    на которого подписан пользователь.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Подписчик'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пост'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
         verbose_name='Автор'
     )
+    pub_date = models.DateTimeField('date published')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_feed_entry'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='feed_entry_timeline_idx'),
+            models.Index(
+                fields=['user', 'author'], name='feed_entry_author_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} <- {self.post}'
+
+
+class ImageBlobQuerySet(models.QuerySet):
+
+    def change(self, name, delta):
+        """
+        Сдвигает число ссылок на файл изображения. Время изменения
+        обновляется, чтобы сборщик мусора не тронул файл, на который
+        только что ссылались.
+        """
+        if not name:
+            return
+        now = timezone.now()
+        changes = {'refcount': F('refcount') + delta, 'updated': now}
+        if self.filter(name=name).update(**changes):
+            return
+        _, created = self.get_or_create(
+            name=name, defaults={'refcount': delta, 'updated': now})
+        if not created:
+            self.filter(name=name).update(**changes)
+
+    def recount(self, names):
+        """Пересчитывает ссылки на перечисленные файлы по постам."""
+        names = list(names)
+        for start in range(0, len(names), 500):
+            self.filter(name__in=names[start:start + 500]).update(
+                refcount=count_subquery(Post, 'image'),
+                updated=timezone.now())
+
+    def rebuild(self, posts=None):
+        """
+        Заводит записи для всех файлов, на которые ссылаются посты,
+        или только для файлов постов posts — подзапроса или списка id.
+        """
+        rows = Post.objects.exclude(image='').exclude(image=None).order_by()
+        if posts is None:
+            self.all().delete()
+        else:
+            names = rows.filter(pk__in=posts).values('image')
+            self.filter(name__in=names).delete()
+            rows = rows.filter(image__in=names)
+        rows = rows.values('image').annotate(total=Count('pk'))
+        self.bulk_create(
+            self.model(name=row['image'], refcount=row['total'])
+            for row in rows.iterator())
+
+
+class ImageBlob(models.Model):
+    """
+    Файл в хранилище изображений и число постов, которые на него
+    ссылаются. Файлы без ссылок удаляет posts.blobs.collect_garbage.
+    """
+    name = models.CharField('Файл', max_length=100, primary_key=True)
+    refcount = models.IntegerField('Ссылок', default=0)
+    updated = models.DateTimeField('Изменён', default=timezone.now)
+
+    objects = ImageBlobQuerySet.as_manager()
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,91 @@
+"""
+Кэш целых страниц для анонимных читателей. Ответ хранится по адресу
+с параметрами вместе с версией областей кэша фрагментов, из которых
+он собран. Изменение поста, комментария, группы или подписки
+увеличивает версии своих областей, и устаревшие страницы — общая
+лента, группа, профиль, пост — перестают отдаваться без перебора
+ключей.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+
+from . import fragment_cache
+
+PAGE_KEY = 'page:{}'
+
+
+def mark(response, scopes, version, last_modified, replica_read=False):
+    """
+    Разрешает сохранить ответ: он публичный и собран по версии version
+    областей scopes; replica_read — данные прочитаны с реплики.
+    """
+    response._page_cache = {
+        'scopes': scopes,
+        'version': version,
+        'last_modified': last_modified,
+        'replica_read': replica_read,
+    }
+    return response
+
+
+def _key(request):
+    url = request.get_host() + request.get_full_path()
+    return PAGE_KEY.format(hashlib.md5(url.encode()).hexdigest())
+
+
+def _cacheable(request):
+    """Анонимный GET без сессии: ответ не зависит от пользователя."""
+    return (request.method == 'GET'
+            and settings.SESSION_COOKIE_NAME not in request.COOKIES)
+
+
+def _response(entry):
+    response = HttpResponse(entry['content'], status=entry['status'])
+    for header, value in entry['headers']:
+        response[header] = value
+    return response
+
+
+class PageCacheMiddleware:
+    """
+    Стоит первым в MIDDLEWARE: попадание в кэш отдаётся без сессии,
+    пользователя и запросов к базе, а сохраняется ответ уже со всеми
+    заголовками остальных прослоек.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not _cacheable(request):
+            return self.get_response(request)
+        key = _key(request)
+        entry = cache.get(key)
+        if entry is not None and entry['version'] == (
+                fragment_cache.get_version(
+                    *entry['scopes'],
+                    replica_read=entry.get('replica_read', False))):
+            return get_conditional_response(
+                request, etag=entry['etag'],
+                last_modified=entry['last_modified'],
+                response=_response(entry))
+        response = self.get_response(request)
+        self.save(key, response)
+        return response
+
+    def save(self, key, response):
+        page = getattr(response, '_page_cache', None)
+        if (page is None or response.status_code != 200
+                or response.streaming or response.cookies):
+            return
+        cache.set(key, {
+            'content': response.content,
+            'status': response.status_code,
+            'headers': list(response.items()),
+            'etag': response.get('ETag'),
+            **page,
+        }, settings.PAGE_CACHE_TIMEOUT)
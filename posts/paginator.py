@@ -0,0 +1,190 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.encoding import force_bytes, force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+CURSOR_SEPARATOR = '|'
+
+
+class CursorPage(Page):
+    """
+    Страница ленты, которая знает о соседних страницах
+    без подсчёта общего количества записей.
+    """
+
+    def __init__(self, object_list, paginator, key,
+                 has_next, has_previous, number=None):
+        super().__init__(object_list, number, paginator)
+        self.key = key
+        self._has_next = has_next
+        self._has_previous = has_previous
+        # Курсоры считаются сразу: вьюха может заменить object_list
+        self.next_cursor = None
+        self.previous_cursor = None
+        if object_list and has_next:
+            self.next_cursor = paginator.encode_cursor(object_list[-1])
+        if object_list and has_previous:
+            self.previous_cursor = paginator.encode_cursor(object_list[0])
+
+    def __repr__(self):
+        return '<Page %s>' % self.key
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+
+class CursorPaginator(Paginator):
+    """
+    Keyset-пагинация по упорядоченному набору полей, по умолчанию
+    (pub_date, id). Не выполняет COUNT(*) и не использует OFFSET
+    при переходе по курсорам; номер страницы (?page=) поддерживается
+    для совместимости со старыми ссылками.
+
+    Общего числа записей и страниц нет: count, num_pages и page_range
+    (а с ними start_index и next_page_number страницы) поднимают
+    NotImplementedError вместо скрытого COUNT(*). Вьюхи передают
+    в контекст наследников Paginator и Page, а не сами эти классы.
+    """
+
+    def __init__(self, object_list, per_page,
+                 ordering=('-pub_date', '-id'), **kwargs):
+        super().__init__(object_list.order_by(*ordering), per_page, **kwargs)
+        self.ordering = ordering
+        self.fields = [field.lstrip('-') for field in ordering]
+
+    def _uncounted(self, name):
+        raise NotImplementedError(
+            f'{type(self).__name__}.{name}: keyset-пагинация не считает '
+            'записи, используйте has_next() и курсоры страницы')
+
+    @property
+    def count(self):
+        self._uncounted('count')
+
+    @property
+    def num_pages(self):
+        self._uncounted('num_pages')
+
+    @property
+    def page_range(self):
+        self._uncounted('page_range')
+
+    def page(self, number):
+        return self.get_page(number)
+
+    def encode_cursor(self, obj):
+        values = []
+        for field in self.fields:
+            value = getattr(obj, field)
+            if hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            values.append(str(value))
+        return urlsafe_base64_encode(
+            force_bytes(CURSOR_SEPARATOR.join(values)))
+
+    def decode_cursor(self, cursor):
+        try:
+            raw = force_str(urlsafe_base64_decode(cursor))
+        except (ValueError, UnicodeDecodeError):
+            return None
+        values = raw.split(CURSOR_SEPARATOR)
+        if len(values) != len(self.fields):
+            return None
+        opts = self.object_list.model._meta
+        try:
+            return [
+                opts.get_field(field).to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+        except ValidationError:
+            return None
+
+    def _keyset_filter(self, values, forward=True):
+        """
+        Условие «строго после» (или «строго до») курсора
+        в лексикографическом порядке полей сортировки.
+        """
+        condition = Q()
+        equal = Q()
+        for ordering, field, value in zip(self.ordering, self.fields, values):
+            descending = ordering.startswith('-')
+            lookup = 'lt' if descending == forward else 'gt'
+            condition |= equal & Q(**{f'{field}__{lookup}': value})
+            equal &= Q(**{field: value})
+        return condition
+
+    def _fetch(self, condition=None, reverse=False, offset=0, limit=None):
+        """Строки набора за условием condition в нужном порядке."""
+        rows = self.object_list
+        if condition is not None:
+            rows = rows.filter(condition)
+        if reverse:
+            rows = rows.reverse()
+        return list(rows[offset:offset + limit])
+
+    def _page_after(self, cursor, values):
+        rows = self._fetch(self._keyset_filter(values),
+                           limit=self.per_page + 1)
+        if not rows:
+            return self._last_page()
+        return CursorPage(rows[:self.per_page], self, f'after:{cursor}',
+                          has_next=len(rows) > self.per_page,
+                          has_previous=True)
+
+    def _page_before(self, cursor, values):
+        rows = self._fetch(self._keyset_filter(values, forward=False),
+                           reverse=True, limit=self.per_page + 1)
+        if not rows:
+            return self._page_number(1)
+        return CursorPage(rows[:self.per_page][::-1], self,
+                          f'before:{cursor}', has_next=True,
+                          has_previous=len(rows) > self.per_page)
+
+    def _page_number(self, number):
+        rows = self._fetch(offset=(number - 1) * self.per_page,
+                           limit=self.per_page + 1)
+        if not rows and number > 1:
+            return self._last_page()
+        return CursorPage(rows[:self.per_page], self, str(number),
+                          has_next=len(rows) > self.per_page,
+                          has_previous=number > 1, number=number)
+
+    def _last_page(self):
+        rows = self._fetch(reverse=True, limit=self.per_page + 1)
+        return CursorPage(rows[:self.per_page][::-1], self, 'last',
+                          has_next=False,
+                          has_previous=len(rows) > self.per_page)
+
+    def get_page(self, number=None, after=None, before=None):
+        """
+        Возвращает страницу по курсору after/before или по номеру.
+        Некорректные значения приводят к первой странице.
+        """
+        for cursor, method in ((after, self._page_after),
+                               (before, self._page_before)):
+            if cursor:
+                values = self.decode_cursor(cursor)
+                if values is not None:
+                    return method(cursor, values)
+        try:
+            number = max(int(number), 1)
+        except (TypeError, ValueError):
+            number = 1
+        return self._page_number(number)
+
+
+def paginate(request, object_list, per_page=None,
+             paginator_class=CursorPaginator, **kwargs):
+    """Страница ленты по параметрам запроса ?after=, ?before= или ?page=."""
+    paginator = paginator_class(
+        object_list, per_page or settings.PAR_PAGE, **kwargs)
+    return paginator.get_page(
+        request.GET.get('page'),
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
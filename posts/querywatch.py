@@ -0,0 +1,184 @@
+"""
+Слежение за запросами к базе внутри запроса: повторяющиеся запросы
+одной формы (N+1) с местом в шаблоне и коде, откуда они пришли,
+медленные запросы с планом EXPLAIN QUERY PLAN и бюджеты числа запросов
+вьюх. В обычной работе нарушения пишутся в лог, в тестах превышение
+бюджета роняет тест (posts.testing: раннер manage.py test и плагин
+pytest).
+"""
+import logging
+import os
+import re
+import sys
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import DatabaseError, NotSupportedError, connections
+
+logger = logging.getLogger(__name__)
+
+# Списки параметров IN (%s, %s, ...) разной длины — одна форма запроса
+IN_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+_ignored_files = (os.path.abspath(__file__), os.sep + 'site-packages' + os.sep)
+_violations = None
+_strict = False
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Вьюха сделала больше запросов, чем объявлено в query_budget."""
+
+
+def query_budget(queries):
+    """
+    Объявляет, сколько запросов к базе вьюха делает за весь запрос,
+    включая сессию и пользователя. Ставится внешним декоратором.
+    """
+    def decorator(view_func):
+        view_func.query_budget = queries
+        return view_func
+    return decorator
+
+
+def shape(sql):
+    """Форма запроса: текст без различий в длине списков параметров."""
+    return IN_LIST.sub('(...)', sql)
+
+
+def _project_file(filename):
+    return filename.startswith(str(settings.BASE_DIR)) and not any(
+        part in filename for part in _ignored_files)
+
+
+def _template_line(frame):
+    # Node.render_annotated: узел шаблона со строкой и файлом
+    node = frame.f_locals.get('self')
+    token = getattr(node, 'token', None)
+    origin = getattr(node, 'origin', None)
+    if token is None or origin is None:
+        return None
+    return f'{origin.template_name}:{token.lineno}'
+
+
+def caller():
+    """
+    Откуда пришёл запрос: ближайший узел шаблона и ближайшая строка
+    кода проекта, каждый может быть None.
+    """
+    template = code = None
+    frame = sys._getframe(1)
+    while frame is not None and (template is None or code is None):
+        if template is None and frame.f_code.co_name == 'render_annotated':
+            template = _template_line(frame)
+        elif code is None and _project_file(frame.f_code.co_filename):
+            code = '{}:{}'.format(
+                os.path.relpath(frame.f_code.co_filename, settings.BASE_DIR),
+                frame.f_lineno)
+        frame = frame.f_back
+    return template, code
+
+
+def explain(connection, sql, params):
+    """План запроса SELECT или None, если база его не показывает."""
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return None
+    # Курсор базы без обёрток Django: план не считается запросом
+    cursor = connection.create_cursor()
+    try:
+        cursor.execute(
+            f'{connection.ops.explain_query_prefix()} {sql}', params or ())
+        return '\n'.join(' '.join(map(str, row)) for row in cursor.fetchall())
+    except (DatabaseError, NotSupportedError):
+        return None
+    finally:
+        cursor.close()
+
+
+class QueryWatch:
+    """Счётчики одного запроса: формы запросов и их общее число."""
+
+    def __init__(self):
+        self.queries = 0
+        self.shapes = Counter()
+        self.repeated = []
+
+    def execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        elapsed = time.perf_counter() - started
+        self.queries += 1
+        query_shape = shape(sql)
+        self.shapes[query_shape] += 1
+        if self.shapes[query_shape] == settings.QUERY_WATCH_REPEAT:
+            self.repeated.append((query_shape, *caller()))
+        if elapsed * 1000 >= settings.QUERY_WATCH_SLOW_MS and not many:
+            logger.warning(
+                'Медленный запрос %.1f мс (%s): %s\n%s', elapsed * 1000,
+                caller()[1], sql,
+                explain(context['connection'], sql, params))
+        return result
+
+    def report(self, request):
+        """Пишет N+1 в лог и проверяет бюджет вьюхи."""
+        for query_shape, template, code in self.repeated:
+            logger.warning(
+                'N+1: %s раз %s (шаблон %s, код %s) на %s',
+                self.shapes[query_shape], query_shape, template, code,
+                request.path)
+        match = getattr(request, 'resolver_match', None)
+        budget = getattr(match and match.func, 'query_budget', None)
+        if budget is None or self.queries <= budget:
+            return
+        message = (f'{match.view_name}: {self.queries} запросов к базе '
+                   f'при бюджете {budget} ({request.method} '
+                   f'{request.get_full_path()})')
+        logger.warning(message)
+        if _violations is not None:
+            _violations.append(message)
+        elif _strict:
+            raise QueryBudgetExceeded(message)
+
+
+@contextmanager
+def strict_budgets():
+    """
+    Внутри блока превышение бюджета поднимает QueryBudgetExceeded из
+    запроса: тестовый клиент передаёт исключение в тест, и тот падает.
+    """
+    global _strict
+    previous, _strict = _strict, True
+    try:
+        yield
+    finally:
+        _strict = previous
+
+
+@contextmanager
+def enforce_budgets():
+    """Собирает превышения бюджетов внутри блока в список."""
+    global _violations
+    previous, _violations = _violations, []
+    try:
+        yield _violations
+    finally:
+        _violations = previous
+
+
+class QueryWatchMiddleware:
+    """
+    Стоит сразу после кэша страниц: в счёт идут все запросы к базе,
+    которые делает запрос, — от сессии до отрисовки шаблона.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        watch = QueryWatch()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(watch.execute))
+            response = self.get_response(request)
+        watch.report(request)
+        return response
@@ -0,0 +1,175 @@
+"""
+Чтение лент с реплики. Вьюхи, помеченные read_replica, на GET и HEAD
+читают из базы REPLICA_DATABASE, записи и все остальные запросы идут
+в основную базу. Кто только что что-то записал, ещё REPLICA_PIN_SECONDS
+секунд читает из основной базы (кука REPLICA_PIN_COOKIE): реплика
+может отставать, а свои изменения пользователь должен видеть сразу.
+Сессии и пользователи всегда читаются из основной базы.
+
+Реплика может не знать о только что созданном объекте, поэтому промах
+на ней повторяется в основной базе (get_object_or_404, use_primary).
+Версии кэша фрагментов у запросов с реплики включают её поколение
+(generation): фрагменты и страницы, собранные с отстающей реплики,
+перестают читаться после её обновления во всех процессах, а читатели
+основной базы их не видят вовсе.
+
+Реплика, которая смотрит в тот же файл, что и основная база, не
+используется: так по умолчанию и в тестах, где она зеркало default.
+Отдельный файл (DB_REPLICA_NAME) наполняет и обновляет команда
+replicate.
+"""
+import contextvars
+import os
+
+from django import shortcuts
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import Http404
+
+from yatube.db.base import backup
+
+# Приложения, которые читаются только из основной базы
+PRIMARY_APPS = ('auth', 'sessions')
+SAFE_METHODS = ('GET', 'HEAD')
+WRITES = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+_current = contextvars.ContextVar('replica_request', default=None)
+
+
+def read_replica(view_func):
+    """
+    Разрешает вьюхе читать с реплики. Ставится внешним декоратором,
+    как query_budget.
+    """
+    view_func.read_replica = True
+    return view_func
+
+
+def enabled():
+    """Реплика настроена и это не тот же файл, что основная база."""
+    alias = settings.REPLICA_DATABASE
+    if alias not in connections.databases:
+        return False
+    return (connections[alias].settings_dict['NAME']
+            != connections[DEFAULT_DB_ALIAS].settings_dict['NAME'])
+
+
+def replicate():
+    """Копирует основную базу в файл реплики."""
+    replica = connections[settings.REPLICA_DATABASE]
+    replica.close()
+    backup(connections[DEFAULT_DB_ALIAS], replica.settings_dict['NAME'])
+
+
+def generation():
+    """Поколение реплики — время последнего изменения её файла."""
+    path = connections[settings.REPLICA_DATABASE].settings_dict['NAME']
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def reading():
+    """Текущий запрос читает с реплики."""
+    state = _current.get()
+    return (state is not None and state.replica and not state.wrote
+            and enabled())
+
+
+def use_primary():
+    """
+    Дальше текущий запрос читает из основной базы. Возвращает True,
+    если до этого он читал с реплики, то есть промах стоит повторить.
+    """
+    if not reading():
+        return False
+    _current.get().replica = False
+    return True
+
+
+def get_object_or_404(klass, *args, **kwargs):
+    """
+    get_object_or_404, который при промахе на реплике ищет объект
+    в основной базе: реплика могла его ещё не получить.
+    """
+    try:
+        return shortcuts.get_object_or_404(klass, *args, **kwargs)
+    except Http404:
+        if not use_primary():
+            raise
+    return shortcuts.get_object_or_404(klass, *args, **kwargs)
+
+
+class ReplicaRequest:
+    """Чтение с реплики в одном запросе."""
+
+    def __init__(self):
+        self.replica = False
+        self.wrote = False
+
+    def execute(self, execute, sql, params, many, context):
+        """
+        Обёртка execute_wrapper основной базы: замечает запись. Роутер
+        для этого не годится — db_for_write спрашивают и при чтении,
+        например при присваивании связанного объекта.
+        """
+        if sql.lstrip()[:7].upper().startswith(WRITES):
+            self.wrote = True
+        return execute(sql, params, many, context)
+
+
+class ReplicaRouter:
+    """
+    Читает с реплики только внутри разрешённого запроса и только
+    до первой записи: дальше запрос видит свои изменения.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_APPS or not reading():
+            return DEFAULT_DB_ALIAS
+        return settings.REPLICA_DATABASE
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика — копия основной базы
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaMiddleware:
+    """
+    Стоит до сессий: запись сессии после входа тоже закрепляет
+    пользователя за основной базой.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = ReplicaRequest()
+        token = _current.set(state)
+        try:
+            with connections[DEFAULT_DB_ALIAS].execute_wrapper(
+                    state.execute):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        if state.wrote or request.method not in SAFE_METHODS:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE, '1',
+                max_age=settings.REPLICA_PIN_SECONDS, httponly=True,
+                samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = _current.get()
+        if state is not None:
+            state.replica = (
+                getattr(view_func, 'read_replica', False)
+                and request.method in SAFE_METHODS
+                and settings.REPLICA_PIN_COOKIE not in request.COOKIES)
@@ -0,0 +1,136 @@
+from django.core.paginator import Paginator
+from django.db import connection
+from django.utils.encoding import force_str
+from django.utils.http import urlsafe_base64_decode
+
+from .models import Post
+from .paginator import CURSOR_SEPARATOR, CursorPaginator, paginate
+from .stemmer import stems
+
+FTS_TABLE = 'posts_post_fts'
+
+_fts_available = None
+
+
+def fts_available():
+    """Есть ли в базе индекс FTS5 (создаётся миграцией только в SQLite)."""
+    global _fts_available
+    if _fts_available is None:
+        _fts_available = (
+            FTS_TABLE in connection.introspection.table_names())
+    return _fts_available
+
+
+def index_post(post):
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT OR REPLACE INTO {FTS_TABLE} (rowid, text) '
+            'VALUES (%s, %s)',
+            [post.pk, ' '.join(stems(post.text))])
+
+
+def remove_post(post_id):
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id])
+
+
+def rebuild(batch_size=1000, posts=None):
+    """
+    Строит индекс заново по всем постам или индексирует только posts —
+    подзапрос или список id.
+    """
+    rows = Post.objects.order_by()
+    if posts is not None:
+        rows = rows.filter(pk__in=posts)
+    insert = (f'INSERT OR REPLACE INTO {FTS_TABLE} (rowid, text) '
+              'VALUES (%s, %s)')
+    with connection.cursor() as cursor:
+        if posts is None:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        batch = []
+        for post_id, text in rows.values_list('pk', 'text').iterator(
+                chunk_size=batch_size):
+            batch.append((post_id, ' '.join(stems(text))))
+            if len(batch) >= batch_size:
+                cursor.executemany(insert, batch)
+                batch = []
+        if batch:
+            cursor.executemany(insert, batch)
+
+
+def match_expression(query):
+    """Запрос FTS5: все основы слов запроса, каждая в кавычках."""
+    return ' '.join(
+        '"%s"' % word.replace('"', '""') for word in stems(query))
+
+
+class SearchPaginator(CursorPaginator):
+    """
+    Выдача поиска по релевантности bm25. Курсор — пара (rank, id),
+    поэтому переход по страницам не использует OFFSET.
+    """
+
+    def __init__(self, query, per_page, **kwargs):
+        Paginator.__init__(self, [], per_page, **kwargs)
+        self.match = match_expression(query)
+        self.ordering = ('rank', 'id')
+        self.fields = ['rank', 'id']
+
+    def decode_cursor(self, cursor):
+        try:
+            raw = force_str(urlsafe_base64_decode(cursor))
+            rank, post_id = raw.split(CURSOR_SEPARATOR)
+            return [float(rank), int(post_id)]
+        except ValueError:
+            return None
+
+    def _keyset_filter(self, values, forward=True):
+        rank, post_id = values
+        op = '>' if forward else '<'
+        return (f'rank {op} %s OR (rank = %s AND id {op} %s)',
+                [rank, rank, post_id])
+
+    def _fetch(self, condition=None, reverse=False, offset=0, limit=None):
+        if not self.match:
+            return []
+        sql = (f'SELECT id, rank FROM (SELECT rowid AS id, rank '
+               f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)')
+        params = [self.match]
+        if condition is not None:
+            sql += f' WHERE {condition[0]}'
+            params += condition[1]
+        direction = 'DESC' if reverse else 'ASC'
+        sql += f' ORDER BY rank {direction}, id {direction} LIMIT %s OFFSET %s'
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params + [limit, offset])
+            ranked = cursor.fetchall()
+        posts = Post.objects.for_feed().in_bulk(
+            [post_id for post_id, _ in ranked])
+        rows = []
+        for post_id, rank in ranked:
+            post = posts.get(post_id)
+            if post is not None:
+                post.rank = rank
+                rows.append(post)
+        return rows
+
+
+def search_page(request, query):
+    """
+    Страница выдачи поиска. Без индекса FTS5 (не SQLite) ищет
+    вхождение каждого слова и сортирует по дате.
+    """
+    if fts_available():
+        return paginate(request, query, paginator_class=SearchPaginator)
+    posts = Post.objects.for_feed()
+    words = query.split()
+    for word in words:
+        posts = posts.filter(text__icontains=word)
+    if not words:
+        posts = posts.none()
+    return paginate(request, posts)
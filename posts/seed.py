@@ -0,0 +1,98 @@
+"""
+Генерация тестовых данных для нагрузочных замеров: пользователи,
+группы, посты, комментарии и граф подписок со степенным
+распределением — у немногих авторов много подписчиков, у остальных
+единицы.
+"""
+import itertools
+import random
+
+from django.db import transaction
+
+from . import bulk
+from .models import Comment, Follow, Group, Post, User
+
+USERNAME = 'bench_user_{}'
+GROUP_SLUG = 'bench-group-{}'
+WORDS = (
+    'день', 'город', 'кошка', 'собака', 'дорога', 'книга', 'новый',
+    'старый', 'красивый', 'утро', 'вечер', 'море', 'лес', 'река', 'дом',
+    'работа', 'друг', 'фотография', 'путешествие', 'погода', 'солнце',
+    'дождь', 'снег', 'музыка', 'кино', 'история', 'вопрос', 'ответ',
+    'сегодня', 'вчера', 'завтра', 'гулять', 'читать', 'писать', 'думать',
+    'смотреть', 'большой', 'маленький', 'быстрый', 'тихий', 'весёлый',
+)
+
+
+def _text(rng, min_words, max_words):
+    words = rng.choices(WORDS, k=rng.randint(min_words, max_words))
+    return ' '.join(words).capitalize() + '.'
+
+
+def _bulk_create(model, objects, batch_size):
+    for start in range(0, len(objects), batch_size):
+        model.objects.bulk_create(objects[start:start + batch_size])
+
+
+def power_law_follows(user_ids, follows, exponent, rng):
+    """
+    Пары (подписчик, автор): автор с рангом r выбирается с весом
+    1 / r ** exponent, подписчик — равновероятно. Повторы и подписки
+    на себя отбрасываются, поэтому пар может получиться меньше.
+    """
+    weights = list(itertools.accumulate(
+        1 / rank ** exponent for rank in range(1, len(user_ids) + 1)))
+    authors = rng.choices(user_ids, cum_weights=weights, k=follows)
+    pairs = set()
+    for author_id in authors:
+        user_id = rng.choice(user_ids)
+        if user_id != author_id:
+            pairs.add((user_id, author_id))
+    return sorted(pairs)
+
+
+def seed(users=100, groups=10, posts=1000, comments=3000, follows=2000,
+         exponent=1.2, random_seed=0, batch_size=1000):
+    """
+    Создаёт данные массовыми вставками в обход сигналов, а затем
+    пересчитывает счётчики, ленты подписок и поисковый индекс.
+    Возвращает число созданных объектов каждого вида.
+    """
+    rng = random.Random(random_seed)
+    offset = User.objects.count()
+    with transaction.atomic():
+        _bulk_create(User, [
+            User(username=USERNAME.format(offset + number))
+            for number in range(users)], batch_size)
+        user_ids = list(User.objects.filter(
+            username__startswith=USERNAME.format('')
+        ).order_by('pk').values_list('pk', flat=True))
+        offset = Group.objects.count()
+        _bulk_create(Group, [
+            Group(title=f'Группа {offset + number}',
+                  slug=GROUP_SLUG.format(offset + number),
+                  description=_text(rng, 5, 20))
+            for number in range(groups)], batch_size)
+        group_ids = list(Group.objects.values_list('pk', flat=True))
+        _bulk_create(Post, [
+            Post(author_id=rng.choice(user_ids),
+                 group_id=rng.choice(group_ids + [None]),
+                 text=_text(rng, 5, 80))
+            for _ in range(posts)], batch_size)
+        post_ids = list(Post.objects.values_list('pk', flat=True))
+        _bulk_create(Comment, [
+            Comment(post_id=rng.choice(post_ids),
+                    author_id=rng.choice(user_ids),
+                    text=_text(rng, 2, 30))
+            for _ in range(comments if post_ids else 0)], batch_size)
+        existing = set(Follow.objects.values_list('user_id', 'author_id'))
+        pairs = [
+            pair for pair in power_law_follows(user_ids, follows, exponent,
+                                               rng)
+            if pair not in existing]
+        _bulk_create(Follow, [
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in pairs], batch_size)
+        bulk.rebuild_derived(batch_size=batch_size)
+    return {'users': users, 'groups': groups, 'posts': posts,
+            'comments': comments if post_ids else 0, 'follows': len(pairs)}
@@ -0,0 +1,36 @@
+"""Представление постов и комментариев в JSON для API и подгрузки."""
+
+
+def comment_data(comment):
+    return {
+        'id': comment.id,
+        'author': comment.author.username,
+        'text': comment.text,
+        'created': comment.created.isoformat(),
+    }
+
+
+def post_data(post):
+    """Пост из выборки for_feed(); миниатюра — после thumbnails.prefetch."""
+    thumbnail = getattr(post, 'thumbnail', None)
+    return {
+        'id': post.id,
+        'author': post.author.username,
+        'group': post.group.slug if post.group_id else None,
+        'text': post.text,
+        'pub_date': post.pub_date.isoformat(),
+        'comment_count': post.comment_count,
+        'image': post.image.url if post.image else None,
+        'image_width': post.image_width,
+        'image_height': post.image_height,
+        'thumbnail': thumbnail.url if thumbnail else None,
+    }
+
+
+def page_data(page, serialize, key='results'):
+    """Страница курсорной пагинации со ссылками на соседние страницы."""
+    return {
+        key: [serialize(item) for item in page],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    }
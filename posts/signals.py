@@ -0,0 +1,210 @@
+import contextvars
+import weakref
+
+from django.db.models import F
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from . import fragment_cache, search, timeline
+from .models import (Comment, Follow, Group, GroupStats, ImageBlob, Post,
+                     UserStats)
+
+
+def _image_name(post):
+    # Имя файла без обращения к полю: отложенное поле не загружается
+    image = post.__dict__.get('image')
+    return getattr(image, 'name', image) or ''
+
+
+@receiver(post_init, sender=Post)
+def post_loaded(sender, instance, **kwargs):
+    # Группа на момент загрузки: при смене группы сбрасываются обе
+    instance._loaded_group_id = instance.group_id
+    instance._loaded_image = (
+        _image_name(instance) if 'image' in instance.__dict__ else None)
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.change(instance.author_id, posts_count=1)
+        timeline.fan_out(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    UserStats.objects.change(instance.author_id, posts_count=-1)
+    deletion = _deletion.get()
+    if deletion is not None:
+        deletion.deleted_posts.pop(instance.pk, None)
+
+
+@receiver(post_save, sender=Post)
+def post_group_saved(sender, instance, created, update_fields, **kwargs):
+    # Стоит до post_changed, который запоминает новую группу поста
+    if update_fields is not None and 'group' not in update_fields:
+        return
+    old = None if created else instance._loaded_group_id
+    if old == instance.group_id:
+        return
+    if old is not None:
+        GroupStats.objects.remove_post(old, instance)
+    if instance.group_id is not None:
+        GroupStats.objects.add_post(instance.group_id, instance)
+    fragment_cache.bump('groups')
+
+
+@receiver(post_delete, sender=Post)
+def post_group_deleted(sender, instance, **kwargs):
+    if instance.group_id is not None:
+        GroupStats.objects.remove_post(instance.group_id, instance)
+        fragment_cache.bump('groups')
+
+
+@receiver(post_save, sender=Group)
+def group_created(sender, instance, created, **kwargs):
+    if created:
+        GroupStats.objects.get_or_create(group=instance)
+
+
+@receiver(post_save, sender=Post)
+def post_image_saved(sender, instance, created, update_fields, **kwargs):
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    old = '' if created else instance._loaded_image
+    new = _image_name(instance)
+    # None — поле не загружалось, прежний файл неизвестен; счётчик
+    # поправит сборщик мусора
+    if old is None or old == new:
+        instance._loaded_image = new
+        return
+    ImageBlob.objects.change(new, 1)
+    ImageBlob.objects.change(old, -1)
+    instance._loaded_image = new
+
+
+@receiver(post_delete, sender=Post)
+def post_image_deleted(sender, instance, **kwargs):
+    ImageBlob.objects.change(_image_name(instance), -1)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        Post.objects.filter(pk=instance.post_id).update(
+            comment_count=F('comment_count') + 1)
+
+
+class _Deletion:
+    """
+    Комментарии одного удаления. Collector шлёт pre_delete всех
+    объектов до первого post_delete, поэтому пачка копится в pre_delete,
+    а первый post_delete комментария обрабатывает её целиком. Посты,
+    которые удаляются вместе с комментариями, пропускаются.
+    """
+
+    def __init__(self):
+        self.post_ids = set()
+        # Слабые ссылки: пачку прерванного удаления не держат живой
+        self.deleted_posts = weakref.WeakValueDictionary()
+
+    def posts(self):
+        """id постов, чьи комментарии удалены, а сами посты остаются."""
+        return self.post_ids.difference(self.deleted_posts.keys())
+
+
+_deletion = contextvars.ContextVar('comment_deletion', default=None)
+
+
+def _current_deletion():
+    deletion = _deletion.get()
+    if deletion is None:
+        deletion = _Deletion()
+        _deletion.set(deletion)
+    return deletion
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    _current_deletion().deleted_posts[instance.pk] = instance
+
+
+@receiver(pre_delete, sender=Comment)
+def comment_deleting(sender, instance, **kwargs):
+    _current_deletion().post_ids.add(instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    deletion = _deletion.get()
+    if deletion is None:
+        return
+    _deletion.set(None)
+    # Пересчёт, а не вычитание: пачка прерванного удаления и
+    # разошедшийся счётчик не уводят значение ниже нуля
+    post_ids = deletion.posts()
+    if post_ids:
+        posts = Post.objects.filter(pk__in=post_ids)
+        posts.rebuild_comment_counts()
+        # Один сброс кэша на всё удаление; удалённые посты сбросит
+        # их собственный post_delete
+        fragment_cache.bump_posts(
+            posts.values_list('pk', 'author_id', 'group_id'))
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.change(instance.author_id, followers_count=1)
+        UserStats.objects.change(instance.user_id, following_count=1)
+        timeline.promote(instance.author_id)
+        timeline.backfill(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    UserStats.objects.change(instance.author_id, followers_count=-1)
+    UserStats.objects.change(instance.user_id, following_count=-1)
+    timeline.prune(instance)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_changed(sender, instance, **kwargs):
+    fragment_cache.bump_post(instance, instance._loaded_group_id)
+    instance._loaded_group_id = instance.group_id
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, **kwargs):
+    # Удаление сбрасывает кэш в comment_deleted, одним вызовом на пачку
+    if Comment.post.is_cached(instance):
+        post = instance.post
+        posts = [(post.pk, post.author_id, post.group_id)]
+    else:
+        posts = Post.objects.filter(pk=instance.post_id).values_list(
+            'pk', 'author_id', 'group_id')
+    fragment_cache.bump_posts(posts)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_changed(sender, instance, **kwargs):
+    fragment_cache.bump_follow(instance)
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    fragment_cache.bump_group(instance)
+
+
+@receiver(post_save, sender=Post)
+def post_indexed(sender, instance, **kwargs):
+    search.index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_unindexed(sender, instance, **kwargs):
+    search.remove_post(instance.pk)
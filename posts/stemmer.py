@@ -0,0 +1,146 @@
+"""
+Стеммер Snowball для русского языка и разбиение текста на основы
+для полнотекстового поиска.
+"""
+import re
+from functools import lru_cache
+
+VOWELS = 'аеиоуыэюя'
+WORD_RE = re.compile(r'\w+')
+CYRILLIC_RE = re.compile('[а-я]')
+
+
+def _endings(after_a, other):
+    """
+    Окончания группы от длинных к коротким с признаком того, что
+    окончание должно идти после «а» или «я», которые остаются в основе.
+    """
+    endings = [(ending, True) for ending in after_a]
+    endings += [(ending, False) for ending in other]
+    return tuple(sorted(endings, key=lambda item: len(item[0]),
+                        reverse=True))
+
+
+PERFECTIVE_GERUND = _endings(
+    ('в', 'вши', 'вшись'),
+    ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+)
+ADJECTIVE = _endings(
+    (),
+    ('ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+     'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+     'ая', 'яя', 'ою', 'ею'),
+)
+PARTICIPLE = _endings(
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+    ('ивш', 'ывш', 'ующ'),
+)
+REFLEXIVE = _endings((), ('ся', 'сь'))
+VERB = _endings(
+    ('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет',
+     'ют', 'ны', 'ть', 'ешь', 'нно'),
+    ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй',
+     'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют',
+     'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'),
+)
+NOUN = _endings(
+    (),
+    ('а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии',
+     'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам',
+     'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+     'ья', 'я'),
+)
+SUPERLATIVE = _endings((), ('ейше', 'ейш'))
+DERIVATIONAL = ('ость', 'ост')
+
+
+def _regions(word):
+    """Начала областей RV и R2 алгоритма Snowball."""
+    rv = r1 = r2 = len(word)
+    for i, char in enumerate(word):
+        if char in VOWELS:
+            rv = i + 1
+            break
+    for i in range(1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            r1 = i + 1
+            break
+    for i in range(r1 + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            r2 = i + 1
+            break
+    return rv, r2
+
+
+def _strip(word, endings):
+    """Отрезает самое длинное подходящее окончание из группы."""
+    for ending, after_a in endings:
+        if not word.endswith(ending):
+            continue
+        stem = word[:-len(ending)]
+        if after_a and not stem.endswith(('а', 'я')):
+            continue
+        return stem
+    return None
+
+
+def _strip_adjectival(word):
+    stem = _strip(word, ADJECTIVE)
+    if stem is None:
+        return None
+    participle = _strip(stem, PARTICIPLE)
+    return stem if participle is None else participle
+
+
+def _strip_inflection(rest):
+    """Шаг 1: деепричастие или возвратная частица и окончание."""
+    stripped = _strip(rest, PERFECTIVE_GERUND)
+    if stripped is not None:
+        return stripped
+    reflexive = _strip(rest, REFLEXIVE)
+    if reflexive is not None:
+        rest = reflexive
+    for step in (_strip_adjectival,
+                 lambda part: _strip(part, VERB),
+                 lambda part: _strip(part, NOUN)):
+        stripped = step(rest)
+        if stripped is not None:
+            return stripped
+    return rest
+
+
+def _tidy_up(rest):
+    """Шаг 4: превосходная степень, двойное «н» и мягкий знак."""
+    superlative = _strip(rest, SUPERLATIVE)
+    if superlative is not None:
+        rest = superlative
+    if rest.endswith('нн'):
+        return rest[:-1]
+    if superlative is None and rest.endswith('ь'):
+        return rest[:-1]
+    return rest
+
+
+@lru_cache(maxsize=100000)
+def _stem(word):
+    if not CYRILLIC_RE.search(word):
+        return word
+    rv, r2 = _regions(word)
+    prefix, rest = word[:rv], _strip_inflection(word[rv:])
+    if rest.endswith('и'):
+        rest = rest[:-1]
+    for ending in DERIVATIONAL:
+        if rest.endswith(ending) and rv + len(rest) - len(ending) >= r2:
+            rest = rest[:-len(ending)]
+            break
+    return prefix + _tidy_up(rest)
+
+
+def stem(word):
+    """Основа русского слова; слова не на кириллице не меняются."""
+    return _stem(word.lower().replace('ё', 'е'))
+
+
+def stems(text):
+    """Основы всех слов текста в порядке следования."""
+    return [stem(word) for word in WORD_RE.findall(text.lower())]
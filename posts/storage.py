@@ -0,0 +1,65 @@
+"""
+Хранилище изображений постов по хешу содержимого. Одинаковые файлы
+сохраняются один раз под именем posts/<ab>/<sha256>.<ext> и делят одни
+миниатюры sorl. Ссылки на файлы считает ImageBlob, файлы без ссылок
+удаляет сборщик мусора из posts.blobs.
+"""
+import os
+import posixpath
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+from . import images
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Файловое хранилище, в котором имя файла — хеш его содержимого.
+    Каталог из upload_to сохраняется, исходное имя — только расширение.
+    """
+
+    def hashed_name(self, name, digest):
+        directory = posixpath.dirname(name)
+        extension = posixpath.splitext(name)[1].lower()
+        return posixpath.join(directory, digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        digest = (getattr(content, 'content_hash', None)
+                  or images.content_hash(content))
+        name = self.hashed_name(name, digest)
+        if self.exists(name):
+            return name
+        return self._save(name, content)
+
+    def _save(self, name, content):
+        """
+        Пишет во временный файл рядом и переносит его на место одной
+        операцией: параллельная загрузка того же содержимого просто
+        заменит файл таким же.
+        """
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+        try:
+            with os.fdopen(descriptor, 'wb') as temp_file:
+                for chunk in content.chunks():
+                    temp_file.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(temp_path, self.file_permissions_mode)
+            os.replace(temp_path, full_path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return name
+
+
+post_image_storage = ContentAddressedStorage()
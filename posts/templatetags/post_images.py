@@ -0,0 +1,46 @@
+from django import template
+
+register = template.Library()
+
+MIME_TYPES = {'WEBP': 'image/webp', 'AVIF': 'image/avif'}
+# Карточка поста занимает ширину контейнера Bootstrap: не больше
+# 1110 пикселей на широких экранах и весь экран на узких
+SIZES = '(min-width: 1200px) 1110px, 100vw'
+
+
+def _srcset(thumbnails):
+    widths = {}
+    for thumbnail in thumbnails:
+        widths.setdefault(thumbnail.width, thumbnail.url)
+    return ', '.join(
+        f'{url} {width}w' for width, url in sorted(widths.items()))
+
+
+@register.inclusion_tag('includes/post_picture.html')
+def post_picture(post, eager=False):
+    """
+    Картинка карточки поста после thumbnails.prefetch: <picture>
+    с srcset по ширинам и источниками в современных форматах.
+    Размеры в атрибутах резервируют место до загрузки, а картинки
+    ниже первого экрана загружаются лениво.
+    """
+    variants = getattr(post, 'variants', {})
+    thumbnail = post.thumbnail
+    if thumbnail in variants.get(None, []):
+        width, height = thumbnail.width, thumbnail.height
+    else:
+        # Миниатюры ещё не готовы, выводится оригинал
+        width, height = post.image_width, post.image_height
+    return {
+        'sources': [
+            (MIME_TYPES[image_format], _srcset(thumbnails))
+            for image_format, thumbnails in variants.items()
+            if image_format is not None
+        ],
+        'src': thumbnail.url,
+        'srcset': _srcset(variants.get(None, [])),
+        'sizes': SIZES,
+        'width': width,
+        'height': height,
+        'loading': 'eager' if eager else 'lazy',
+    }
@@ -0,0 +1,49 @@
+"""
+Окружение тестов: превышение query_budget вьюхи роняет тест, а замеры
+запросов пишутся во временный каталог и не попадают в общий
+REQUEST_METRICS_DIR. Для manage.py test — раннер TestRunner
+(TEST_RUNNER), для pytest — хуки этого модуля (подключается в
+conftest.py в корне проекта). Хук написан в старом стиле
+hookwrapper=True, который понимает и pluggy 0.13 из requirements.txt.
+"""
+import tempfile
+from contextlib import contextmanager
+
+import pytest
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+from . import instrumentation, querywatch
+
+
+@contextmanager
+def isolated_metrics():
+    """
+    Замеры запросов внутри блока сбрасываются во временный каталог;
+    на выходе окно очищается, чтобы сброс при завершении процесса
+    ничего не записал.
+    """
+    with tempfile.TemporaryDirectory() as directory, \
+            override_settings(REQUEST_METRICS_DIR=directory):
+        try:
+            yield directory
+        finally:
+            instrumentation.aggregate.clear()
+
+
+class TestRunner(DiscoverRunner):
+    def run_suite(self, suite, **kwargs):
+        with querywatch.strict_budgets(), isolated_metrics():
+            return super().run_suite(suite, **kwargs)
+
+
+@pytest.fixture(scope='session', autouse=True)
+def _isolated_metrics():
+    with isolated_metrics() as directory:
+        yield directory
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    with querywatch.strict_budgets():
+        yield
@@ -0,0 +1,101 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = Post.objects.create(
+            text='Текст', author=cls.author, group=cls.group)
+        Comment.objects.create(post=cls.post, author=cls.reader, text='Да')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def feeds(self):
+        return [
+            reverse('api_index'),
+            reverse('api_group_posts', kwargs={'slug': self.group.slug}),
+            reverse('api_profile', kwargs={'username': self.author.username}),
+            reverse('api_follow_index'),
+        ]
+
+    def test_feeds(self):
+        """Ленты отдают посты в JSON."""
+        for url in self.feeds():
+            with self.subTest(url=url):
+                data = self.client.get(url).json()
+                self.assertEqual(len(data['results']), 1)
+                post = data['results'][0]
+                self.assertEqual(post['id'], self.post.pk)
+                self.assertEqual(post['author'], 'author')
+                self.assertEqual(post['group'], 'group')
+                self.assertEqual(post['comment_count'], 1)
+                self.assertIsNone(data['next'])
+
+    def test_post(self):
+        data = self.client.get(
+            reverse('api_post', kwargs={'post_id': self.post.pk})).json()
+        self.assertEqual(data['text'], 'Текст')
+        self.assertEqual(data['comments'][0]['author'], 'reader')
+        self.assertIsNone(data['comments_next'])
+
+    def test_not_found(self):
+        response = self.client.get(
+            reverse('api_group_posts', kwargs={'slug': 'missing'}))
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_follow_requires_login(self):
+        response = Client().get(reverse('api_follow_index'))
+        self.assertEqual(response.status_code, 401)
+
+    def test_unchanged_poll_is_not_modified(self):
+        """Повторный опрос без изменений — 304 без запроса ленты."""
+        index, group, profile, follow = self.feeds()
+        post = reverse('api_post', kwargs={'post_id': self.post.pk})
+        # Группа, автор и автор поста ищутся по адресу,
+        # лента подписок читает сессию
+        budgets = {index: 0, group: 1, profile: 1, follow: 2, post: 1}
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                with self.assertNumQueries(budget):
+                    not_modified = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(not_modified.status_code, 304)
+                not_modified = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+                self.assertEqual(not_modified.status_code, 304)
+
+    def test_changes_invalidate_validators(self):
+        """Новый комментарий меняет ETag ленты и поста."""
+        urls = [reverse('api_index'),
+                reverse('api_post', kwargs={'post_id': self.post.pk})]
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        Comment.objects.create(post=self.post, author=self.author, text='Ок')
+        for url, etag in zip(urls, etags):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+
+    def test_group_change_invalidates_feeds(self):
+        """Название группы есть в карточках, поэтому меняется ETag лент."""
+        urls = self.feeds()[:3]
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        self.group.title = 'Новое название'
+        self.group.save()
+        for url, etag in zip(urls, etags):
+            with self.subTest(url=url):
+                self.assertNotEqual(self.client.get(url)['ETag'], etag)
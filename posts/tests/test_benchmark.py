@@ -0,0 +1,132 @@
+import os
+import random
+import sqlite3
+import tempfile
+
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+
+from posts import benchmark, seed
+from posts.models import Comment, FeedEntry, Follow, Post, UserStats
+
+
+class SeedTest(TestCase):
+    def test_seed_builds_consistent_data(self):
+        """Засеянные данные проходят через счётчики и ленты."""
+        created = seed.seed(users=30, groups=3, posts=200, comments=300,
+                            follows=300)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Follow.objects.count(), created['follows'])
+        stats = UserStats.objects.order_by('-followers_count')
+        self.assertEqual(
+            sum(stats.values_list('followers_count', flat=True)),
+            created['follows'])
+        self.assertTrue(FeedEntry.objects.exists())
+        self.assertEqual(
+            sum(Post.objects.values_list('comment_count', flat=True)), 300)
+
+    def test_power_law_follows(self):
+        """У первых авторов подписчиков намного больше, чем у остальных."""
+        pairs = seed.power_law_follows(
+            list(range(100)), 2000, 1.2, random.Random(0))
+        followers = [0] * 100
+        for user_id, author_id in pairs:
+            self.assertNotEqual(user_id, author_id)
+            followers[author_id] += 1
+        self.assertEqual(len(set(pairs)), len(pairs))
+        self.assertGreater(followers[0], 10 * followers[50])
+
+
+class BenchmarkTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed.seed(users=20, groups=2, posts=50, comments=50, follows=100)
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = benchmark.ResultsStore(
+            os.path.join(self.tmp.name, 'results.jsonl'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(values, 50), 50)
+        self.assertEqual(benchmark.percentile(values, 99), 99)
+        self.assertEqual(benchmark.percentile([7], 95), 7)
+        self.assertIsNone(benchmark.percentile([], 50))
+
+    def test_run_client(self):
+        """Замер возвращает задержки, число запросов и размер ответа."""
+        user, urls = benchmark.build_urls(('index', 'follow_index'))
+        results = benchmark.run_client(urls, user, iterations=3, warmup=1)
+        self.assertEqual([row['name'] for row in results],
+                         ['index', 'follow_index'])
+        for row in results:
+            self.assertEqual(row['status'], 200)
+            self.assertEqual(row['requests'], 3)
+            self.assertLessEqual(row['p50'], row['p99'])
+            self.assertGreater(row['queries'], 0)
+            self.assertGreater(row['bytes'], 0)
+
+    def test_run_client_keeps_follows(self):
+        """Замер подписки и отписки не меняет граф подписок."""
+        follows = set(Follow.objects.values_list('user', 'author'))
+        stats = set(UserStats.objects.values_list(
+            'user', 'followers_count', 'following_count'))
+        for name in ('profile_follow', 'profile_unfollow'):
+            with self.subTest(name=name):
+                user, urls = benchmark.build_urls((name,))
+                results = benchmark.run_client(
+                    urls, user, iterations=2, warmup=1)
+                self.assertEqual(results[0]['status'], 302)
+                self.assertEqual(
+                    set(Follow.objects.values_list('user', 'author')),
+                    follows)
+                self.assertEqual(set(UserStats.objects.values_list(
+                    'user', 'followers_count', 'following_count')), stats)
+
+    def test_results_store_compare(self):
+        """Прогоны сохраняются и сравниваются по общим адресам."""
+        row = {'name': 'index', 'p50': 10.0, 'p95': 20.0, 'p99': 40.0,
+               'queries': 4, 'bytes': 1000}
+        base = self.store.save([row], revision='aaa')
+        head = self.store.save(
+            [dict(row, p50=5.0, queries=2), dict(row, name='search')],
+            revision='bbb')
+        self.assertEqual(head['id'], 2)
+        self.assertEqual(self.store.get('aaa'), base)
+        self.assertEqual(self.store.get(2)['revision'], 'bbb')
+        comparison = dict(self.store.compare(base, head))
+        self.assertEqual(list(comparison), ['index'])
+        self.assertEqual(comparison['index']['p50'], (10.0, 5.0, -50.0))
+        self.assertEqual(comparison['index']['queries'], (4, 2, -50.0))
+
+
+class ConcurrencyBenchmarkTest(TransactionTestCase):
+    # Копия снимается с базы вне транзакции, как при запуске команды
+    def setUp(self):
+        seed.seed(users=10, groups=2, posts=20, comments=10, follows=20)
+
+    def test_copy_of_locked_database_fails(self):
+        """Копирование заблокированной базы не ждёт бесконечно."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'copy.sqlite3')
+            with transaction.atomic(), self.assertRaises(
+                    sqlite3.OperationalError):
+                Post.objects.update(text='Текст')
+                benchmark._copy_database(path, attempts=2)
+
+    def test_run_concurrency(self):
+        """Конкурентный замер идёт на копиях базы для обоих профилей."""
+        comments = Comment.objects.count()
+        results = benchmark.run_concurrency(
+            readers=2, writers=1, duration=0.2)
+        self.assertEqual(
+            [row['name'] for row in results],
+            ['read:default', 'write:default', 'read:tuned', 'write:tuned'])
+        for row in results:
+            self.assertGreater(row['requests'], 0)
+            self.assertGreater(row['throughput'], 0)
+        self.assertEqual(Comment.objects.count(), comments)
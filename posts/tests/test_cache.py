@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase
+
+from yatube.cache import SQLiteCache
+
+
+class CountingConnection:
+    """Соединение, которое запоминает запросы COUNT(*)."""
+
+    def __init__(self, db, counts):
+        self.db = db
+        self.counts = counts
+
+    def execute(self, sql, *args):
+        if sql.startswith('SELECT COUNT(*)'):
+            self.counts.append(sql)
+        return self.db.execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        return self.db.executemany(sql, *args)
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_set_get_delete(self):
+        """Значения сохраняются, читаются и удаляются."""
+        self.cache.set('key', {'page': 1})
+        self.assertEqual(self.cache.get('key'), {'page': 1})
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_shared_between_instances(self):
+        """Разные процессы видят общий файл кэша."""
+        self.cache.set('key', 'value')
+        self.assertEqual(self.make_cache().get('key'), 'value')
+
+    def test_add_and_expiry(self):
+        """add не перезаписывает живой ключ, но занимает истёкший."""
+        self.assertTrue(self.cache.add('key', 1))
+        self.assertFalse(self.cache.add('key', 2))
+        self.cache.set('old', 1, timeout=-1)
+        self.assertIsNone(self.cache.get('old'))
+        self.assertTrue(self.cache.add('old', 2))
+        self.assertEqual(self.cache.get('old'), 2)
+
+    def test_incr(self):
+        """incr атомарно увеличивает целые и падает на пустом ключе."""
+        self.cache.set('counter', 1)
+        self.assertEqual(self.cache.incr('counter'), 2)
+        self.assertEqual(self.make_cache().incr('counter', 5), 7)
+        self.assertEqual(self.cache.decr('counter'), 6)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_get_many(self):
+        """get_many читает несколько ключей одним запросом."""
+        self.cache.set_many({'a': 1, 'b': 'два'})
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 'два'})
+
+    def test_lru_eviction(self):
+        """При переполнении вытесняются давно не читавшиеся ключи."""
+        cache = self.make_cache(MAX_ENTRIES=3, CULL_FREQUENCY=3)
+        for key in 'abc':
+            cache.set(key, key)
+        cache._db.execute(
+            "UPDATE cache SET accessed = accessed - 10 WHERE key != ?",
+            (cache.make_key('c'),))
+        cache.get('a')
+        cache.set('d', 'd')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get_many(['a', 'c', 'd']),
+                         {'a': 'a', 'c': 'c', 'd': 'd'})
+
+    def test_cull_checked_every_n_writes(self):
+        """Переполнение проверяется раз в CULL_EVERY записей, а не на
+        каждой записи."""
+        cache = self.make_cache(
+            MAX_ENTRIES=2, CULL_FREQUENCY=1, CULL_EVERY=3)
+        counts = []
+        cache._local.db = CountingConnection(cache._db, counts)
+        for key in 'abcdef':
+            cache.set(key, key)
+        self.assertEqual(len(counts), 2)
+        self.assertLessEqual(
+            cache._db.execute('SELECT COUNT(*) FROM cache').fetchone()[0], 3)
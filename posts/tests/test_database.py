@@ -0,0 +1,75 @@
+import os
+import sqlite3
+import tempfile
+import threading
+
+from django.db import OperationalError, connection
+from django.test import TestCase
+
+from yatube.db.base import DatabaseWrapper
+
+
+class TunedSQLiteTests(TestCase):
+    # Отдельное соединение с файлом; TestCase открывает доступ к базам
+    # и под pytest-django
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'db.sqlite3')
+        self.wrappers = []
+
+    def tearDown(self):
+        for wrapper in self.wrappers:
+            wrapper.close()
+        self.tmp.cleanup()
+
+    def wrapper(self, **options):
+        settings_dict = dict(connection.settings_dict,
+                             NAME=self.path, OPTIONS=options)
+        wrapper = DatabaseWrapper(settings_dict, alias='tuned')
+        self.wrappers.append(wrapper)
+        return wrapper
+
+    def pragma(self, cursor, name):
+        cursor.execute(f'PRAGMA {name}')
+        return cursor.fetchone()[0]
+
+    def test_connection_pragmas(self):
+        """Соединение открывается в WAL с заданными mmap и кэшем."""
+        with self.wrapper(MMAP_SIZE=1024 * 1024,
+                          CACHE_SIZE=8 * 1024 * 1024).cursor() as cursor:
+            self.assertEqual(self.pragma(cursor, 'journal_mode'), 'wal')
+            # NORMAL
+            self.assertEqual(self.pragma(cursor, 'synchronous'), 1)
+            self.assertEqual(self.pragma(cursor, 'mmap_size'), 1024 * 1024)
+            self.assertEqual(self.pragma(cursor, 'cache_size'), -8192)
+
+    def lock(self, seconds):
+        """Держит блокировку записи в другом соединении seconds секунд."""
+        other = sqlite3.connect(self.path, isolation_level=None,
+                                check_same_thread=False)
+        other.execute('BEGIN EXCLUSIVE')
+
+        def release():
+            other.execute('ROLLBACK')
+            other.close()
+        timer = threading.Timer(seconds, release)
+        timer.start()
+        self.addCleanup(timer.join)
+
+    def test_locked_write_is_retried(self):
+        """Запрос вне транзакции повторяется, пока база занята."""
+        wrapper = self.wrapper(BUSY_TIMEOUT=0.01, LOCK_RETRIES=5)
+        with wrapper.cursor() as cursor:
+            cursor.execute('CREATE TABLE item (id INTEGER PRIMARY KEY)')
+            self.lock(0.1)
+            cursor.execute('INSERT INTO item DEFAULT VALUES')
+            cursor.execute('SELECT COUNT(*) FROM item')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_locked_write_fails_without_retries(self):
+        wrapper = self.wrapper(BUSY_TIMEOUT=0.01, LOCK_RETRIES=0)
+        with wrapper.cursor() as cursor:
+            cursor.execute('CREATE TABLE item (id INTEGER PRIMARY KEY)')
+            self.lock(0.5)
+            with self.assertRaises(OperationalError):
+                cursor.execute('INSERT INTO item DEFAULT VALUES')
@@ -76,13 +76,14 @@ class PostsCreateFormTests(TestCase):
         # Проверяем, увеличилось ли число постов
         self.assertEqual(Post.objects.count(), posts_count + 1)
         # Проверяем, что создалась запись с нашим слагом
-        self.assertTrue(
-            Post.objects.filter(
-                group=form_data['group'],
-                text=form_data['text'],
-                image='posts/small2.gif',
-            ).exists()
+        post = Post.objects.get(
+            group=form_data['group'],
+            text=form_data['text'],
         )
+        # Файл хранится под хешем содержимого
+        self.assertEqual(
+            post.image.name,
+            f'posts/{post.image_hash[:2]}/{post.image_hash}.jpg')
 
     def test_edit_post(self):
         """Валидная форма редактирует запись в Posts."""
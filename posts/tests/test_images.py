@@ -0,0 +1,181 @@
+import hashlib
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from posts.forms import PostForm
+from posts import blobs, thumbnails
+from posts.models import ImageBlob, Post, User
+
+MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+# Тег EXIF Orientation: 6 — снимок повёрнут на 90° по часовой стрелке
+ORIENTATION = 0x0112
+
+
+def image_bytes(size, image_format='JPEG', mode='RGB', orientation=None):
+    image = Image.new(mode, size, 'red')
+    exif = Image.Exif()
+    if orientation:
+        exif[ORIENTATION] = orientation
+    buffer = BytesIO()
+    image.save(buffer, image_format, exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, THUMBNAIL_WORKERS=0,
+                   POST_IMAGE_MAX_SIZE=400, POST_IMAGE_MAX_PIXELS=10 ** 6)
+class ImageProcessingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def form(self, content, name='photo.jpg'):
+        return PostForm(
+            {'text': 'Текст'},
+            files={'image': SimpleUploadedFile(name, content)})
+
+    def save(self, content, name='photo.jpg'):
+        form = self.form(content, name)
+        self.assertTrue(form.is_valid(), form.errors)
+        post = form.save(commit=False)
+        post.author = self.author
+        post.save()
+        return post
+
+    def test_downscaled_and_reencoded(self):
+        """Снимок уменьшается, поворачивается по EXIF и теряет
+        метаданные, а хеш соответствует сохранённому файлу."""
+        post = self.save(image_bytes((800, 600), orientation=6))
+        with post.image.open('rb') as stored:
+            content = stored.read()
+        image = Image.open(BytesIO(content))
+        self.assertEqual(image.format, 'JPEG')
+        self.assertEqual(image.size, (300, 400))
+        self.assertEqual((post.image_width, post.image_height), (300, 400))
+        self.assertTrue(image.info.get('progressive'))
+        self.assertNotIn('exif', image.info)
+        self.assertEqual(post.image_hash, hashlib.sha256(content).hexdigest())
+
+    def test_transparent_png_flattened(self):
+        """PNG с прозрачностью сохраняется как JPEG на белом фоне."""
+        post = self.save(
+            image_bytes((100, 100), 'PNG', mode='RGBA'), 'logo.png')
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        self.assertEqual(Image.open(post.image).size, (100, 100))
+
+    def test_too_many_pixels_rejected(self):
+        """Изображение больше POST_IMAGE_MAX_PIXELS не принимается."""
+        form = self.form(image_bytes((2000, 1000)))
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
+
+    def test_unchanged_image_keeps_hash(self):
+        """Правка без нового файла не трогает изображение и хеш."""
+        post = self.save(image_bytes((100, 100)))
+        form = PostForm({'text': 'Другой текст'}, instance=post)
+        self.assertTrue(form.is_valid(), form.errors)
+        edited = form.save()
+        self.assertEqual(edited.image.name, post.image.name)
+        self.assertEqual(edited.image_hash, post.image_hash)
+
+    def test_process_images_command(self):
+        """Команда перекодирует старые изображения, а оригиналы
+        без ссылок удаляет сборщик мусора."""
+        name = default_storage.save(
+            'posts/old.jpg', ContentFile(image_bytes((1000, 500))))
+        post = Post.objects.create(text='Текст', author=self.author,
+                                   image=name)
+        call_command('process_images', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertNotEqual(post.image_hash, '')
+        self.assertEqual(Image.open(post.image).size, (400, 200))
+        self.assertNotEqual(post.image.name, name)
+        call_command('collect_images', grace=0, stdout=StringIO())
+        self.assertFalse(default_storage.exists(name))
+        self.assertTrue(default_storage.exists(post.image.name))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ContentAddressedStorageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.content = image_bytes((100, 100))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def create_post(self, content=None, name='photo.jpg'):
+        return Post.objects.create(
+            text='Текст', author=self.author,
+            image=SimpleUploadedFile(name, content or self.content))
+
+    def refcount(self, name):
+        return ImageBlob.objects.get(name=name).refcount
+
+    def test_identical_uploads_share_file(self):
+        """Одинаковые загрузки хранятся одним файлом под хешем."""
+        first = self.create_post()
+        second = self.create_post(name='copy.JPG')
+        digest = hashlib.sha256(self.content).hexdigest()
+        self.assertEqual(first.image.name,
+                         f'posts/{digest[:2]}/{digest}.jpg')
+        self.assertEqual(second.image.name, first.image.name)
+        self.assertEqual(self.refcount(first.image.name), 2)
+
+    def test_shared_file_survives_partial_delete(self):
+        """Файл удаляется только когда на него не ссылается ни один пост,
+        вместе с миниатюрами."""
+        first = self.create_post()
+        second = self.create_post()
+        name = first.image.name
+        geometry, options = thumbnails.POST_THUMBNAILS[0]
+        thumbnails._submit('key', first.image, geometry, dict(options))
+        self.assertTrue(list(blobs._walk(default_storage, 'cache')))
+        first.delete()
+        self.assertEqual(blobs.collect_garbage(grace=0), [])
+        self.assertTrue(default_storage.exists(name))
+        second.delete()
+        self.assertEqual(self.refcount(name), 0)
+        self.assertEqual(blobs.collect_garbage(grace=600), [])
+        self.assertEqual(blobs.collect_garbage(grace=0), [name])
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(ImageBlob.objects.filter(name=name).exists())
+        self.assertEqual(list(blobs._walk(default_storage, 'cache')), [])
+
+    def test_replaced_image_is_released(self):
+        """Замена изображения освобождает прежний файл."""
+        post = Post.objects.get(pk=self.create_post().pk)
+        old_name = post.image.name
+        post.image = SimpleUploadedFile(
+            'new.png', image_bytes((50, 50), 'PNG'))
+        post.save(update_fields=['image'])
+        self.assertEqual(self.refcount(old_name), 0)
+        self.assertEqual(self.refcount(post.image.name), 1)
+
+    def test_sweep_removes_unknown_files(self):
+        """Обход каталога находит файлы без записей и ссылок."""
+        orphan = default_storage.save(
+            'posts/orphan.jpg', ContentFile(self.content))
+        kept = self.create_post(image_bytes((60, 60))).image.name
+        ImageBlob.objects.all().delete()
+        self.assertEqual(blobs.collect_garbage(grace=0), [])
+        deleted = blobs.collect_garbage(grace=0, sweep=True)
+        self.assertIn(orphan, deleted)
+        self.assertNotIn(kept, deleted)
+        self.assertTrue(default_storage.exists(kept))
@@ -0,0 +1,128 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import instrumentation
+from posts.models import Post, User
+from yatube import settings as project_settings
+
+
+def timing(response):
+    """Метрики заголовка Server-Timing: {имя: (dur, desc)}."""
+    metrics = {}
+    for part in response['Server-Timing'].split(', '):
+        name, *params = part.split(';')
+        values = dict(param.split('=', 1) for param in params)
+        metrics[name] = (float(values.get('dur', 0)),
+                         values.get('desc', '').strip('"'))
+    return metrics
+
+
+@override_settings(REQUEST_METRICS_HEADER=True)
+class InstrumentationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        Post.objects.create(text='Текст', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        instrumentation.aggregate.clear()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_server_timing(self):
+        """Заголовок содержит число запросов, время базы и отрисовки."""
+        profile = reverse('profile', kwargs={'username': 'author'})
+        self.client.force_login(self.author)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(profile)
+        metrics = timing(response)
+        self.assertEqual(metrics['db'][1], f'{len(captured)} queries')
+        self.assertGreater(metrics['render'][0], 0)
+        self.assertGreaterEqual(metrics['total'][0], metrics['db'][0])
+        self.assertRegex(metrics['cache'][1], r'^\d+ hits \d+ misses$')
+
+    def test_server_timing_off_by_default(self):
+        """По умолчанию ответ не раскрывает замеры."""
+        self.assertFalse(project_settings.REQUEST_METRICS_HEADER)
+        with override_settings(REQUEST_METRICS_HEADER=False):
+            response = self.client.get(reverse('index'))
+        self.assertNotIn('Server-Timing', response)
+
+    def test_page_cache_hit(self):
+        """Ответ из кэша страниц не отрисовывается и читает кэш."""
+        self.client.get(reverse('index'))
+        metrics = timing(self.client.get(reverse('index')))
+        self.assertEqual(metrics['db'][1], '0 queries')
+        self.assertEqual(metrics['render'][0], 0)
+        hits = int(re.match(r'(\d+) hits', metrics['cache'][1]).group(1))
+        self.assertGreater(hits, 0)
+
+    def test_aggregate_by_url_name(self):
+        """Замеры копятся по имени адреса, включая ответы из кэша."""
+        for _ in range(3):
+            self.client.get(reverse('index'))
+        self.client.get('/no/such/page/here/')
+        summary = instrumentation.aggregate.snapshot()
+        self.assertEqual(summary['index']['requests'], 3)
+        self.assertEqual(summary['index']['queries']['p50'], 0)
+        self.assertGreater(summary['index']['queries']['max'], 0)
+        self.assertIn('<unresolved>', summary)
+
+    def test_background_timer(self):
+        """Время вне запроса уходит в фоновую сводку."""
+        with instrumentation.timer('thumbnail'):
+            pass
+        summary = instrumentation.aggregate.snapshot()
+        self.assertEqual(
+            summary[instrumentation.BACKGROUND]['requests'], 1)
+
+    def test_command_merges_processes(self):
+        """Команда сводит файлы процессов."""
+        with override_settings(REQUEST_METRICS_DIR=self.directory):
+            self.client.get(reverse('index'))
+            instrumentation.aggregate.flush()
+            snapshot = json.loads(json.dumps(instrumentation.load()[0]))
+            snapshot['pid'] = 0
+            with open(f'{self.directory}/0.json', 'w') as other:
+                json.dump(snapshot, other)
+            output = StringIO()
+            call_command('request_metrics', json=True, stdout=output)
+            merged = json.loads(output.getvalue())
+            self.assertEqual(merged['index']['requests'], 2)
+            output = StringIO()
+            call_command('request_metrics', stdout=output)
+            self.assertIn('Процессов: 2', output.getvalue())
+            self.assertIn('index', output.getvalue())
+
+    def test_stale_snapshots_skipped(self):
+        """Старые сводки не учитываются, а файлы завершившихся процессов
+        удаляются."""
+        process = subprocess.Popen([sys.executable, '-c', ''])
+        process.wait()
+        with override_settings(REQUEST_METRICS_DIR=self.directory):
+            self.client.get(reverse('index'))
+            instrumentation.aggregate.flush()
+            snapshot = instrumentation.load()[0]
+            snapshot['updated'] -= settings.REQUEST_METRICS_MAX_AGE + 1
+            for pid in (os.getpid(), process.pid):
+                with open(f'{self.directory}/{pid}.json', 'w') as stale:
+                    json.dump(dict(snapshot, pid=pid), stale)
+            self.assertEqual(instrumentation.load(), [])
+        self.assertEqual(os.listdir(self.directory), [f'{os.getpid()}.json'])
@@ -1,6 +1,13 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
-from posts.models import Group, Post, User
+from posts.models import (Comment, Follow, FollowQuerySet, Group, GroupStats,
+                          Post, User, UserStats)
 
 
 class PostsModelTest(TestCase):
@@ -53,3 +60,180 @@ class PostsModelTest(TestCase):
         group = PostsModelTest.group
         title = str(group)
         self.assertEqual(title, group.title)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='author')
+        cls.reader = User.objects.create(username='reader')
+        cls.post = Post.objects.create(
+            text='Текст для теста', author=cls.author)
+        Comment.objects.create(post=cls.post, author=cls.reader, text='Текст')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def test_counters_follow_changes(self):
+        """Счётчики меняются при создании записей."""
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        self.assertEqual(self.author.stats.posts_count, 1)
+        self.assertEqual(self.author.stats.followers_count, 1)
+        self.assertEqual(self.reader.stats.following_count, 1)
+
+    def test_counters_follow_deletes(self):
+        """Счётчики уменьшаются при удалении записей."""
+        Follow.objects.filter(user=self.reader).delete()
+        self.post.comments.all().delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+        stats = UserStats.objects.get(user=self.author)
+        self.assertEqual(stats.followers_count, 0)
+        Post.objects.filter(pk=self.post.pk).delete()
+        stats.refresh_from_db()
+        self.assertEqual(stats.posts_count, 0)
+
+    def test_deleting_post_skips_comment_counter(self):
+        """Удаление поста не обновляет счётчик по каждому комментарию."""
+        post = Post.objects.create(text='Другой', author=self.author)
+        for _ in range(5):
+            Comment.objects.create(post=post, author=self.reader, text='Ещё')
+        with CaptureQueriesContext(connection) as queries:
+            post.delete()
+        updates = [query['sql'] for query in queries.captured_queries
+                   if query['sql'].startswith('UPDATE "posts_post"')]
+        self.assertEqual(updates, [])
+
+    def test_drifted_counters_do_not_go_negative(self):
+        """Разошедшиеся счётчики не уходят ниже нуля при удалении."""
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.reader, text='Ещё')
+            for _ in range(3))
+        self.post.comments.all().delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+        UserStats.objects.filter(user=self.author).update(followers_count=0)
+        Follow.objects.filter(user=self.reader).delete()
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count, 0)
+
+    def test_rebuild_counters(self):
+        """Команда rebuild_counters восстанавливает счётчики."""
+        UserStats.objects.all().delete()
+        Post.objects.update(comment_count=0)
+        call_command('rebuild_counters', stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        stats = UserStats.objects.get(user=self.author)
+        self.assertEqual(
+            (stats.posts_count, stats.followers_count, stats.following_count),
+            (1, 1, 0))
+
+
+class FollowTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author')
+        cls.reader = User.objects.create(username='reader')
+
+    def stats(self):
+        return (UserStats.objects.get(user=self.author).followers_count,
+                UserStats.objects.get(user=self.reader).following_count)
+
+    def test_follow_is_unique(self):
+        """Вторая подписка на того же автора не создаётся."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=self.reader, author=self.author)
+
+    def test_follow_is_idempotent(self):
+        """Повторная подписка ничего не меняет."""
+        self.assertTrue(Follow.objects.follow(self.reader, self.author))
+        self.assertFalse(Follow.objects.follow(self.reader, self.author))
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(self.stats(), (1, 1))
+
+    def test_unfollow_is_idempotent(self):
+        """Повторная отписка не уменьшает счётчики."""
+        Follow.objects.follow(self.reader, self.author)
+        self.assertTrue(Follow.objects.unfollow(self.reader, self.author))
+        self.assertFalse(Follow.objects.unfollow(self.reader, self.author))
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(self.stats(), (0, 0))
+
+    def test_concurrent_unfollow_sends_one_signal(self):
+        """Подписку уже удалил параллельный запрос: счётчики не меняются."""
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.filter(pk=follow.pk).delete()
+        with mock.patch.object(FollowQuerySet, 'first', return_value=follow):
+            self.assertFalse(
+                Follow.objects.unfollow(self.reader, self.author))
+        self.assertEqual(self.stats(), (0, 0))
+
+
+class GroupStatsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author')
+        cls.other = User.objects.create(username='other')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.target = Group.objects.create(title='Другая', slug='target')
+
+    def stats(self, group):
+        stats = GroupStats.objects.get(group=group)
+        return stats.posts_count, stats.authors_count, stats.last_post
+
+    def test_new_group_has_empty_stats(self):
+        """Строка статистики создаётся вместе с группой."""
+        self.assertEqual(self.stats(self.group), (0, 0, None))
+
+    def test_posts_update_stats(self):
+        """Создание постов меняет число записей, авторов и дату."""
+        Post.objects.create(text='Первый', author=self.author,
+                            group=self.group)
+        Post.objects.create(text='Второй', author=self.author,
+                            group=self.group)
+        last = Post.objects.create(text='Третий', author=self.other,
+                                   group=self.group)
+        self.assertEqual(self.stats(self.group), (3, 2, last.pub_date))
+
+    def test_group_change_moves_post(self):
+        """Смена группы при правке переносит пост между строками."""
+        first = Post.objects.create(text='Первый', author=self.author,
+                                    group=self.group)
+        moved = Post.objects.create(text='Второй', author=self.author,
+                                    group=self.group)
+        moved.group = self.target
+        moved.save(update_fields=['group'])
+        self.assertEqual(self.stats(self.group), (1, 1, first.pub_date))
+        self.assertEqual(self.stats(self.target), (1, 1, moved.pub_date))
+
+    def test_delete_updates_stats(self):
+        """Удаление последнего поста автора убирает его из активных."""
+        first = Post.objects.create(text='Первый', author=self.author,
+                                    group=self.group)
+        last = Post.objects.create(text='Второй', author=self.other,
+                                   group=self.group)
+        last.delete()
+        self.assertEqual(self.stats(self.group), (1, 1, first.pub_date))
+        first.delete()
+        self.assertEqual(self.stats(self.group), (0, 0, None))
+
+    def test_rebuild(self):
+        """Команда rebuild_counters пересчитывает статистику групп."""
+        post = Post.objects.create(text='Текст', author=self.author,
+                                   group=self.group)
+        GroupStats.objects.all().delete()
+        call_command('rebuild_counters', stdout=StringIO())
+        self.assertEqual(self.stats(self.group), (1, 1, post.pub_date))
+        self.assertEqual(self.stats(self.target), (0, 0, None))
+
+    def test_queryset_delete(self):
+        """Удаление набора постов не уводит число авторов в минус."""
+        for author in (self.author, self.author, self.other):
+            Post.objects.create(text='Текст', author=author,
+                                group=self.group)
+        Post.objects.filter(author=self.author).delete()
+        self.assertEqual(self.stats(self.group)[:2], (1, 1))
+        Post.objects.all().delete()
+        self.assertEqual(self.stats(self.group), (0, 0, None))
@@ -0,0 +1,138 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import fragment_cache
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.other_group = Group.objects.create(
+            title='Другая', slug='other', description='Описание')
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(
+            text='Текст', author=cls.author, group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+
+    def urls(self):
+        return {
+            'index': reverse('index'),
+            'group': reverse('group_posts', kwargs={'slug': 'group'}),
+            'other': reverse('group_posts', kwargs={'slug': 'other'}),
+            'profile': reverse('profile', kwargs={'username': 'author'}),
+            'reader': reverse('profile', kwargs={'username': 'reader'}),
+            'post': reverse('post', kwargs={'username': 'author',
+                                            'post_id': self.post.pk}),
+        }
+
+    def cached(self, url):
+        """Страница отдана из кэша: без отрисовки шаблона."""
+        return self.client.get(url).context is None
+
+    def warm(self):
+        for url in self.urls().values():
+            self.client.get(url)
+
+    def test_anonymous_hit_without_queries(self):
+        """Повторный анонимный запрос отдаётся из кэша без базы."""
+        for url in self.urls().values():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                with self.assertNumQueries(0):
+                    cached = self.client.get(url)
+                self.assertIsNone(cached.context)
+                self.assertEqual(cached.content, response.content)
+                self.assertEqual(cached['ETag'], response['ETag'])
+
+    def test_query_string_is_part_of_key(self):
+        """Разные параметры — разные записи."""
+        url = self.urls()['index']
+        self.client.get(url)
+        self.assertFalse(self.cached(url + '?page=2'))
+        self.assertTrue(self.cached(url + '?page=2'))
+
+    def test_session_cookie_bypasses_cache(self):
+        """С сессией страница всегда собирается заново."""
+        url = self.urls()['index']
+        self.client.get(url)
+        self.client.force_login(self.reader)
+        self.assertFalse(self.cached(url))
+        self.assertFalse(self.cached(url))
+
+    def test_post_purges_feeds(self):
+        """Новый пост сбрасывает общую ленту, свою группу и страницы
+        автора: в карточке на странице поста есть число его постов."""
+        self.warm()
+        Post.objects.create(text='Новый', author=self.author,
+                            group=self.group)
+        urls = self.urls()
+        for name in ('index', 'group', 'profile', 'post'):
+            with self.subTest(name=name):
+                self.assertFalse(self.cached(urls[name]))
+        for name in ('other', 'reader'):
+            with self.subTest(name=name):
+                self.assertTrue(self.cached(urls[name]))
+
+    def test_comment_purges_post(self):
+        """Комментарий сбрасывает страницу поста."""
+        self.warm()
+        Comment.objects.create(post=self.post, author=self.reader, text='Да')
+        urls = self.urls()
+        self.assertFalse(self.cached(urls['post']))
+        self.assertTrue(self.cached(urls['other']))
+
+    def test_comment_delete_purges_post_once(self):
+        """Удаление пачки комментариев сбрасывает кэш поста один раз."""
+        for _ in range(5):
+            Comment.objects.create(
+                post=self.post, author=self.reader, text='Да')
+        self.warm()
+        with mock.patch('posts.fragment_cache.bump',
+                        wraps=fragment_cache.bump) as bump:
+            Comment.objects.filter(post=self.post).delete()
+        bump.assert_called_once()
+        urls = self.urls()
+        self.assertFalse(self.cached(urls['post']))
+        self.assertTrue(self.cached(urls['other']))
+
+    def test_post_delete_skips_comment_bumps(self):
+        """Комментарии удаляемого поста не читают пост и не сбрасывают
+        кэш по одному."""
+        post = Post.objects.create(text='Другой', author=self.author)
+        for _ in range(20):
+            Comment.objects.create(post=post, author=self.reader, text='Да')
+        with mock.patch('posts.fragment_cache.bump',
+                        wraps=fragment_cache.bump) as bump:
+            with CaptureQueriesContext(connection) as queries:
+                post.delete()
+        self.assertLessEqual(bump.call_count, 1)
+        self.assertLess(len(queries), 20)
+
+    def test_group_purges_group_pages(self):
+        """Правка группы сбрасывает её ленту, но не чужую."""
+        self.warm()
+        self.group.title = 'Новое название'
+        self.group.save()
+        urls = self.urls()
+        self.assertFalse(self.cached(urls['group']))
+        self.assertTrue(self.cached(urls['other']))
+
+    def test_follow_purges_profiles(self):
+        """Подписка сбрасывает профили подписчика и автора."""
+        self.warm()
+        Follow.objects.create(user=self.reader, author=self.author)
+        urls = self.urls()
+        self.assertFalse(self.cached(urls['profile']))
+        self.assertFalse(self.cached(urls['reader']))
+        self.assertTrue(self.cached(urls['group']))
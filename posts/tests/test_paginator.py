@@ -1,8 +1,12 @@
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
 from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from posts.models import Group, Post, User
+from posts.paginator import CursorPaginator
 
 User = get_user_model()
 
@@ -27,6 +31,9 @@ class PaginatorViewsTest(TestCase):
         Post.objects.bulk_create(posts)
 
     def setUp(self):
+        # Посты созданы bulk_create без сигналов, страницы прошлых
+        # тестов в кэше остались бы актуальными
+        cache.clear()
         self.user = User.objects.create_user(username='MrA')
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -40,3 +47,51 @@ class PaginatorViewsTest(TestCase):
         """На второй странице должно быть три поста."""
         response = self.client.get(reverse('index') + '?page=2')
         self.assertEqual(len(response.context.get('page').object_list), 3)
+
+    def test_next_cursor_page_contains_three_records(self):
+        """Курсор следующей страницы ведёт на оставшиеся три поста."""
+        first_page = self.client.get(reverse('index')).context.get('page')
+        response = self.client.get(
+            reverse('index') + f'?after={first_page.next_cursor}')
+        page = response.context.get('page')
+        self.assertEqual(len(page.object_list), 3)
+        self.assertFalse(page.has_next())
+        self.assertTrue(page.has_previous())
+
+    def test_previous_cursor_returns_first_page(self):
+        """Курсор предыдущей страницы возвращает на первую страницу."""
+        first_page = self.client.get(reverse('index')).context.get('page')
+        second_page = self.client.get(
+            reverse('index') + f'?after={first_page.next_cursor}'
+        ).context.get('page')
+        response = self.client.get(
+            reverse('index') + f'?before={second_page.previous_cursor}')
+        page = response.context.get('page')
+        self.assertEqual(list(page.object_list), list(first_page.object_list))
+        self.assertFalse(page.has_previous())
+
+    def test_invalid_cursor_returns_first_page(self):
+        """Некорректный курсор приводит на первую страницу."""
+        response = self.client.get(reverse('index') + '?after=broken')
+        self.assertEqual(len(response.context.get('page').object_list), 10)
+
+    def test_feed_does_not_count_posts(self):
+        """Лента не выполняет COUNT(*) по таблице постов."""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse(
+                'group_posts', kwargs={'slug': self.group.slug}))
+        for query in queries.captured_queries:
+            self.assertFalse(
+                'COUNT(*)' in query['sql']
+                and 'FROM "posts_post"' in query['sql'],
+                query['sql'])
+
+    def test_total_count_is_not_available(self):
+        """count, num_pages и page_range не считают записи молча."""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        for name in ('count', 'num_pages', 'page_range'):
+            with self.subTest(name=name):
+                with self.assertNumQueries(0):
+                    with self.assertRaises(NotImplementedError):
+                        getattr(paginator, name)
+        self.assertEqual(len(paginator.page(2)), 3)
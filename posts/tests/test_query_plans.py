@@ -0,0 +1,72 @@
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN есть в SQLite')
+class FeedQueryPlanTests(TestCase):
+    """
+    Ленты читаются диапазоном индекса без сортировки во временном
+    B-дереве: проверяются планы всех запросов страниц и их вторых
+    страниц по курсору.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.author = User.objects.create(username='author')
+        cls.reader = User.objects.create(username='reader')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for number in range(15):
+            post = Post.objects.create(
+                text=f'Пост {number}', author=cls.author, group=cls.group)
+            Comment.objects.create(post=post, author=cls.reader, text='Да')
+        cls.post = post
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def captured(self, url):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        queries = captured.captured_queries
+        page = response.context.get('page')
+        if page is not None and page.has_next():
+            # Следующая страница добавляет к запросу условие курсора
+            queries += self.captured(f'{url}?after={page.next_cursor}')
+        return queries
+
+    def assertNoTempSort(self, url):
+        for query in self.captured(url):
+            if not query['sql'].startswith('SELECT'):
+                continue
+            plan = self.explain(query['sql'])
+            with self.subTest(url=url, sql=query['sql']):
+                self.assertFalse(
+                    [step for step in plan if 'TEMP B-TREE' in step], plan)
+
+    def test_feeds_use_indexes(self):
+        urls = [
+            reverse('index'),
+            reverse('group_posts', kwargs={'slug': self.group.slug}),
+            reverse('profile', kwargs={'username': self.author.username}),
+            reverse('follow_index'),
+            reverse('post', kwargs={'username': self.author.username,
+                                    'post_id': self.post.pk}),
+        ]
+        for url in urls:
+            self.assertNoTempSort(url)
@@ -0,0 +1,73 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.template import Context, Engine
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from posts import querywatch, views
+from posts.models import Post, User
+
+CARDS = '{% for post in posts %}\n<p>{{ post.author.username }}</p>\n' \
+        '{% endfor %}'
+
+
+class QueryWatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for number in range(6):
+            author = User.objects.create_user(username=f'author{number}')
+            Post.objects.create(text='Текст', author=author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_shape_ignores_in_list_length(self):
+        """Списки IN разной длины дают одну форму запроса."""
+        self.assertEqual(
+            querywatch.shape('SELECT * FROM t WHERE id IN (%s, %s)'),
+            querywatch.shape('SELECT * FROM t WHERE id IN (%s)'))
+
+    def test_n_plus_one_reported_with_template_line(self):
+        """Повторяющийся запрос из цикла шаблона попадает в лог
+        со строкой шаблона."""
+        engine = Engine(loaders=[(
+            'django.template.loaders.locmem.Loader', {'cards.html': CARDS})])
+        template = engine.get_template('cards.html')
+        watch = querywatch.QueryWatch()
+        with connection.execute_wrapper(watch.execute):
+            template.render(Context({'posts': Post.objects.all()}))
+        with self.assertLogs('posts.querywatch', 'WARNING') as logs:
+            watch.report(RequestFactory().get('/'))
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('N+1: 6 раз', logs.output[0])
+        self.assertIn('шаблон cards.html:2', logs.output[0])
+
+    @override_settings(QUERY_WATCH_SLOW_MS=0)
+    def test_slow_query_logged_with_plan(self):
+        """Медленный запрос пишется в лог вместе с планом."""
+        watch = querywatch.QueryWatch()
+        with self.assertLogs('posts.querywatch', 'WARNING') as logs:
+            with connection.execute_wrapper(watch.execute):
+                list(Post.objects.filter(author__username='author1'))
+        self.assertEqual(watch.queries, 1)
+        self.assertIn('Медленный запрос', logs.output[0])
+        self.assertIn('SEARCH', logs.output[0])
+
+    def test_budget_violation_collected(self):
+        """Превышение бюджета вьюхи попадает в список нарушений."""
+        with mock.patch.object(views.index, 'query_budget', 0):
+            with querywatch.enforce_budgets() as violations:
+                self.client.get(reverse('index'))
+        self.assertEqual(len(violations), 1)
+        self.assertIn('index', violations[0])
+        with querywatch.enforce_budgets() as violations:
+            self.client.get(reverse('search'), {'q': 'Текст'})
+        self.assertEqual(violations, [])
+
+    def test_budget_violation_fails_request(self):
+        """В тестах превышение бюджета поднимается из запроса."""
+        with mock.patch.object(views.index, 'query_budget', 0):
+            with self.assertRaises(querywatch.QueryBudgetExceeded):
+                self.client.get(reverse('index'))
@@ -0,0 +1,150 @@
+import os
+import sqlite3
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.http import Http404, HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import fragment_cache, page_cache, replica, views
+from posts.models import Post, User
+
+
+def _plain_view(request):
+    return HttpResponse()
+
+
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        self.router = replica.ReplicaRouter()
+        patcher = mock.patch.object(replica, 'enabled', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def route(self, request, view):
+        """База, из которой вьюха view прочитала бы посты."""
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            return HttpResponse(self.router.db_for_read(Post))
+
+        middleware = replica.ReplicaMiddleware(get_response)
+        return middleware(request).content.decode()
+
+    def test_marked_get_reads_from_replica(self):
+        """GET ленты читает с реплики, остальное — из основной базы."""
+        factory = RequestFactory()
+        self.assertEqual(
+            self.route(factory.get('/'), views.index), 'replica')
+        self.assertEqual(
+            self.route(factory.get('/'), _plain_view), 'default')
+        self.assertEqual(
+            self.route(factory.post('/'), views.index), 'default')
+
+    def test_pinned_user_reads_from_primary(self):
+        """После записи пользователь читает из основной базы."""
+        request = RequestFactory().get('/')
+        request.COOKIES[settings.REPLICA_PIN_COOKIE] = '1'
+        self.assertEqual(self.route(request, views.index), 'default')
+
+    def test_reads_after_write_go_to_primary(self):
+        """Запрос видит свои записи, пользователи читаются из основной
+        базы, а вне запроса реплика не используется."""
+        token = replica._current.set(replica.ReplicaRequest())
+        try:
+            replica._current.get().replica = True
+            self.assertEqual(self.router.db_for_read(Post), 'replica')
+            self.assertEqual(self.router.db_for_read(User), 'default')
+            self.assertEqual(self.router.db_for_write(Post), 'default')
+            replica._current.get().wrote = True
+            self.assertEqual(self.router.db_for_read(Post), 'default')
+        finally:
+            replica._current.reset(token)
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_miss_on_replica_retried_on_primary(self):
+        """Объект, которого ещё нет на реплике, ищется в основной базе,
+        и дальше запрос читает из неё."""
+        post = Post(pk=1)
+        token = replica._current.set(replica.ReplicaRequest())
+        try:
+            replica._current.get().replica = True
+            with mock.patch.object(
+                    replica.shortcuts, 'get_object_or_404',
+                    side_effect=[Http404, post]) as lookup:
+                self.assertIs(replica.get_object_or_404(Post, pk=1), post)
+            self.assertEqual(lookup.call_count, 2)
+            self.assertEqual(self.router.db_for_read(Post), 'default')
+            self.assertFalse(replica.use_primary())
+        finally:
+            replica._current.reset(token)
+
+    def test_replica_pages_expire_with_replica(self):
+        """Страница с реплики отдаётся из кэша до обновления реплики,
+        а версии читателей основной базы от поколения не зависят."""
+        calls = []
+
+        def view(request):
+            calls.append(request)
+            version = fragment_cache.get_version('index', replica_read=True)
+            return page_cache.mark(HttpResponse(), ['index'], version,
+                                   timezone.now(), replica_read=True)
+
+        cache.clear()
+        middleware = page_cache.PageCacheMiddleware(view)
+        with mock.patch.object(replica, 'generation', return_value=1):
+            primary = fragment_cache.get_version('index', replica_read=False)
+            middleware(RequestFactory().get('/'))
+            middleware(RequestFactory().get('/'))
+        self.assertEqual(len(calls), 1)
+        with mock.patch.object(replica, 'generation', return_value=2):
+            self.assertEqual(
+                fragment_cache.get_version('index', replica_read=False),
+                primary)
+            middleware(RequestFactory().get('/'))
+        self.assertEqual(len(calls), 2)
+
+
+class ReplicaPinTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def test_write_pins_user_to_primary(self):
+        """Подписка ставит куку закрепления, чтение ленты — нет."""
+        self.client.force_login(self.reader)
+        response = self.client.get(reverse('index'))
+        self.assertNotIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+        response = self.client.get(
+            reverse('profile_follow', args=[self.author.username]))
+        cookie = response.cookies[settings.REPLICA_PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.REPLICA_PIN_SECONDS)
+
+
+class ReplicateTests(TransactionTestCase):
+    def test_replicate_copies_primary(self):
+        """replicate копирует основную базу в файл реплики."""
+        author = User.objects.create_user(username='author')
+        Post.objects.create(text='Текст', author=author)
+        cache.set('kept', 1)
+        self.assertFalse(replica.enabled())
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'replica.sqlite3')
+            settings_dict = connections['replica'].settings_dict
+            with mock.patch.dict(settings_dict, NAME=path):
+                self.assertTrue(replica.enabled())
+                replica.replicate()
+            copy = sqlite3.connect(path)
+            try:
+                count, = copy.execute(
+                    f'SELECT COUNT(*) FROM {Post._meta.db_table}').fetchone()
+            finally:
+                copy.close()
+        self.assertEqual(count, 1)
+        # Кэш не сбрасывается: страницы с реплики устаревают по поколению
+        self.assertEqual(cache.get('kept'), 1)
@@ -0,0 +1,73 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+from posts.stemmer import stem
+
+
+class StemmerTest(TestCase):
+    def test_stem(self):
+        """Словоформы сводятся к общей основе."""
+        words = {
+            'красивые': 'красив',
+            'красивая': 'красив',
+            'постами': 'пост',
+            'читающий': 'чита',
+            'активность': 'активн',
+            'ёлка': 'елк',
+            'django': 'django',
+        }
+        for word, expected in words.items():
+            with self.subTest(word=word):
+                self.assertEqual(stem(word), expected)
+
+
+class SearchViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='author')
+        cls.cats = Post.objects.create(
+            text='Кошки любят спать. Кошка спит весь день.',
+            author=cls.author)
+        cls.cat = Post.objects.create(
+            text='Моя кошка и собаки', author=cls.author)
+        cls.dogs = Post.objects.create(
+            text='Собаки гуляют в парке', author=cls.author)
+
+    def search(self, query):
+        response = self.client.get(reverse('search'), {'q': query})
+        return list(response.context.get('page'))
+
+    def test_search_matches_word_forms(self):
+        """Поиск находит посты с другими формами слова."""
+        self.assertEqual(self.search('собака'), [self.cat, self.dogs])
+
+    def test_search_ranks_by_relevance(self):
+        """Более релевантные посты идут первыми."""
+        self.assertEqual(self.search('кошками'), [self.cats, self.cat])
+
+    def test_search_requires_all_words(self):
+        """Пост должен содержать все слова запроса."""
+        self.assertEqual(self.search('кошка собаки'), [self.cat])
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при изменении и удалении поста."""
+        self.dogs.text = 'Птицы поют'
+        self.dogs.save()
+        self.assertEqual(self.search('птица'), [self.dogs])
+        self.assertEqual(self.search('собаки'), [self.cat])
+        Post.objects.filter(pk=self.cat.pk).delete()
+        self.assertEqual(self.search('собаки'), [])
+
+    @override_settings(PAR_PAGE=1)
+    def test_search_pagination(self):
+        """Выдача делится на страницы по курсору (rank, id)."""
+        response = self.client.get(reverse('search'), {'q': 'кошка'})
+        first_page = response.context.get('page')
+        response = self.client.get(
+            reverse('search'),
+            {'q': 'кошка', 'after': first_page.next_cursor})
+        self.assertEqual(
+            list(first_page) + list(response.context.get('page')),
+            [self.cats, self.cat])
@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from PIL import Image
+from sorl.thumbnail import default
+
+from posts import thumbnails
+from posts.models import Post, User
+
+MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class DeferredThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        buffer = BytesIO()
+        Image.new('RGB', (1200, 800), 'red').save(buffer, 'JPEG')
+        cls.names = [
+            default_storage.save(
+                f'posts/photo{number}.jpg', ContentFile(buffer.getvalue()))
+            for number in range(3)
+        ]
+        cls.name = cls.names[0]
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        shutil.rmtree(os.path.join(MEDIA_ROOT, 'cache'), ignore_errors=True)
+
+    def get_thumbnail(self):
+        geometry, options = thumbnails.POST_THUMBNAILS[0]
+        return default.backend.get_thumbnail(self.name, geometry, **options)
+
+    def test_request_does_not_resize(self):
+        """Без готовой миниатюры запрос получает оригинал."""
+        image = self.get_thumbnail()
+        self.assertEqual(image.name, self.name)
+        self.assertFalse(default_storage.exists('cache'))
+
+    def test_prepared_thumbnail_is_served(self):
+        """После фоновой генерации шаблон получает миниатюру."""
+        geometry, options = thumbnails.POST_THUMBNAILS[0]
+        thumbnails._submit('key', self.name, geometry, dict(options))
+        image = self.get_thumbnail()
+        self.assertNotEqual(image.name, self.name)
+        self.assertEqual((image.width, image.height), (960, 339))
+
+    def test_prefetch_reads_store_in_one_query(self):
+        """Миниатюры страницы читаются одним запросом к хранилищу."""
+        geometry, options = thumbnails.POST_THUMBNAILS[0]
+        author = User.objects.create(username='author')
+        posts = [Post(text='Текст', author=author, image=name)
+                 for name in self.names]
+        # Ключ миниатюры в sorl зависит от хранилища исходника
+        thumbnails._submit('key', posts[0].image, geometry, dict(options))
+        cache.clear()
+        with self.assertNumQueries(1):
+            thumbnails.prefetch(posts)
+        self.assertEqual(
+            (posts[0].thumbnail.width, posts[0].thumbnail.height), (960, 339))
+        self.assertEqual(posts[1].thumbnail.name, self.names[1])
+        with self.assertNumQueries(0):
+            thumbnails.prefetch(posts)
+
+    def render_picture(self, post, eager=False):
+        template = Template(
+            '{% load post_images %}{% post_picture post eager=eager %}')
+        return template.render(Context({'post': post, 'eager': eager}))
+
+    def test_picture_lists_widths_and_formats(self):
+        """Готовые миниатюры выводятся srcset по ширинам и источником
+        WebP, размеры основной миниатюры — в атрибутах картинки."""
+        author = User.objects.create(username='author')
+        post = Post(text='Текст', author=author, image=self.name)
+        for geometry, options in thumbnails.POST_THUMBNAILS:
+            thumbnails._submit(
+                geometry + repr(options), post.image, geometry,
+                dict(options))
+        thumbnails.prefetch([post])
+        self.assertEqual(set(post.variants), {None, 'WEBP'})
+        html = self.render_picture(post)
+        self.assertIn('<source type="image/webp"', html)
+        self.assertRegex(html, r'srcset="[^"]+\.jpg 480w, [^"]+\.jpg 960w')
+        self.assertRegex(html, r'\.webp 480w')
+        self.assertIn('width="960" height="339"', html)
+        self.assertIn('loading="lazy"', html)
+        self.assertIn('loading="eager"', self.render_picture(post, True))
+
+    def test_picture_falls_back_to_original(self):
+        """Пока миниатюр нет, выводится оригинал с размерами из поста."""
+        author = User.objects.create(username='author')
+        post = Post(text='Текст', author=author, image=self.name,
+                    image_width=1200, image_height=800)
+        thumbnails.prefetch([post])
+        html = self.render_picture(post)
+        self.assertNotIn('<source', html)
+        self.assertNotIn('srcset', html)
+        self.assertIn(f'src="{post.image.url}"', html)
+        self.assertIn('width="1200" height="800"', html)
@@ -1,8 +1,12 @@
 from django.contrib.auth import get_user_model
 from django.test import Client, TestCase
+from django.urls import get_resolver
 from http import HTTPStatus
 
 from posts.models import Group, Post
+from users.admin import UserChangeForm, UserCreationForm
+from users.forms import CreationForm
+from users.validators import RESERVED_USERNAMES, rename_reserved
 
 User = get_user_model()
 
@@ -93,3 +97,59 @@ class PostsURLTests(TestCase):
         response = self.guest_client.get(
             f'/{self.user.username}/{self.post.id}/comment/')
         self.assertEqual(response.status_code, HTTPStatus.FOUND)
+
+
+class ReservedUsernameTests(TestCase):
+    def test_static_prefixes_are_reserved(self):
+        """Каждый постоянный первый сегмент адреса нельзя взять
+        именем пользователя."""
+        prefixes = set()
+        patterns = list(get_resolver().url_patterns)
+        while patterns:
+            pattern = patterns.pop()
+            route = str(pattern.pattern)
+            prefix = route.lstrip('^').split('/', 1)[0]
+            if prefix and not prefix.startswith('<'):
+                prefixes.add(prefix)
+            elif not route and hasattr(pattern, 'url_patterns'):
+                patterns.extend(pattern.url_patterns)
+        self.assertLessEqual(prefixes, RESERVED_USERNAMES)
+
+    def test_signup_rejects_reserved_username(self):
+        form = CreationForm(data={
+            'username': 'Api',
+            'password1': 'Sup3r-secret-pass',
+            'password2': 'Sup3r-secret-pass',
+        })
+        self.assertFalse(form.is_valid())
+        self.assertIn('username', form.errors)
+
+    def test_admin_rejects_reserved_username(self):
+        """Админка не создаёт и не переименовывает пользователя в
+        занятое имя, но сохраняет остальные правки."""
+        form = UserCreationForm(data={
+            'username': 'search',
+            'password1': 'Sup3r-secret-pass',
+            'password2': 'Sup3r-secret-pass',
+        })
+        self.assertFalse(form.is_valid())
+        self.assertIn('username', form.errors)
+        user = User.objects.create_user(username='reader')
+        data = {'username': 'Groups', 'date_joined': user.date_joined,
+                'last_login': user.last_login}
+        form = UserChangeForm(data=data, instance=user)
+        self.assertFalse(form.is_valid())
+        self.assertIn('username', form.errors)
+
+    def test_rename_reserved_users(self):
+        """Существующие пользователи с занятыми именами переименовываются
+        в первое свободное имя."""
+        User.objects.create_user(username='api')
+        User.objects.create_user(username='api_1')
+        User.objects.create_user(username='Search')
+        User.objects.create_user(username='reader')
+        renamed = rename_reserved(User)
+        self.assertEqual(renamed, [('api', 'api_2'), ('Search', 'Search_1')])
+        self.assertEqual(
+            set(User.objects.values_list('username', flat=True)),
+            {'api_1', 'api_2', 'Search_1', 'reader'})
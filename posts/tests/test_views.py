@@ -1,13 +1,18 @@
 import shutil
 import tempfile
+from io import StringIO
+
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 
-from posts.models import Group, Post, User, Follow
+from posts import timeline
+from posts.models import Comment, FeedEntry, Group, Post, User, Follow
 
 User = get_user_model()
 
@@ -200,17 +205,27 @@ class PostsPagesTests(TestCase):
     def test_index_page_cache(self):
         """Проверка кэша шаблона index."""
         response_1 = self.authorized_client.get(reverse('index'))
-        post = Post.objects.create(
-            text='Cache Test',
-            author=self.user,
-        )
-        self.assertTrue(
-            Post.objects.filter(
-                text=post.text
-            ).exists()
-        )
+        # Изменение в обход сигналов не сбрасывает кэш
+        Post.objects.filter(pk=self.post.pk).update(text='Cache Test')
         response_2 = self.authorized_client.get(reverse('index'))
         self.assertEqual(response_1.content, response_2.content)
+        Post.objects.create(
+            text='Новый пост',
+            author=self.user,
+        )
+        response_3 = self.authorized_client.get(reverse('index'))
+        self.assertNotEqual(response_1.content, response_3.content)
+        self.assertContains(response_3, 'Новый пост')
+
+    def test_follow_page_cache_is_per_user(self):
+        """Лента подписок кэшируется отдельно для каждого пользователя."""
+        self.authorized_client2.get(
+            reverse('profile_follow',
+                    kwargs={'username': self.user.username, }))
+        response = self.authorized_client2.get(reverse('follow_index'))
+        self.assertContains(response, self.post.text)
+        response = self.authorized_client3.get(reverse('follow_index'))
+        self.assertNotContains(response, self.post.text)
 
     def test_follow_user(self):
         """Проверка системы подписок."""
@@ -239,3 +254,273 @@ class PostsPagesTests(TestCase):
         response_2 = self.authorized_client3.get(reverse('follow_index'))
         post_object_2 = response_2.context.get('page')
         self.assertEqual(0, len(post_object_2), 'Объекта быть не должно!')
+
+
+class PostsQueryCountTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title='Заголовок',
+            slug='test-slug',
+            description='Описание',
+        )
+        for number in range(settings.PAR_PAGE):
+            author = User.objects.create(username=f'author{number}')
+            post = Post.objects.create(
+                text=f'Текст для теста {number}',
+                group=cls.group,
+                author=author,
+            )
+            Comment.objects.create(post=post, author=author, text='Текст')
+
+    def test_group_page_query_budget(self):
+        """Страница группы выполняет фиксированное число запросов."""
+        # Группа и страница постов с авторами и числом комментариев
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                reverse('group_posts', kwargs={'slug': self.group.slug}))
+        self.assertEqual(
+            len(response.context.get('page')), settings.PAR_PAGE)
+        self.assertContains(response, 'Комментариев: 1')
+
+
+class FollowTimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.star = User.objects.create_user(username='star')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def setUp(self):
+        self.client.force_login(self.reader)
+
+    def follow(self, author):
+        self.client.get(
+            reverse('profile_follow', kwargs={'username': author.username}))
+
+    def feed(self, query=''):
+        response = self.client.get(reverse('follow_index') + query)
+        return response.context.get('page')
+
+    def test_post_is_fanned_out_to_followers(self):
+        """Новый пост попадает в ленты подписчиков при публикации."""
+        self.follow(self.author)
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.reader, post=post).exists())
+        self.assertEqual(list(self.feed()), [post])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка заполняет ленту, отписка очищает её."""
+        post = Post.objects.create(text='Старый пост', author=self.author)
+        self.follow(self.author)
+        self.assertEqual(list(self.feed()), [post])
+        self.client.get(reverse(
+            'profile_unfollow', kwargs={'username': self.author.username}))
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(len(self.feed()), 0)
+
+    @override_settings(FEED_FANOUT_LIMIT=2, PAR_PAGE=3)
+    def test_celebrity_posts_are_merged_on_read(self):
+        """Посты популярного автора подмешиваются при чтении ленты."""
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=fan, author=self.star)
+        self.follow(self.author)
+        self.follow(self.star)
+        posts = [
+            Post.objects.create(text=f'Пост {number}', author=author)
+            for number, author in enumerate(
+                [self.author, self.star] * 3)
+        ]
+        self.assertFalse(
+            FeedEntry.objects.filter(author=self.star).exists())
+        self.assertTrue(
+            FeedEntry.objects.filter(author=self.author).exists())
+        first_page = self.feed()
+        second_page = self.feed(f'?after={first_page.next_cursor}')
+        self.assertEqual(
+            list(first_page) + list(second_page), posts[::-1])
+        self.assertFalse(second_page.has_next())
+
+    @override_settings(FEED_FANOUT_LIMIT=3, FEED_FANOUT_HYSTERESIS=1)
+    def test_demoted_celebrity_posts_are_backfilled(self):
+        """Ниже порога с зазором автор возвращается к раздаче командой,
+        и его посты, написанные в статусе популярного, остаются
+        в ленте."""
+        fans = [User.objects.create_user(username=f'fan{number}')
+                for number in range(2)]
+        for fan in fans:
+            Follow.objects.create(user=fan, author=self.star)
+        self.follow(self.star)
+        post = Post.objects.create(text='Пост звезды', author=self.star)
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+        for fan in fans:
+            # Отписка не пересобирает ленты, пост подмешивается при чтении
+            Follow.objects.unfollow(fan, self.star)
+            self.assertTrue(timeline.is_celebrity(self.star.pk))
+            self.assertEqual(list(self.feed()), [post])
+        self.assertEqual(
+            list(timeline.pending_demotions().values_list(
+                'user_id', flat=True)), [self.star.pk])
+        call_command('demote_celebrities', batch_size=1, stdout=StringIO())
+        self.assertFalse(timeline.is_celebrity(self.star.pk))
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        self.assertEqual(list(self.feed()), [post])
+
+
+@override_settings(COMMENTS_PER_PAGE=5)
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Текст', author=author)
+        cls.comments = [
+            Comment.objects.create(
+                post=cls.post,
+                author=User.objects.create_user(username=f'reader{number}'),
+                text=f'Комментарий {number}')
+            for number in range(7)
+        ][::-1]
+        cls.kwargs = {'username': author.username, 'post_id': cls.post.pk}
+
+    def setUp(self):
+        cache.clear()
+
+    def test_post_page_renders_first_comments(self):
+        """Страница поста показывает первую страницу комментариев
+        фиксированным числом запросов."""
+        # Пост с автором и счётчиками, страница комментариев с авторами
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('post', kwargs=self.kwargs))
+        comments = response.context.get('comments')
+        self.assertEqual(list(comments), self.comments[:5])
+        self.assertContains(
+            response, reverse('post_comments', kwargs=self.kwargs)
+            + f'?after={comments.next_cursor}')
+
+    def test_more_comments_fragment(self):
+        """Следующая страница приходит HTML-фрагментом."""
+        page = self.client.get(
+            reverse('post', kwargs=self.kwargs)).context.get('comments')
+        response = self.client.get(
+            reverse('post_comments', kwargs=self.kwargs),
+            {'after': page.next_cursor})
+        self.assertEqual(list(response.context.get('comments')),
+                         self.comments[5:])
+        self.assertContains(response, 'Комментарий 0')
+        self.assertNotContains(response, 'js-more-comments')
+        self.assertNotContains(response, '<html>')
+
+    def test_more_comments_json(self):
+        """С ?format=json следующая страница приходит в JSON."""
+        response = self.client.get(
+            reverse('post_comments', kwargs=self.kwargs), {'format': 'json'})
+        data = response.json()
+        self.assertEqual(
+            [comment['id'] for comment in data['comments']],
+            [comment.id for comment in self.comments[:5]])
+        self.assertEqual(data['comments'][0]['author'], 'reader6')
+        response = self.client.get(
+            reverse('post_comments', kwargs=self.kwargs),
+            {'format': 'json', 'after': data['next']})
+        self.assertEqual(len(response.json()['comments']), 2)
+        self.assertIsNone(response.json()['next'])
+
+
+class ConditionalResponseTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(
+            text='Текст', author=cls.author, group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+
+    def urls(self):
+        return [
+            reverse('index'),
+            reverse('group_posts', kwargs={'slug': self.group.slug}),
+            reverse('profile', kwargs={'username': self.author.username}),
+            reverse('post', kwargs={'username': self.author.username,
+                                    'post_id': self.post.pk}),
+        ]
+
+    def test_anonymous_pages_are_public_and_validated(self):
+        """Анонимный повторный запрос получает 304 из кэша страниц."""
+        for url in self.urls():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn('public', response['Cache-Control'])
+                self.assertIn('s-maxage', response['Cache-Control'])
+                with self.assertNumQueries(0):
+                    response = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(response.status_code, 304)
+
+    def test_authenticated_pages_are_private(self):
+        """Страницы вошедшего пользователя не кэшируются публично."""
+        self.client.force_login(self.reader)
+        for url in self.urls():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertFalse(response.has_header('ETag'))
+                self.assertIn('private', response['Cache-Control'])
+
+    def test_changes_update_validators(self):
+        """Подписка и комментарий меняют ETag профиля и поста."""
+        profile, post = self.urls()[2:]
+        etags = [self.client.get(url)['ETag'] for url in (profile, post)]
+        Follow.objects.create(user=self.reader, author=self.author)
+        Comment.objects.create(post=self.post, author=self.reader, text='Да')
+        for url, etag in zip((profile, post), etags):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+
+class GroupDirectoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author')
+        cls.quiet = Group.objects.create(title='Тихая', slug='quiet')
+        cls.busy = Group.objects.create(title='Шумная', slug='busy')
+        cls.empty = Group.objects.create(title='Пустая', slug='empty')
+        for number in range(3):
+            Post.objects.create(text=f'Текст {number}', author=cls.author,
+                                group=cls.busy)
+        Post.objects.create(text='Свежий', author=cls.author,
+                            group=cls.quiet)
+
+    def setUp(self):
+        cache.clear()
+
+    def titles(self, response):
+        return [stats.group.title for stats in response.context['groups']]
+
+    def test_sorted_by_activity(self):
+        """По умолчанию сверху группа с самой свежей записью, пустые
+        группы в конце, а постов каталог не читает."""
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('group_index'))
+        self.assertEqual(self.titles(response), ['Тихая', 'Шумная', 'Пустая'])
+        self.assertContains(response, 'Записей: 3')
+
+    def test_sorted_by_posts(self):
+        response = self.client.get(reverse('group_index'), {'sort': 'posts'})
+        self.assertEqual(self.titles(response), ['Шумная', 'Тихая', 'Пустая'])
+
+    def test_new_post_refreshes_cached_directory(self):
+        """Новый пост в группе сбрасывает закэшированный каталог."""
+        self.client.get(reverse('group_index'))
+        Post.objects.create(text='Ещё', author=self.author, group=self.empty)
+        response = self.client.get(reverse('group_index'))
+        self.assertEqual(self.titles(response), ['Пустая', 'Тихая', 'Шумная'])
@@ -0,0 +1,197 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from . import instrumentation
+
+logger = logging.getLogger(__name__)
+
+# Миниатюры карточки поста: ширина, геометрия и опции sorl. Первая —
+# основная (src картинки и API), остальные дают srcset для узких
+# и плотных экранов. Шире 960 пикселей изображение не растягивается
+POST_WIDTHS = (
+    (960, '960x339', {'crop': 'center', 'upscale': True}),
+    (480, '480x170', {'crop': 'center', 'upscale': True}),
+    (1440, '1440x509', {'crop': 'center', 'upscale': False}),
+)
+# Дополнительные форматы для <picture>: браузер выбирает первый
+# поддерживаемый, остальные получают JPEG. AVIF добавляется сюда,
+# когда Pillow и sorl-thumbnail научатся его сохранять
+POST_FORMATS = ('WEBP',)
+POST_THUMBNAILS = tuple(
+    (geometry_string, options)
+    for _, geometry_string, options in POST_WIDTHS
+) + tuple(
+    (geometry_string, {**options, 'format': image_format})
+    for image_format in POST_FORMATS
+    for _, geometry_string, options in POST_WIDTHS
+)
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+class KVStore(cached_db_kvstore.KVStore):
+    """Хранилище sorl-thumbnail с пакетным чтением для страниц ленты."""
+
+    def get_many(self, image_files):
+        """
+        Словарь {ключ файла: ImageFile или None}: один get_many к кэшу
+        и один запрос к базе для ключей, которых нет в кэше.
+        """
+        keys = {add_prefix(image.key): image.key for image in image_files}
+        if not keys:
+            return {}
+        values = self.cache.get_many(list(keys))
+        missing = [key for key in keys if key not in values]
+        if missing:
+            found = dict(KVStoreModel.objects.filter(
+                key__in=missing).values_list('key', 'value'))
+            for key in missing:
+                values[key] = found.get(key, cached_db_kvstore.EMPTY_VALUE)
+            self.cache.set_many(
+                {key: values[key] for key in missing},
+                thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT)
+        return {
+            key: (None if values[raw_key] == cached_db_kvstore.EMPTY_VALUE
+                  else deserialize_image_file(values[raw_key]))
+            for raw_key, key in keys.items()
+        }
+
+
+class DeferredThumbnailBackend(ThumbnailBackend):
+    """
+    Бэкенд sorl-thumbnail, который в веб-запросе только ищет готовую
+    миниатюру. Если её ещё нет, шаблон получает исходное изображение,
+    а генерация откладывается до фиксации транзакции: в фоновый пул,
+    если он включён THUMBNAIL_WORKERS, иначе в том же потоке.
+    """
+
+    def resolve(self, file_, geometry_string, **options):
+        """Исходник и файл миниатюры с теми же опциями, что у sorl."""
+        source = ImageFile(file_)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return source, ImageFile(name, default.storage)
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if not file_:
+            raise ValueError('falsey file_ argument in get_thumbnail()')
+        source, thumbnail = self.resolve(
+            file_, geometry_string, **dict(options))
+        cached = default.kvstore.get(thumbnail)
+        if cached:
+            return cached
+        schedule(source, geometry_string, options)
+        return source
+
+    def generate(self, file_, geometry_string, **options):
+        """Создаёт миниатюру; вызывается только из schedule."""
+        return super().get_thumbnail(file_, geometry_string, **options)
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails')
+        return _executor
+
+
+def _generate(key, file_, geometry_string, options):
+    try:
+        with instrumentation.timer('thumbnail'):
+            default.backend.generate(file_, geometry_string, **options)
+    except Exception:
+        logger.exception('Не удалось создать миниатюру %s', key[0])
+    finally:
+        with _lock:
+            _pending.discard(key)
+        if settings.THUMBNAIL_WORKERS:
+            connection.close()
+
+
+def _submit(key, file_, geometry_string, options):
+    with _lock:
+        if key in _pending:
+            return
+        _pending.add(key)
+    if settings.THUMBNAIL_WORKERS:
+        _get_executor().submit(
+            _generate, key, file_, geometry_string, options)
+    else:
+        _generate(key, file_, geometry_string, options)
+
+
+def schedule(file_, geometry_string, options):
+    """
+    Ставит генерацию миниатюры в очередь после фиксации транзакции.
+    Миниатюра, которая уже в очереди, повторно не ставится. file_ —
+    файл с хранилищем: от хранилища зависит ключ миниатюры в sorl.
+    """
+    key = (file_.name, geometry_string, repr(sorted(options.items())))
+    transaction.on_commit(
+        lambda: _submit(key, file_, geometry_string, options))
+
+
+def prepare(image):
+    """Заранее создаёт все миниатюры поста для загруженного изображения."""
+    if not image:
+        return
+    for geometry_string, options in POST_THUMBNAILS:
+        schedule(image, geometry_string, dict(options))
+
+
+@instrumentation.timer('thumbnail')
+def prefetch(posts):
+    """
+    Находит все миниатюры карточек страницы одним обращением
+    к хранилищу. В post.thumbnail кладётся основная миниатюра, а пока
+    она не готова — оригинал изображения; в post.variants — готовые
+    миниатюры по форматам (None — формат исходника) для srcset.
+    Недостающие миниатюры ставятся в очередь.
+    """
+    resolved = []
+    for post in posts:
+        post.thumbnail = None
+        post.variants = {}
+        if post.image:
+            for geometry_string, options in POST_THUMBNAILS:
+                resolved.append((post, geometry_string, options, *(
+                    default.backend.resolve(
+                        post.image, geometry_string, **dict(options)))))
+    found = default.kvstore.get_many(
+        [thumbnail for *_, thumbnail in resolved])
+    for post, geometry_string, options, source, thumbnail in resolved:
+        thumbnail = found.get(thumbnail.key)
+        if thumbnail is None:
+            schedule(source, geometry_string, dict(options))
+            continue
+        if (geometry_string, options) == POST_THUMBNAILS[0]:
+            post.thumbnail = thumbnail
+        post.variants.setdefault(options.get('format'), []).append(
+            thumbnail)
+    for post, *_, source, _ in resolved:
+        if post.thumbnail is None:
+            post.thumbnail = source
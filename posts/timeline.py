@@ -0,0 +1,257 @@
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from .models import FeedEntry, Follow, Post, UserStats
+from .paginator import CursorPaginator
+
+TIMELINE_ORDERING = ('-pub_date', '-post_id')
+
+
+def is_celebrity(author_id):
+    """
+    Ленты подписчиков такого автора собираются при чтении. Решение
+    хранится в UserStats.celebrity_since, и запись, и чтение ленты
+    видят одно и то же.
+    """
+    return UserStats.objects.filter(
+        user_id=author_id, celebrity_since__isnull=False).exists()
+
+
+def promote(author_id):
+    """Автор набрал FEED_FANOUT_LIMIT подписчиков и стал популярным."""
+    UserStats.objects.filter(
+        user_id=author_id,
+        celebrity_since__isnull=True,
+        followers_count__gte=settings.FEED_FANOUT_LIMIT,
+    ).update(celebrity_since=timezone.now())
+
+
+def fan_out(post, batch_size=1000):
+    """Раздаёт новый пост в ленты подписчиков автора."""
+    if is_celebrity(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, post=post, author_id=post.author_id,
+                   pub_date=post.pub_date)
+         for user_id in followers.iterator()),
+        batch_size=batch_size,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(follow):
+    """Добавляет в ленту подписчика последние посты нового автора."""
+    if not is_celebrity(follow.author_id):
+        _backfill(follow)
+
+
+def _backfill(follow):
+    posts = Post.objects.filter(
+        author_id=follow.author_id
+    ).values_list('pk', 'pub_date')[:settings.FEED_BACKFILL]
+    FeedEntry.objects.bulk_create(
+        [FeedEntry(user_id=follow.user_id, post_id=post_id,
+                   author_id=follow.author_id, pub_date=pub_date)
+         for post_id, pub_date in posts],
+        ignore_conflicts=True,
+    )
+
+
+def _insert_entries(select, params):
+    """INSERT ... SELECT в ленты без дублей уже существующих записей."""
+    ops = connection.ops
+    columns = ', '.join(
+        FeedEntry._meta.get_field(name).column
+        for name in ('user', 'post', 'author', 'pub_date'))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{ops.insert_statement(ignore_conflicts=True)} '
+            f'{FeedEntry._meta.db_table} ({columns}) {select} '
+            f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}',
+            params)
+
+
+def _tables():
+    return {
+        'follow': Follow._meta.db_table,
+        'post': Post._meta.db_table,
+        'stats': UserStats._meta.db_table,
+        'feed': FeedEntry._meta.db_table,
+    }
+
+
+def rebuild(follows=None, posts=None):
+    """
+    Собирает ленты одним INSERT ... SELECT на набор подписок, например
+    после массовой загрузки данных в обход сигналов: каждая подписка
+    получает последние FEED_BACKFILL постов автора. UserStats должны
+    быть уже пересчитаны: по ним определяются популярные авторы.
+
+    Без аргументов ленты строятся заново целиком. follows и posts —
+    SQL подзапросы с id загруженных подписок и постов: тогда
+    дополняются только ленты новых подписок, а новые посты раздаются
+    подписчикам, как это сделал бы fan_out.
+    """
+    tables = _tables()
+    if follows is None and posts is None:
+        FeedEntry.objects.all().delete()
+        follows = f'SELECT id FROM {tables["follow"]}'
+    if follows is not None:
+        # Номер поста у автора от новых к старым ограничивает
+        # число постов каждого автора в ленте
+        _insert_entries(
+            f'SELECT f.user_id, p.id, p.author_id, p.pub_date '
+            f'FROM {tables["follow"]} f '
+            f'INNER JOIN (SELECT id, author_id, pub_date, ROW_NUMBER() '
+            f'OVER (PARTITION BY author_id ORDER BY pub_date DESC, id DESC) '
+            f'AS position FROM {tables["post"]} WHERE author_id IN '
+            f'(SELECT author_id FROM {tables["follow"]} '
+            f'WHERE id IN ({follows}))) p ON p.author_id = f.author_id '
+            f'LEFT JOIN {tables["stats"]} s ON s.user_id = f.author_id '
+            f'WHERE f.id IN ({follows}) AND p.position <= %s '
+            f'AND s.celebrity_since IS NULL',
+            [settings.FEED_BACKFILL])
+    if posts is not None:
+        _insert_entries(
+            f'SELECT f.user_id, p.id, p.author_id, p.pub_date '
+            f'FROM {tables["post"]} p '
+            f'INNER JOIN {tables["follow"]} f ON f.author_id = p.author_id '
+            f'LEFT JOIN {tables["stats"]} s ON s.user_id = p.author_id '
+            f'WHERE p.id IN ({posts}) AND s.celebrity_since IS NULL',
+            [])
+
+
+def pending_demotions():
+    """
+    Популярные авторы, у которых подписчиков стало меньше
+    FEED_FANOUT_LIMIT - FEED_FANOUT_HYSTERESIS. Зазор не даёт автору
+    на границе то раздаваться, то подмешиваться при каждой подписке.
+    """
+    return UserStats.objects.filter(
+        celebrity_since__isnull=False,
+        followers_count__lt=(
+            settings.FEED_FANOUT_LIMIT - settings.FEED_FANOUT_HYSTERESIS),
+    )
+
+
+def _demote_follows(stats, follow_ids):
+    """
+    Дополняет ленты подписок follow_ids постами, написанными с момента
+    celebrity_since, а подписчикам без единой записи автора — последними
+    FEED_BACKFILL постами, которые им не раздали при подписке.
+    """
+    if not follow_ids:
+        return
+    tables = _tables()
+    _insert_entries(
+        f'SELECT f.user_id, p.id, p.author_id, p.pub_date '
+        f'FROM {tables["follow"]} f '
+        f'INNER JOIN (SELECT id, author_id, pub_date, ROW_NUMBER() '
+        f'OVER (ORDER BY pub_date DESC, id DESC) AS position '
+        f'FROM {tables["post"]} WHERE author_id = %s) p '
+        f'ON p.author_id = f.author_id '
+        f'WHERE f.id IN ({", ".join(["%s"] * len(follow_ids))}) '
+        f'AND p.position <= %s AND (p.pub_date >= %s OR NOT EXISTS '
+        f'(SELECT 1 FROM {tables["feed"]} e WHERE e.user_id = f.user_id '
+        f'AND e.author_id = f.author_id))',
+        [stats.user_id, *follow_ids, settings.FEED_BACKFILL,
+         stats.celebrity_since])
+
+
+def demote(stats, batch_size=1000):
+    """
+    Возвращает автора к раздаче постов. Пока отметка не снята, его
+    посты подмешиваются при чтении, поэтому ленты дополняются заранее,
+    короткими транзакциями по batch_size подписок. Подписки и посты,
+    появившиеся за это время, дописываются в последней транзакции
+    вместе со снятием отметки. Возвращает, снята ли отметка: автор мог
+    снова набрать подписчиков.
+    """
+    tables = _tables()
+    follows = Follow.objects.filter(
+        author_id=stats.user_id).order_by('pk').values_list('pk', flat=True)
+    # id растут: посты новее last_post_id написаны во время работы
+    last_post_id = Post.objects.filter(author_id=stats.user_id).aggregate(
+        last=Max('pk'))['last'] or 0
+    start = 0
+    while True:
+        with transaction.atomic():
+            batch = list(follows.filter(pk__gt=start)[:batch_size])
+            _demote_follows(stats, batch)
+        if batch:
+            start = batch[-1]
+        if len(batch) < batch_size:
+            break
+    with transaction.atomic():
+        _demote_follows(stats, list(follows.filter(pk__gt=start)))
+        _insert_entries(
+            f'SELECT f.user_id, p.id, p.author_id, p.pub_date '
+            f'FROM {tables["post"]} p '
+            f'INNER JOIN {tables["follow"]} f ON f.author_id = p.author_id '
+            f'WHERE p.author_id = %s AND p.id > %s',
+            [stats.user_id, last_post_id])
+        return bool(pending_demotions().filter(
+            user_id=stats.user_id, celebrity_since=stats.celebrity_since,
+        ).update(celebrity_since=None))
+
+
+def demote_pending(batch_size=1000):
+    """Снимает отметку со всех pending_demotions, возвращает их число."""
+    demoted = 0
+    for stats in list(pending_demotions()):
+        demoted += demote(stats, batch_size)
+    return demoted
+
+
+def prune(follow):
+    """Убирает из ленты посты автора, от которого отписались."""
+    FeedEntry.objects.filter(
+        user_id=follow.user_id, author_id=follow.author_id).delete()
+
+
+class TimelinePaginator(CursorPaginator):
+    """
+    Лента подписок: материализованные записи пользователя плюс
+    посты популярных авторов, которые подмешиваются при чтении.
+    Обе части упорядочены по (pub_date, post_id) и сливаются
+    на каждой странице.
+    """
+
+    def __init__(self, user, per_page, **kwargs):
+        celebrities = list(Follow.objects.filter(
+            user=user, author__stats__celebrity_since__isnull=False,
+        ).values_list('author_id', flat=True))
+        entries = FeedEntry.objects.filter(user=user).exclude(
+            author_id__in=celebrities
+        ).select_related('post__author', 'post__group')
+        super().__init__(entries, per_page, ordering=TIMELINE_ORDERING,
+                         **kwargs)
+        self.user = user
+        self.pulled = None
+        if celebrities:
+            self.pulled = Post.objects.for_feed().filter(
+                author_id__in=celebrities
+            ).annotate(post_id=F('id')).order_by(*TIMELINE_ORDERING)
+
+    def _fetch(self, condition=None, reverse=False, offset=0, limit=None):
+        if self.pulled is None:
+            return super()._fetch(condition, reverse, offset, limit)
+        # Для слияния нужны первые offset + limit строк каждой части
+        rows = super()._fetch(condition, reverse, 0, offset + limit)
+        pulled = self.pulled
+        if condition is not None:
+            pulled = pulled.filter(condition)
+        if reverse:
+            pulled = pulled.reverse()
+        rows += [
+            FeedEntry(user=self.user, post=post, author_id=post.author_id,
+                      pub_date=post.pub_date)
+            for post in pulled[:offset + limit]
+        ]
+        rows.sort(key=lambda entry: (entry.pub_date, entry.post_id),
+                  reverse=not reverse)
+        return rows[offset:offset + limit]
@@ -1,18 +1,35 @@
 from django.urls import path
 
-from . import views
+from . import api, views
 
 urlpatterns = [
     path('', views.index, name='index'),
     path('group/<slug:slug>/', views.group_posts, name='group_posts'),
+    path('groups/', views.group_index, name='group_index'),
     path('follow/', views.follow_index, name='follow_index'),
     path('new/', views.post_new, name='post_new'),
+    path('search/', views.search, name='search'),
+    path('api/posts/', api.index, name='api_index'),
+    path('api/posts/<int:post_id>/', api.post_view, name='api_post'),
+    path('api/groups/<slug:slug>/posts/',
+         api.group_posts,
+         name='api_group_posts'
+         ),
+    path('api/users/<str:username>/posts/',
+         api.profile,
+         name='api_profile'
+         ),
+    path('api/follow/', api.follow_index, name='api_follow_index'),
     path('<str:username>/', views.profile, name='profile'),
     path('<str:username>/<int:post_id>/', views.post_view, name='post'),
     path('<str:username>/<int:post_id>/edit/',
          views.post_edit,
          name='post_edit'
          ),
+    path('<str:username>/<int:post_id>/comments/',
+         views.post_comments,
+         name='post_comments'
+         ),
     path('<str:username>/<int:post_id>/comment/',
          views.add_comment,
          name='add_comment'
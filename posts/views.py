@@ -1,38 +1,94 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
-from django.shortcuts import get_object_or_404, redirect, render
+from django.db import transaction
+from django.http import JsonResponse
+from django.shortcuts import redirect, render
 from django.urls import reverse
 
+from . import thumbnails
+from .conditional import feed_conditional, response_version
 from .forms import PostForm, CommentForm
-from .models import Group, Post, User, Follow
-from yatube import settings
+from .fragment_cache import feed_scopes, feed_version, post_scopes
+from .models import Group, GroupStats, Post, User, Follow, UserStats
+from .paginator import paginate
+from .querywatch import query_budget
+from .replica import get_object_or_404, read_replica
+from .search import search_page
+from .serializers import comment_data, page_data
+from .timeline import TimelinePaginator
 
+# Порядки каталога групп: ?sort= → (подпись, поля сортировки)
+GROUP_SORTS = {
+    'activity': ('По активности', ('-last_post', 'group__title')),
+    'posts': ('По числу записей', ('-posts_count', 'group__title')),
+    'authors': ('По числу авторов', ('-authors_count', 'group__title')),
+    'title': ('По названию', ('group__title',)),
+}
 
+
+@query_budget(4)
+@read_replica
+@feed_conditional('index', personal=True)
 def index(request):
-    latest = Post.objects.all()
-    paginator = Paginator(latest, settings.PAR_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    cache_version = response_version(request, *feed_scopes('index'))
+    latest = Post.objects.for_feed()
+    page = paginate(request, latest)
+    thumbnails.prefetch(page.object_list)
     return render(
         request,
         'index.html',
-        {'page': page}
+        {'page': page, 'cache_version': cache_version}
     )
 
 
+@query_budget(5)
+@read_replica
+@feed_conditional('group', personal=True)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    paginator = Paginator(posts, settings.PAR_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    cache_version = response_version(
+        request, *feed_scopes('group', obj_id=group.pk))
+    posts = group.posts.for_feed()
+    page = paginate(request, posts)
+    thumbnails.prefetch(page.object_list)
     return render(
         request,
         'group.html',
-        {'group': group, 'page': page}
+        {'group': group,
+         'page': page,
+         'cache_version': cache_version}
+    )
+
+
+@query_budget(3)
+@feed_conditional('groups', personal=True)
+def group_index(request):
+    """Каталог групп по материализованной статистике GroupStats."""
+    sort = request.GET.get('sort')
+    if sort not in GROUP_SORTS:
+        sort = 'activity'
+    cache_version = response_version(request, *feed_scopes('groups'))
+    groups = GroupStats.objects.select_related('group').order_by(
+        *GROUP_SORTS[sort][1])
+    return render(
+        request,
+        'groups.html',
+        {'groups': groups,
+         'sort': sort,
+         'sort_choices': [(value, label) for value, (label, _)
+                          in GROUP_SORTS.items()],
+         'cache_version': cache_version}
     )
 
 
+@query_budget(4)
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page = search_page(request, query)
+    thumbnails.prefetch(page.object_list)
+    return render(request, 'search.html', {'page': page, 'query': query})
+
+
 @login_required
 def post_new(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
@@ -41,48 +97,86 @@ def post_new(request):
             request, 'post_new.html', {'form': form, 'edit': False})
     new_post = form.save(commit=False)
     new_post.author = request.user
-    new_post.save()
+    with transaction.atomic():
+        new_post.save()
+        thumbnails.prepare(new_post.image)
     return redirect('index')
 
 
+@query_budget(6)
+@read_replica
+@feed_conditional('profile', personal=True)
 def profile(request, username):
-    user = get_object_or_404(User, username=username)
-    user_posts = user.posts.all()
-    post_count = user.posts.count()
-    paginator = Paginator(user_posts, settings.PAR_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    user = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
+    cache_version = response_version(
+        request, *feed_scopes('profile', obj_id=user.pk))
+    user_posts = user.posts.for_feed()
+    stats = UserStats.for_user(user)
+    page = paginate(request, user_posts)
+    thumbnails.prefetch(page.object_list)
     following = request.user.is_authenticated and Follow.objects.filter(
         user=request.user, author=user).exists()
-    follow_count = Follow.objects.filter(author=user).count()
-    following_count = Follow.objects.filter(user=user).count()
     context = {
         'profile': user,
         'page': page,
-        'post_count': post_count,
+        'post_count': stats.posts_count,
         'following': following,
-        'follow_count': follow_count,
-        'following_count': following_count, }
+        'follow_count': stats.followers_count,
+        'following_count': stats.following_count,
+        'cache_version': cache_version, }
     return render(request, 'profile.html', context)
 
 
+def comments_page(request, post):
+    """Страница комментариев поста от новых к старым по курсору."""
+    return paginate(
+        request,
+        post.comments.select_related('author'),
+        per_page=settings.COMMENTS_PER_PAGE,
+        ordering=('-created', '-id'),
+    )
+
+
+@query_budget(5)
+@read_replica
+@feed_conditional('post', personal=True)
 def post_view(request, username, post_id):
-    post = get_object_or_404(Post, id=post_id, author__username=username)
-    post_count = post.author.posts.count()
-    follow_count = post.author.following.all().count()
-    following_count = post.author.follower.all().count()
+    post = get_object_or_404(
+        Post.objects.for_feed().select_related('author__stats'),
+        id=post_id, author__username=username)
+    response_version(request, *post_scopes(post.pk, post.author_id))
+    stats = UserStats.for_user(post.author)
+    thumbnails.prefetch([post])
     form = CommentForm()
-    comments = post.comments.all()
+    comments = comments_page(request, post)
     context = {'post': post,
                'profile': post.author,
-               'post_count': post_count,
+               'post_count': stats.posts_count,
                'form': form,
                'comments': comments,
-               'follow_count': follow_count,
-               'following_count': following_count, }
+               'follow_count': stats.followers_count,
+               'following_count': stats.following_count, }
     return render(request, 'post.html', context)
 
 
+@query_budget(4)
+def post_comments(request, username, post_id):
+    """
+    Следующая страница комментариев для подгрузки на странице поста:
+    HTML-фрагмент или JSON при ?format=json.
+    """
+    post = get_object_or_404(
+        Post.objects.select_related('author'),
+        id=post_id, author__username=username)
+    comments = comments_page(request, post)
+    if request.GET.get('format') == 'json':
+        return JsonResponse(page_data(comments, comment_data, 'comments'))
+    return render(request, 'includes/comment_list.html',
+                  {'post': post, 'comments': comments})
+
+
+@query_budget(14)
 @login_required
 def post_edit(request, username, post_id):
     current_user = request.user
@@ -95,9 +189,13 @@ def post_edit(request, username, post_id):
         files=request.FILES or None,
         instance=post)
     if form.is_valid():
+        # Сохраняем только поля формы, чтобы не затереть
+        # счётчик комментариев, изменённый параллельно
         post = form.save(commit=False)
-        post.author = request.user
-        post.save()
+        post.save(
+            update_fields=PostForm.Meta.fields + PostForm.extra_fields)
+        if 'image' in form.changed_data:
+            thumbnails.prepare(post.image)
         return redirect('post', username, post_id)
     context = {'form': form, 'edit': True, 'post': post}
     return render(request, 'post_new.html', context)
@@ -118,6 +216,7 @@ def server_error(request):
     return render(request, 'misc/500.html', status=500)
 
 
+@query_budget(8)
 @login_required
 def add_comment(request, post_id, username):
     post = get_object_or_404(Post, id=post_id, author__username=username)
@@ -126,20 +225,24 @@ def add_comment(request, post_id, username):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        with transaction.atomic():
+            comment.save()
         return redirect('post', username, post_id)
     context = {'form': form, 'post_id': post_id, 'username': username}
     return render(request, 'comments.html', context)
 
 
+@query_budget(5)
+@read_replica
 @login_required
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    page = paginate(request, request.user,
+                    paginator_class=TimelinePaginator)
+    page.object_list = [entry.post for entry in page.object_list]
+    thumbnails.prefetch(page.object_list)
     context = {
-        'page': page, 'paginator': paginator,
+        'page': page, 'paginator': page.paginator,
+        'cache_version': feed_version('follow', user=request.user),
     }
     return render(request, 'follow.html', context)
 
@@ -148,7 +251,7 @@ def follow_index(request):
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if author != request.user:
-        Follow.objects.get_or_create(user=request.user, author=author,)
+        Follow.objects.follow(request.user, author)
     return redirect('profile', username=username)
 
 
@@ -156,5 +259,5 @@ def profile_follow(request, username):
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     if author != request.user:
-        Follow.objects.filter(user=request.user, author=author).delete()
+        Follow.objects.unfollow(request.user, author)
     return redirect('profile', username=username)
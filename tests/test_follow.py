@@ -123,14 +123,14 @@ class TestFollow:
         assert 'paginator' in response.context, (
             'Проверьте, что передали переменную `paginator` в контекст страницы `/follow/`'
         )
-        assert type(response.context['paginator']) == Paginator, (
-            'Проверьте, что переменная `paginator` на странице `/follow/` типа `Paginator`'
+        assert isinstance(response.context['paginator'], Paginator), (
+            'Проверьте, что переменная `paginator` на странице `/follow/` типа `Paginator` (ленты передают его наследника без подсчёта записей)'
         )
         assert 'page' in response.context, (
             'Проверьте, что передали переменную `page` в контекст страницы `/follow/`'
         )
-        assert type(response.context['page']) == Page, (
-            'Проверьте, что переменная `page` на странице `/follow/` типа `Page`'
+        assert isinstance(response.context['page'], Page), (
+            'Проверьте, что переменная `page` на странице `/follow/` типа `Page` (ленты передают его наследника без подсчёта записей)'
         )
         assert len(response.context['page']) == 2, (
             'Проверьте, что на странице `/follow/` список статей авторов на которых подписаны'
@@ -4,7 +4,7 @@ import pytest
 from django import forms
 from django.contrib.auth import get_user_model
 from django.core.files.base import File
-from django.db.models.query import QuerySet
+from django.core.paginator import Page
 from PIL import Image
 
 from posts.models import Post
@@ -61,9 +61,9 @@ class TestPostView:
             'содержится поле `text` типа `CharField`'
         )
 
-        comment_context = get_field_context(response.context, QuerySet)
-        assert comment_context is not None, (
-            'Проверьте, что передали список комментариев в контекст страницы `/<username>/<post_id>/` типа `QuerySet`'
+        comment_context = response.context.get('comments')
+        assert isinstance(comment_context, Page), (
+            'Проверьте, что передали страницу комментариев в контекст страницы `/<username>/<post_id>/` типа `Page`'
         )
 
 
@@ -0,0 +1,33 @@
+from django.contrib import admin
+from django.contrib.auth import admin as auth_admin
+from django.contrib.auth import forms as auth_forms
+from django.contrib.auth import get_user_model
+
+from .validators import validate_username
+
+User = get_user_model()
+
+
+class UserCreationForm(auth_forms.UserCreationForm):
+    def clean_username(self):
+        username = self.cleaned_data['username']
+        validate_username(username)
+        return username
+
+
+class UserChangeForm(auth_forms.UserChangeForm):
+    def clean_username(self):
+        username = self.cleaned_data['username']
+        # Старые имена проверяет миграция users.0001, здесь — только новые
+        if 'username' in self.changed_data:
+            validate_username(username)
+        return username
+
+
+class UserAdmin(auth_admin.UserAdmin):
+    add_form = UserCreationForm
+    form = UserChangeForm
+
+
+admin.site.unregister(User)
+admin.site.register(User, UserAdmin)
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.db import migrations
+
+from users.validators import rename_reserved
+
+
+def rename_reserved_usernames(apps, schema_editor):
+    app_label, model_name = settings.AUTH_USER_MODEL.split('.')
+    rename_reserved(apps.get_model(app_label, model_name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            rename_reserved_usernames, migrations.RunPython.noop),
+    ]
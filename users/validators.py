@@ -0,0 +1,38 @@
+from django.core.exceptions import ValidationError
+from django.db.models.functions import Lower
+
+# Первые сегменты адресов сайта: профиль /<username>/ с таким именем
+# перекрыл бы эти страницы или сам оказался бы перекрыт ими
+RESERVED_USERNAMES = frozenset({
+    'about', 'admin', 'api', 'auth', 'follow', 'group', 'groups', 'media',
+    'new', 'search', 'static',
+})
+
+
+def validate_username(username):
+    """Запрещает имена, совпадающие с адресами сайта, без учёта регистра."""
+    if username.lower() in RESERVED_USERNAMES:
+        raise ValidationError(
+            'Это имя занято адресом сайта, выберите другое.',
+            code='reserved')
+
+
+def rename_reserved(user_model):
+    """
+    Переименовывает пользователей с занятыми именами в <имя>_<n> с
+    первым свободным n. Принимает модель, чтобы работать и из миграции.
+    Возвращает пары (старое имя, новое имя).
+    """
+    renamed = []
+    reserved = user_model.objects.annotate(
+        username_lower=Lower('username'),
+    ).filter(username_lower__in=RESERVED_USERNAMES).order_by('pk')
+    for user in reserved:
+        number = 1
+        while user_model.objects.filter(
+                username=f'{user.username}_{number}').exists():
+            number += 1
+        renamed.append((user.username, f'{user.username}_{number}'))
+        user.username = renamed[-1][1]
+        user.save(update_fields=['username'])
+    return renamed
@@ -0,0 +1,214 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY,'
+    ' value BLOB NOT NULL,'
+    ' expires REAL,'
+    ' accessed REAL NOT NULL'
+    ') WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+)
+# Время последнего обращения обновляется не чаще раза в секунду,
+# чтобы чтение горячих ключей не превращалось в поток записей
+ACCESS_RESOLUTION = 1.0
+
+
+class SQLiteCache(BaseCache):
+    """
+    Кэш в общем файле SQLite для нескольких процессов на одном узле.
+
+    Целые числа хранятся как есть, поэтому incr/decr атомарны на уровне
+    базы; остальные значения сериализуются pickle. При превышении
+    MAX_ENTRIES вытесняются давно не читавшиеся ключи (LRU).
+
+    Настройки: LOCATION — путь к файлу; OPTIONS — MAX_ENTRIES,
+    CULL_FREQUENCY, CULL_EVERY (раз во сколько записей потока
+    проверяется переполнение, по умолчанию MAX_ENTRIES / 100), а также
+    MMAP_SIZE и BUSY_TIMEOUT (в секундах).
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._mmap_size = int(options.get('MMAP_SIZE', 64 * 1024 * 1024))
+        self._busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self._cull_every = int(options.get(
+            'CULL_EVERY', max(self._max_entries // 100, 1)))
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self._path, timeout=self._busy_timeout,
+                                 isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.execute(f'PRAGMA mmap_size={self._mmap_size}')
+            for statement in SCHEMA:
+                db.execute(statement)
+            self._local.db = db
+        return db
+
+    @staticmethod
+    def _dump(value):
+        if type(value) is int:
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _load(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _touch_rows(self, rows, now):
+        stale = [key for key, _, _, accessed in rows
+                 if now - accessed > ACCESS_RESOLUTION]
+        if stale:
+            self._db.executemany(
+                'UPDATE cache SET accessed = ? WHERE key = ?',
+                [(now, key) for key in stale])
+
+    def _cull(self, now):
+        """
+        Вытесняет ключи сверх MAX_ENTRIES. COUNT(*) проходит всю
+        таблицу, поэтому он выполняется раз в CULL_EVERY записей потока
+        и до блокировки записи; между проверками кэш может ненадолго
+        превысить предел.
+        """
+        writes = getattr(self._local, 'writes', 0) + 1
+        self._local.writes = writes % self._cull_every
+        if writes < self._cull_every:
+            return
+        db = self._db
+        count = db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count <= self._max_entries:
+            return
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            count -= db.execute(
+                'DELETE FROM cache WHERE expires <= ?', (now,)).rowcount
+            if count > self._max_entries:
+                db.execute(
+                    'DELETE FROM cache WHERE key IN ('
+                    ' SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                    (max(count // self._cull_frequency, 1),))
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        key_map = {self._key(key, version): key for key in keys}
+        if not key_map:
+            return {}
+        now = time.time()
+        rows = self._db.execute(
+            'SELECT key, value, expires, accessed FROM cache '
+            'WHERE key IN (%s)' % ', '.join('?' * len(key_map)),
+            list(key_map),
+        ).fetchall()
+        alive = [row for row in rows if row[2] is None or row[2] > now]
+        self._touch_rows(alive, now)
+        return {
+            key_map[key]: self._load(value) for key, value, _, _ in alive
+        }
+
+    def _store(self, mode, key, value, timeout, version):
+        key = self._key(key, version)
+        now = time.time()
+        expires = self.get_backend_timeout(timeout)
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            if mode == 'IGNORE':
+                db.execute(
+                    'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                    (key, now))
+            cursor = db.execute(
+                f'INSERT OR {mode} INTO cache '
+                '(key, value, expires, accessed) VALUES (?, ?, ?, ?)',
+                (key, self._dump(value), expires, now))
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        self._cull(now)
+        return cursor.rowcount > 0
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._store('IGNORE', key, value, timeout, version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._store('REPLACE', key, value, timeout, version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        cursor = self._db.execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), self._key(key, version),
+             time.time()))
+        return cursor.rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            updated = db.execute(
+                "UPDATE cache SET value = value + ?, accessed = ? "
+                "WHERE key = ? AND typeof(value) = 'integer' "
+                "AND (expires IS NULL OR expires > ?)",
+                (delta, now, key, now)).rowcount
+            value = db.execute(
+                'SELECT value FROM cache WHERE key = ?', (key,)).fetchone()
+        finally:
+            db.execute('COMMIT')
+        if not updated:
+            raise ValueError("Key '%s' not found" % key)
+        return value[0]
+
+    def delete(self, key, version=None):
+        self._db.execute(
+            'DELETE FROM cache WHERE key = ?', (self._key(key, version),))
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if keys:
+            self._db.execute(
+                'DELETE FROM cache WHERE key IN (%s)'
+                % ', '.join('?' * len(keys)), keys)
+
+    def has_key(self, key, version=None):
+        return self._db.execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self._key(key, version), time.time())).fetchone() is not None
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединение живёт всё время работы потока, как у LocMemCache
+        pass
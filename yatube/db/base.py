@@ -0,0 +1,123 @@
+"""
+Бэкенд SQLite с настройками для работы под нагрузкой: журнал WAL,
+в котором читатели не ждут писателя, synchronous=NORMAL, отображение
+файла в память и увеличенный кэш страниц. Транзакции начинаются
+с BEGIN IMMEDIATE и ждут блокировку записи заранее, а не падают
+на середине; одиночные запросы вне транзакции повторяются, если база
+осталась заблокированной дольше BUSY_TIMEOUT.
+
+Настройки OPTIONS: MMAP_SIZE и CACHE_SIZE (в байтах), BUSY_TIMEOUT
+(в секундах), LOCK_RETRIES, IMMEDIATE_TRANSACTIONS.
+"""
+import time
+
+from django.db.backends.sqlite3 import base
+
+Database = base.Database
+
+DEFAULTS = {
+    'MMAP_SIZE': 256 * 1024 * 1024,
+    'CACHE_SIZE': 64 * 1024 * 1024,
+    'BUSY_TIMEOUT': 5,
+    'LOCK_RETRIES': 3,
+    'IMMEDIATE_TRANSACTIONS': True,
+}
+# Пауза перед первым повтором, дальше удваивается
+RETRY_DELAY = 0.05
+# Сколько раз шаг копирования базы может упереться в блокировку
+BACKUP_ATTEMPTS = 50
+
+
+def configure(connection, mmap_size, cache_size):
+    """Прагмы соединения; журнал WAL сохраняется в самом файле базы."""
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    connection.execute(f'PRAGMA mmap_size={int(mmap_size)}')
+    # Отрицательное значение — размер кэша в КиБ, а не в страницах
+    connection.execute(f'PRAGMA cache_size={-int(cache_size) // 1024}')
+
+
+def is_locked(error):
+    return 'database is locked' in str(error)
+
+
+def backup(connection, path, attempts=BACKUP_ATTEMPTS):
+    """
+    Копирует базу соединения Django connection в файл path. Пока
+    источник или копия заблокированы, sqlite3 повторяет шаг копирования
+    без конца, поэтому число попыток ограничено: например, в открытой
+    транзакции копия не снимется.
+    """
+    busy = []
+
+    def progress(status, remaining, total):
+        if status in (Database.SQLITE_BUSY, Database.SQLITE_LOCKED):
+            busy.append(status)
+            if len(busy) >= attempts:
+                raise Database.OperationalError(
+                    'Не удалось скопировать базу: она заблокирована')
+
+    connection.ensure_connection()
+    copy = Database.connect(path)
+    try:
+        connection.connection.backup(copy, pages=256, progress=progress)
+    finally:
+        copy.close()
+
+
+class RetryingCursorWrapper(base.SQLiteCursorWrapper):
+    """Повторяет запрос вне транзакции, пока база заблокирована."""
+
+    def __init__(self, connection, retries):
+        super().__init__(connection)
+        self.retries = retries
+
+    def _retry(self, method, *args):
+        delay = RETRY_DELAY
+        for attempt in range(self.retries + 1):
+            try:
+                return method(*args)
+            except Database.OperationalError as error:
+                # Внутри транзакции повтор одного запроса не поможет:
+                # её целиком откатит и повторит вызывающий код
+                if (not is_locked(error) or self.connection.in_transaction
+                        or attempt == self.retries):
+                    raise
+            time.sleep(delay)
+            delay *= 2
+
+    def execute(self, query, params=None):
+        return self._retry(super().execute, query, params)
+
+    def executemany(self, query, param_list):
+        return self._retry(super().executemany, query, param_list)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        options = {**DEFAULTS, **self.settings_dict['OPTIONS']}
+        self.tuning = {key: options.pop(key) for key in DEFAULTS}
+        kwargs = super().get_connection_params()
+        for key in DEFAULTS:
+            kwargs.pop(key, None)
+        kwargs['timeout'] = self.tuning['BUSY_TIMEOUT']
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        configure(connection, self.tuning['MMAP_SIZE'],
+                  self.tuning['CACHE_SIZE'])
+        return connection
+
+    def create_cursor(self, name=None):
+        retries = self.tuning['LOCK_RETRIES']
+        return self.connection.cursor(
+            factory=lambda connection: RetryingCursorWrapper(
+                connection, retries))
+
+    def _start_transaction_under_autocommit(self):
+        if self.tuning['IMMEDIATE_TRANSACTIONS']:
+            self.cursor().execute('BEGIN IMMEDIATE')
+        else:
+            super()._start_transaction_under_autocommit()
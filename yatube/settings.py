@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -49,7 +50,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'posts.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'posts.page_cache.PageCacheMiddleware',
+    'posts.querywatch.QueryWatchMiddleware',
+    'posts.replica.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -62,7 +67,9 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Стандартный движок Django с замером времени отрисовки
+        'BACKEND': 'posts.instrumentation.DjangoTemplates',
+        'NAME': 'django',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -83,12 +90,33 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# SQLite с журналом WAL и постоянными соединениями (yatube/db/base.py)
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'yatube.db',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 600)),
+        'OPTIONS': {
+            'MMAP_SIZE': int(
+                os.environ.get('DB_MMAP_SIZE', 256 * 1024 * 1024)),
+            'CACHE_SIZE': int(
+                os.environ.get('DB_CACHE_SIZE', 64 * 1024 * 1024)),
+            'BUSY_TIMEOUT': float(os.environ.get('DB_BUSY_TIMEOUT', 5)),
+        },
     }
 }
+# Реплика для чтения лент (posts/replica.py). По умолчанию тот же файл,
+# то есть реплики нет; отдельный файл заполняет команда replicate
+DATABASES['replica'] = {
+    **DATABASES['default'],
+    'NAME': os.environ.get('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+    'TEST': {'MIRROR': 'default'},
+}
+DATABASE_ROUTERS = ['posts.replica.ReplicaRouter']
+REPLICA_DATABASE = 'replica'
+# Сколько секунд после записи пользователь читает из основной базы
+REPLICA_PIN_SECONDS = 5
+REPLICA_PIN_COOKIE = 'replica_pin'
 
 
 # Password validation
@@ -147,9 +175,79 @@ LOGIN_REDIRECT_URL = 'index'
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 PAR_PAGE = 10
-
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# Комментарии на странице поста; остальные подгружаются по кнопке
+COMMENTS_PER_PAGE = 20
+# Лента подписок: авторы с большим числом подписчиков не раздаются
+# в ленты при публикации, а подмешиваются при чтении
+FEED_FANOUT_LIMIT = 5000
+# Раздача возвращается, только когда подписчиков меньше
+# FEED_FANOUT_LIMIT - FEED_FANOUT_HYSTERESIS: это делает команда
+# demote_celebrities, её запускают по расписанию
+FEED_FANOUT_HYSTERESIS = 500
+# Сколько последних постов автора попадает в ленту при подписке
+FEED_BACKFILL = 200
+# Миниатюры создаются сразу после транзакции запроса. Фоновый пул
+# из THUMBNAIL_WORKERS потоков включается в развёртывании через
+# окружение: тогда запрос получает готовую миниатюру или оригинал,
+# а потоки пула работают со своими соединениями с базой
+THUMBNAIL_BACKEND = 'posts.thumbnails.DeferredThumbnailBackend'
+THUMBNAIL_KVSTORE = 'posts.thumbnails.KVStore'
+THUMBNAIL_WORKERS = int(os.environ.get('THUMBNAIL_WORKERS', 0))
+# Загруженные изображения постов уменьшаются до POST_IMAGE_MAX_SIZE
+# по большей стороне и перекодируются в POST_IMAGE_FORMAT без EXIF;
+# больше POST_IMAGE_MAX_PIXELS пикселей изображение не принимается
+POST_IMAGE_MAX_SIZE = 2048
+POST_IMAGE_MAX_PIXELS = 50_000_000
+POST_IMAGE_FORMAT = 'JPEG'
+POST_IMAGE_QUALITY = 85
+# Файл изображения без ссылок удаляется не раньше чем через столько
+# секунд: загрузка успевает сохранить пост, который на него сошлётся
+IMAGE_GC_GRACE = 3600
+# Сколько секунд прокси может отдавать публичные страницы без сверки
+PUBLIC_CACHE_MAX_AGE = 30
+# Сколько секунд анонимная страница хранится в кэше страниц; раньше
+# её вытесняет любое изменение показанных на ней данных
+PAGE_CACHE_TIMEOUT = 300
+# Замеры запросов (posts.instrumentation): окно последних замеров по
+# адресу и сброс сводки процесса в каталог раз в REQUEST_METRICS_FLUSH
+# секунд для команды request_metrics, которая не учитывает сводки старше
+# REQUEST_METRICS_MAX_AGE секунд. Заголовок Server-Timing показывает
+# любому клиенту число запросов и время базы, поэтому выключен
+REQUEST_METRICS_HEADER = False
+REQUEST_METRICS_WINDOW = 1000
+REQUEST_METRICS_FLUSH = 10
+REQUEST_METRICS_MAX_AGE = 900
+REQUEST_METRICS_DIR = os.environ.get(
+    'REQUEST_METRICS_DIR',
+    os.path.join(tempfile.gettempdir(), 'yatube-metrics'))
+# Слежение за запросами (posts.querywatch): форма запроса, повторённая
+# QUERY_WATCH_REPEAT раз за запрос, считается N+1; запросы дольше
+# QUERY_WATCH_SLOW_MS миллисекунд пишутся в лог с планом
+QUERY_WATCH_REPEAT = 5
+QUERY_WATCH_SLOW_MS = 100
+# В тестах превышение бюджета запросов вьюхи роняет тест, а замеры
+# запросов пишутся во временный каталог
+TEST_RUNNER = 'posts.testing.TestRunner'
+# Файл с результатами нагрузочных прогонов (команда benchmark)
+BENCHMARK_RESULTS = os.path.join(BASE_DIR, 'benchmarks', 'results.jsonl')
+
+# CACHE_BACKEND=sqlite включает общий для всех воркеров узла кэш
+# в файле CACHE_LOCATION; по умолчанию кэш свой у каждого процесса
+if os.environ.get('CACHE_BACKEND') == 'sqlite':
+    CACHES = {
+        'default': {
+            'BACKEND': 'posts.instrumentation.SQLiteCache',
+            'LOCATION': os.environ.get(
+                'CACHE_LOCATION', os.path.join(BASE_DIR, 'cache.sqlite3')),
+            'OPTIONS': {
+                'MAX_ENTRIES': int(
+                    os.environ.get('CACHE_MAX_ENTRIES', 100000)),
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'posts.instrumentation.LocMemCache',
+        }
     }
-}